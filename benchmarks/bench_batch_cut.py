@@ -0,0 +1,88 @@
+"""
+Benchmark do corte em lote (uma decodificação da fonte, várias saídas) contra o
+corte segmento a segmento (um ffmpeg por segmento, cada um decodificando do seu seek).
+
+Gera um vídeo sintético com o FFmpeg e corta o mesmo conjunto de segmentos pelos
+dois caminhos, nos modos 'proxy' e 'reencode', conferindo que as durações das
+saídas coincidem. Os segmentos são densos (janelas sobrepostas, como as que o LLM
+costuma devolver para o mesmo trecho) ou esparsos (espalhados pelo vídeo), e o
+plano que VC_BATCH_CUT=auto escolheria para cada caso também é informado.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.bench_batch_cut --duration 600 --resolution 1920x1080 --segments 10
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.bench_pipeline import make_synthetic_video
+from scripts import cut_segments
+from scripts.media_probe import probe
+
+
+def dense_segments(count: int, length: float, step: float, offset: float = 30.0) -> list:
+    """Janelas de `length` segundos a cada `step` segundos: sobrepostas quando step < length."""
+    return [{"start": offset + i * step, "end": offset + i * step + length} for i in range(count)]
+
+
+def sparse_segments(count: int, length: float, duration: float) -> list:
+    """Segmentos espalhados uniformemente pelo vídeo, com lacunas entre eles."""
+    step = duration / count
+    return [{"start": i * step, "end": i * step + min(length, step * 0.5)} for i in range(count)]
+
+
+def _cut(video_path: str, segments: list, mode: str, batch: str, max_workers: int) -> tuple:
+    with tempfile.TemporaryDirectory() as workspace_dir:
+        started = time.perf_counter()
+        paths = cut_segments.cut({"segments": segments}, video_path, workspace_dir=workspace_dir, mode=mode,
+                                 max_workers=max_workers, batch=batch)
+        elapsed = time.perf_counter() - started
+        durations = [round(probe(path).duration, 2) for path in paths]
+    return round(elapsed, 3), durations
+
+
+def run(duration: int, width: int, height: int, count: int, max_workers: int, media_dir: str, modes=("proxy", "reencode")) -> dict:
+    video_path = make_synthetic_video(os.path.join(media_dir, f"synthetic_{duration}s_{width}x{height}.mp4"), duration, width, height)
+    layouts = {
+        "dense": dense_segments(count, length=60, step=15),
+        "sparse": sparse_segments(count, length=60, duration=duration),
+    }
+    results = {"duration_sec": duration, "resolution": f"{width}x{height}", "segments": count, "max_workers": max_workers, "cases": []}
+    for layout, segments in layouts.items():
+        for mode in modes:
+            per_segment_sec, per_segment_durations = _cut(video_path, segments, mode, "off", max_workers)
+            batch_sec, batch_durations = _cut(video_path, segments, mode, "always", max_workers)
+            max_drift = max(abs(a - b) for a, b in zip(per_segment_durations, batch_durations))
+            results["cases"].append({
+                "layout": layout,
+                "mode": mode,
+                "auto_plan": cut_segments.plan_batches(segments, "auto"),
+                "per_segment_sec": per_segment_sec,
+                "batch_sec": batch_sec,
+                "speedup": round(per_segment_sec / batch_sec, 2),
+                "max_duration_drift_sec": round(max_drift, 3),
+            })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=int, default=600)
+    parser.add_argument("--resolution", default="1920x1080")
+    parser.add_argument("--segments", type=int, default=10)
+    parser.add_argument("--modes", default="proxy,reencode")
+    parser.add_argument("--max-workers", type=int, default=cut_segments.CUT_MAX_WORKERS)
+    parser.add_argument("--media-dir", default=os.path.join(tempfile.gettempdir(), "viralcutter_bench_media"),
+                        help="onde guardar (e reaproveitar) o vídeo sintético")
+    parser.add_argument("--output", help="arquivo JSON de saída (além da saída padrão)")
+    args = parser.parse_args()
+
+    os.makedirs(args.media_dir, exist_ok=True)
+    width, height = (int(v) for v in args.resolution.lower().split("x"))
+    results = run(args.duration, width, height, args.segments, args.max_workers, args.media_dir, args.modes.split(","))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,193 @@
+"""
+Benchmark ponta a ponta do pipeline, com mídia sintética e backends simulados.
+
+Para cada combinação de duração e resolução, gera um vídeo com o FFmpeg
+(testsrc2 + sine), substitui a transcrição por um TSV sintético (sem WhisperX)
+e o LLM pelo StubBackend com uma fixture JSON, e mede separadamente
+get_transcript_chunks, create_viral_segments.create, cut_segments.cut e
+edit_video.edit, além do tempo total. O resultado sai em JSON, para comparar
+execuções e pegar regressões de throughput antes de chegarem à produção.
+
+edit_video.edit depende do PyCaps; se ele não estiver instalado, a etapa é
+marcada como "skipped" e o total considera apenas as etapas medidas.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.bench_pipeline --durations 120,600 --resolutions 1280x720,1920x1080 --output resultados.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_transcript_chunks import synthetic_transcript
+from scripts import create_viral_segments, cut_segments
+from scripts.encoder_profiles import DEFAULT_PROFILE, PROFILES, get_profile
+from scripts.llm_backends import StubBackend
+
+# Mesmos parâmetros usados por processing.initial_process
+NUM_SEGMENTS, TEMPO_MINIMO, TEMPO_MAXIMO = 10, 40, 120
+CHUNK_DURATION_SEC, OVERLAP_DURATION_SEC = 600, 10
+# Enquadramento padrão da tela dividida (metade esquerda em cima, metade direita embaixo)
+DEFAULT_ROIS = {"roi1": {"x": 0, "y": 0, "w": 50, "h": 100}, "roi2": {"x": 50, "y": 0, "w": 50, "h": 100}}
+# O corte que o pipeline usaria com a configuração atual (ver VC_PIPELINE_MODE em processing.py)
+DEFAULT_CUT_MODE = "proxy" if os.environ.get("VC_PIPELINE_MODE", "proxy") == "proxy" else cut_segments.CUT_MODE
+
+
+def make_synthetic_video(path: str, duration: int, width: int, height: int, fps: int = 30) -> str:
+    """Gera (uma vez; depois reaproveita) um H.264 + AAC com padrão de teste e tom senoidal."""
+    if os.path.exists(path):
+        return path
+    temp_path = f"{path}.tmp.mp4"
+    subprocess.run([
+        "ffmpeg", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-g", str(fps * 2),
+        "-c:a", "aac", "-b:a", "128k", "-shortest", "-movflags", "+faststart",
+        "-y", temp_path,
+    ], check=True)
+    os.replace(temp_path, path)
+    return path
+
+
+def write_transcript_fixture(workspace_dir: str, duration: int, seed: int = 0) -> pd.DataFrame:
+    """Substitui a transcrição: grava input_video.tsv (tempos em ms, como o WhisperX) cobrindo o vídeo."""
+    df = synthetic_transcript(int(duration * 2.5), seed=seed)
+    df = df[df["end"] <= duration].reset_index(drop=True)
+    fixture = df.assign(start=(df["start"] * 1000).round().astype(int), end=(df["end"] * 1000).round().astype(int))
+    fixture.to_csv(os.path.join(workspace_dir, "input_video.tsv"), sep="\t", index=False)
+    return df
+
+
+def write_llm_fixture(path: str, duration: int, num_segments: int = NUM_SEGMENTS, seed: int = 0) -> str:
+    """Resposta fixa do LLM: `num_segments` segmentos distribuídos ao longo do vídeo, todos dentro dele."""
+    rng = np.random.default_rng(seed)
+    length = min(TEMPO_MAXIMO, max(5.0, duration / (num_segments + 1)))
+    starts = np.linspace(0, max(0.0, duration - length), num_segments)
+    segments = [{
+        "start": round(float(start), 2),
+        "end": round(float(start + rng.uniform(0.6, 1.0) * length), 2),
+        "title": f"Segmento sintético {i + 1}",
+        "description": "Fixture do benchmark.",
+        "score": int(rng.integers(0, 100)),
+        "keywords": ["benchmark"],
+    } for i, start in enumerate(starts)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"segments": segments}, f, ensure_ascii=False)
+    return path
+
+
+def _best_of(fn, repeat: int):
+    """Executa `fn` `repeat` vezes e retorna (melhor tempo, último resultado)."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return round(best, 3), result
+
+
+def run_case(media_dir: str, duration: int, width: int, height: int, cut_mode: str, pycaps_template: str, repeat: int,
+             encoder_profile: str = DEFAULT_PROFILE) -> dict:
+    video_path = make_synthetic_video(os.path.join(media_dir, f"synthetic_{duration}s_{width}x{height}.mp4"), duration, width, height)
+    profile = get_profile(encoder_profile)
+    result = {"duration_sec": duration, "resolution": f"{width}x{height}", "cut_mode": cut_mode,
+              "encoder_profile": profile.name, "vaapi": profile.vaapi}
+    timings = {}
+
+    with tempfile.TemporaryDirectory() as workspace_dir:
+        result["transcription_stub_sec"], df = _best_of(lambda: write_transcript_fixture(workspace_dir, duration), 1)
+
+        result["chunks_sec"], chunks = _best_of(
+            lambda: create_viral_segments.get_transcript_chunks(df, CHUNK_DURATION_SEC, OVERLAP_DURATION_SEC), repeat)
+        result["chunks"] = len(chunks)
+
+        backend = StubBackend(write_llm_fixture(os.path.join(workspace_dir, "llm_fixture.json"), duration))
+        result["create_sec"], viral_segments = _best_of(lambda: create_viral_segments.create(
+            num_segments=NUM_SEGMENTS, viral_mode=True, themes="", tempo_minimo=TEMPO_MINIMO, tempo_maximo=TEMPO_MAXIMO,
+            workspace_dir=workspace_dir, backend=backend, timings=timings,
+        ), repeat)
+        result["segments"] = len(viral_segments["segments"])
+
+        result["cut_sec"], cut_files = _best_of(lambda: cut_segments.cut(
+            viral_segments, video_path, workspace_dir=workspace_dir, mode=cut_mode, timings=timings, profile=profile,
+        ), repeat)
+
+        if importlib.util.find_spec("pycaps") is None:
+            result["edit_sec"] = "skipped (PyCaps não instalado)"
+        else:
+            from scripts import edit_video
+            clips_data = {}
+            for segment, path in zip(viral_segments["segments"], cut_files):
+                clips_data[path] = {"title": segment["title"], "start": segment["start"], "end": segment["end"], **DEFAULT_ROIS}
+                if cut_mode == "proxy":
+                    clips_data[path]["source"] = video_path
+            result["edit_sec"], rendered = _best_of(lambda: edit_video.edit(clips_data, pycaps_template, workspace_dir=workspace_dir, profile=profile), repeat)
+            result["edit_errors"] = sum(1 for r in rendered.values() if r["status"] == "error")
+
+        # Total da sequência do pipeline (melhor tempo de cada etapa medida; chunks já fazem parte de create)
+        stages = ("transcription_stub_sec", "create_sec", "cut_sec", "edit_sec")
+        result["end_to_end_sec"] = round(sum(result[k] for k in stages if isinstance(result.get(k), float)), 3)
+        result["realtime_factor"] = round(duration / result["end_to_end_sec"], 2) if result["end_to_end_sec"] else None
+        result["stage_timings"] = timings
+    return result
+
+
+def _environment() -> dict:
+    ffmpeg_version = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout.split("\n", 1)[0]
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(), "ffmpeg": ffmpeg_version}
+
+
+def run(durations: list, resolutions: list, cut_mode: str, pycaps_template: str, repeat: int, media_dir: str | None = None,
+        encoder_profiles: list = (DEFAULT_PROFILE,)) -> dict:
+    owns_media_dir = media_dir is None
+    media_dir = media_dir or tempfile.mkdtemp(prefix="bench_media_")
+    os.makedirs(media_dir, exist_ok=True)
+    try:
+        cases = [
+            run_case(media_dir, duration, width, height, cut_mode, pycaps_template, repeat, encoder_profile)
+            for duration in durations
+            for width, height in resolutions
+            for encoder_profile in encoder_profiles
+        ]
+    finally:
+        if owns_media_dir:
+            shutil.rmtree(media_dir, ignore_errors=True)
+    return {"environment": _environment(), "repeat": repeat, "cases": cases}
+
+
+def _parse_resolution(value: str) -> tuple:
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", default="120,600", help="durações dos vídeos sintéticos, em segundos")
+    parser.add_argument("--resolutions", default="1280x720,1920x1080")
+    parser.add_argument("--cut-mode", default=DEFAULT_CUT_MODE, choices=["proxy", "smart", "reencode"])
+    parser.add_argument("--pycaps-template", default="hype")
+    parser.add_argument("--encoder-profiles", default=DEFAULT_PROFILE, help=f"perfis a comparar, separados por vírgula ({', '.join(PROFILES)})")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--media-dir", help="onde guardar (e reaproveitar) os vídeos sintéticos; por padrão, um diretório temporário")
+    parser.add_argument("--output", help="arquivo JSON de saída (além da saída padrão)")
+    args = parser.parse_args()
+
+    results = run(
+        [int(d) for d in args.durations.split(",")],
+        [_parse_resolution(r) for r in args.resolutions.split(",")],
+        args.cut_mode, args.pycaps_template, args.repeat, args.media_dir,
+        args.encoder_profiles.split(","),
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,103 @@
+"""
+Benchmark do pré-ranqueamento local (scripts/prerank.py) contra a cobertura completa.
+
+Gera uma transcrição sintética e um áudio sintético a 16 kHz (ruído com alguns trechos
+mais altos) para cada duração, mede o custo do pré-ranqueamento (volume por segundo +
+sinais das janelas + seleção) e compara o que seria enviado ao LLM nos dois modos:
+número de chamadas e caracteres de transcrição (aproximação do volume de tokens).
+O caminho em fluxo (StreamingSegmentFinder, com a transcrição entregue nas mesmas janelas
+do pipeline e o StubBackend no lugar do LLM) também é medido, em número de chamadas.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.bench_prerank --durations 1800,3600,7200 --top-k 8
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.bench_transcript_chunks import synthetic_transcript
+from scripts import prerank
+from scripts.audio_extract import SAMPLE_RATE
+from scripts.create_viral_segments import (CHUNK_DURATION_SEC, OVERLAP_DURATION_SEC, StreamingSegmentFinder, TranscriptIndex,
+                                           chunk_cover_times, get_transcript_chunks, region_chunks)
+from scripts.llm_backends import StubBackend
+
+
+def synthetic_audio(duration: int, seed: int = 0, loud_sections: int = 5) -> np.ndarray:
+    """Ruído branco baixo com `loud_sections` trechos de 60 s bem mais altos (picos de energia)."""
+    rng = np.random.default_rng(seed)
+    audio = rng.standard_normal(duration * SAMPLE_RATE).astype(np.float32) * 0.02
+    for start in rng.integers(0, max(1, duration - 60), loud_sections):
+        audio[start * SAMPLE_RATE:(start + 60) * SAMPLE_RATE] *= 10
+    return audio
+
+
+def streaming_calls(df, duration: int, audio: np.ndarray, top_k: int) -> int:
+    """Chamadas ao LLM do StreamingSegmentFinder com a transcrição entregue janela a janela, como em processing.py."""
+    calls = [0]
+
+    def on_progress(done: int, total: int):
+        calls[0] = max(calls[0], done)
+
+    finder = StreamingSegmentFinder(10, True, "", 40, 120, backend=StubBackend(), on_progress=on_progress,
+                                    expected_duration=duration, audio=audio, prerank_top_k=top_k)
+    window_start = 0.0
+    for window_end in chunk_cover_times(duration) + [float(duration)]:
+        rows = df[(df["start"] >= window_start) & (df["start"] < window_end)]
+        finder.add_rows(rows, covered_until=window_end)
+        window_start = window_end
+    finder.finish()
+    return calls[0]
+
+
+def run_case(duration: int, top_k: int) -> dict:
+    df = synthetic_transcript(int(duration * 2.5))
+    df = df[df["end"] <= duration].reset_index(drop=True)
+    audio = synthetic_audio(duration)
+
+    started = time.perf_counter()
+    full_chunks = get_transcript_chunks(df, CHUNK_DURATION_SEC, OVERLAP_DURATION_SEC)
+    full_sec = time.perf_counter() - started
+
+    started = time.perf_counter()
+    loudness = prerank.loudness_per_second(audio)
+    loudness_sec = time.perf_counter() - started
+    started = time.perf_counter()
+    regions = prerank.select_regions(df, top_k=top_k, loudness=loudness)
+    ranked_chunks = region_chunks(TranscriptIndex(df), regions)
+    ranking_sec = time.perf_counter() - started
+
+    full_chars = sum(len(chunk["chunk_text"]) for chunk in full_chunks)
+    ranked_chars = sum(len(chunk["chunk_text"]) for chunk in ranked_chunks)
+    return {
+        "duration_sec": duration,
+        "transcript_rows": len(df),
+        "prerank_applies": prerank.enabled(duration, top_k),
+        "full": {"llm_calls": len(full_chunks), "chars": full_chars, "chunking_sec": round(full_sec, 4)},
+        "prerank": {
+            "llm_calls": len(ranked_chunks),
+            "chars": ranked_chars,
+            "regions": regions,
+            "loudness_sec": round(loudness_sec, 4),
+            "ranking_sec": round(ranking_sec, 4),
+        },
+        "streaming_prerank": {"llm_calls": streaming_calls(df, duration, audio, top_k)},
+        "chars_reduction": round(1 - ranked_chars / full_chars, 3) if full_chars else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", default="1800,3600,7200", help="durações sintéticas, em segundos")
+    parser.add_argument("--top-k", type=int, default=prerank.PRERANK_TOP_K)
+    parser.add_argument("--output", help="arquivo JSON de saída (além da saída padrão)")
+    args = parser.parse_args()
+
+    results = {"top_k": args.top_k, "window_sec": prerank.PRERANK_WINDOW_SEC, "hop_sec": prerank.PRERANK_HOP_SEC,
+               "cases": [run_case(int(duration), args.top_k) for duration in args.durations.split(",")]}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,108 @@
+"""
+Benchmark do chunking da transcrição e da exportação dos TSVs por segmento.
+
+Compara a implementação anterior (máscaras booleanas + iterrows) com a atual
+(índice ordenado + searchsorted + escrita vetorizada) numa transcrição sintética
+de várias horas, e confere que as duas produzem o mesmo resultado.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.bench_transcript_chunks --words 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from scripts.create_viral_segments import get_transcript_chunks, export_segment_transcripts
+
+
+def synthetic_transcript(words: int, seed: int = 0) -> pd.DataFrame:
+    """Gera uma transcrição palavra a palavra (tempos em segundos), com pausas ocasionais."""
+    rng = np.random.default_rng(seed)
+    durations = rng.uniform(0.15, 0.6, words)
+    gaps = rng.choice([0.02, 0.1, 1.5], size=words, p=[0.85, 0.13, 0.02])
+    starts = np.cumsum(durations + gaps) - durations
+    vocabulary = np.array(["viral", "corte", "podcast", "ideia", "incrível", "dinheiro", "história", "você", "agora", "nunca"])
+    return pd.DataFrame({
+        "start": np.round(starts, 3),
+        "end": np.round(starts + durations, 3),
+        "text": vocabulary[rng.integers(0, len(vocabulary), words)],
+    })
+
+
+# --- Implementação anterior, mantida aqui apenas como referência de comparação ---
+
+def legacy_get_transcript_chunks(df, chunk_duration_sec, overlap_duration_sec):
+    chunks = []
+    total_duration = df['end'].max() if not df.empty else 0
+    current_start_time = 0.0
+    while current_start_time < total_duration:
+        chunk_end_time = min(current_start_time + chunk_duration_sec, total_duration)
+        chunk_df = df[(df['start'] >= current_start_time - 0.1) & (df['end'] <= chunk_end_time + 0.1)].copy()
+        if not chunk_df.empty:
+            chunks.append({"chunk_text": " ".join(chunk_df['text'].astype(str)), "start_time_offset": current_start_time})
+        current_start_time += (chunk_duration_sec - overlap_duration_sec)
+    return chunks
+
+
+def legacy_export_segment_transcripts(df, segments, workspace_dir):
+    for idx, segment in enumerate(segments):
+        path = os.path.join(workspace_dir, f"output{idx:03d}.tsv")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("start\tend\ttext\n")
+            segment_transcription = df[(df['start'] >= segment['start']) & (df['end'] <= segment['end'])]
+            for _, row in segment_transcription.iterrows():
+                f.write(f"{row['start']:.3f}\t{row['end']:.3f}\t{row['text']}\n")
+
+
+def _timed(fn, *args, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _read_outputs(directory: str) -> dict:
+    return {name: open(os.path.join(directory, name), encoding='utf-8').read() for name in sorted(os.listdir(directory))}
+
+
+def run(words: int, num_segments: int, repeat: int) -> dict:
+    df = synthetic_transcript(words)
+    duration = float(df['end'].max())
+    rng = np.random.default_rng(1)
+    seg_starts = rng.uniform(0, duration - 120, num_segments)
+    segments = [{"start": float(s), "end": float(s + rng.uniform(40, 120))} for s in seg_starts]
+
+    assert get_transcript_chunks(df, 600, 10) == legacy_get_transcript_chunks(df, 600, 10), "chunks divergentes"
+    with tempfile.TemporaryDirectory() as new_dir, tempfile.TemporaryDirectory() as old_dir:
+        export_segment_transcripts(df, segments, new_dir)
+        legacy_export_segment_transcripts(df, segments, old_dir)
+        assert _read_outputs(new_dir) == _read_outputs(old_dir), "TSVs divergentes"
+
+        results = {
+            "words": words,
+            "duration_hours": round(duration / 3600, 2),
+            "segments": num_segments,
+            "chunks_legacy_sec": _timed(legacy_get_transcript_chunks, df, 600, 10, repeat=repeat),
+            "chunks_indexed_sec": _timed(get_transcript_chunks, df, 600, 10, repeat=repeat),
+            "export_legacy_sec": _timed(legacy_export_segment_transcripts, df, segments, old_dir, repeat=repeat),
+            "export_vectorized_sec": _timed(export_segment_transcripts, df, segments, new_dir, repeat=repeat),
+        }
+    results["chunks_speedup"] = round(results["chunks_legacy_sec"] / results["chunks_indexed_sec"], 1)
+    results["export_speedup"] = round(results["export_legacy_sec"] / results["export_vectorized_sec"], 1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=100_000)
+    parser.add_argument("--segments", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.words, args.segments, args.repeat), indent=2))
@@ -0,0 +1,268 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+UPLOADS_DIR = 'uploads'
+
+MAX_UPLOAD_BYTES = int(os.environ.get('VC_MAX_UPLOAD_MB', 8192)) * 1024 * 1024
+# Uploads parciais sem atividade há mais tempo que isso são descartados
+PARTIAL_UPLOAD_TTL_SEC = int(os.environ.get('VC_PARTIAL_UPLOAD_TTL_SEC', 24 * 3600))
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    """Erro de upload; `status_code` é o código HTTP que a API deve devolver."""
+
+    status_code = 400
+
+
+class UploadNotFound(UploadError):
+    status_code = 404
+
+
+class UploadOffsetMismatch(UploadError):
+    status_code = 409
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+class UploadBusy(UploadError):
+    """Outra requisição (neste ou em outro worker) está gravando o mesmo upload."""
+
+    status_code = 409
+
+
+def _safe_extension(filename: str) -> str:
+    extension = os.path.splitext(os.path.basename(filename or ''))[1].lower()
+    return extension if re.fullmatch(r"\.[a-z0-9]{1,8}", extension) else '.mp4'
+
+
+class ResumableUploads:
+    """
+    Recebe vídeos em partes (upload retomável) ou de uma vez (multipart), gravando
+    os blocos em disco sem bloquear o event loop e calculando o SHA-256 durante a escrita.
+
+    O estado de cada upload fica no disco (o tamanho do .part é o offset confirmado),
+    então qualquer worker do uvicorn pode continuar um upload iniciado por outro.
+    Ao concluir, o arquivo é movido para uploads/sha256-<hash><ext>: o mesmo conteúdo
+    enviado duas vezes reaproveita o arquivo já existente.
+    """
+
+    def __init__(self, root: str = UPLOADS_DIR, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.root = root
+        # Uploads em andamento: <id>.part (bytes recebidos) + <id>.json (nome e tamanho declarados)
+        self.partial_dir = os.path.join(root, 'partial')
+        self.max_bytes = max_bytes
+        os.makedirs(self.partial_dir, exist_ok=True)
+        # Estado do hash por upload neste processo: upload_id -> (hasher, bytes já incluídos)
+        self._hashers = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, upload_id: str):
+        if not _UPLOAD_ID.match(upload_id or ''):
+            raise UploadNotFound("Upload não encontrado.")
+        base = os.path.join(self.partial_dir, upload_id)
+        return f"{base}.part", f"{base}.json"
+
+    def create(self, filename: str, size: int) -> dict:
+        if size <= 0:
+            raise UploadError("Tamanho do arquivo inválido.")
+        if size > self.max_bytes:
+            raise UploadTooLarge(f"Arquivo maior que o limite de {self.max_bytes // (1024 * 1024)} MB.")
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._paths(upload_id)
+        open(part_path, 'wb').close()
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({"filename": os.path.basename(filename or 'video.mp4'), "size": size, "created_at": time.time()}, f)
+        return self.status(upload_id)
+
+    def status(self, upload_id: str) -> dict:
+        part_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            offset = os.path.getsize(part_path)
+        except FileNotFoundError:
+            raise UploadNotFound("Upload não encontrado.")
+        return {"upload_id": upload_id, "filename": meta["filename"], "size": meta["size"], "offset": offset}
+
+    def _hasher_at(self, upload_id: str, part_path: str, offset: int):
+        """Retorna o hasher posicionado em `offset`, relendo o .part se o estado se perdeu (reinício, outro worker)."""
+        with self._lock:
+            hasher, hashed = self._hashers.get(upload_id, (None, -1))
+        if hashed != offset:
+            hasher = hashlib.sha256()
+            with open(part_path, 'rb') as f:
+                remaining = offset
+                while remaining > 0:
+                    block = f.read(min(HASH_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+        return hasher
+
+    def _open_locked(self, part_path: str):
+        """
+        Abre o .part para acréscimo com um lock exclusivo (flock: vale entre processos, então
+        também entre workers do uvicorn). Lança UploadBusy se outra requisição já o detém.
+        """
+        try:
+            fd = os.open(part_path, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            raise UploadNotFound("Upload não encontrado.")
+        f = os.fdopen(fd, 'ab')
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            raise UploadBusy("Este upload está recebendo dados em outra requisição; aguarde e consulte o status.")
+        return f
+
+    async def append(self, upload_id: str, offset: int, chunks) -> int:
+        """
+        Acrescenta os blocos recebidos (iterador assíncrono de bytes) a partir de `offset`,
+        que precisa ser igual ao que já foi gravado. Retorna o novo offset.
+        Só uma requisição por vez grava em cada upload (ver `_open_locked`); o offset é
+        conferido de novo com o lock já obtido.
+        """
+        current = await asyncio.to_thread(self.status, upload_id)
+        if offset != current["offset"]:
+            raise UploadOffsetMismatch("Offset diferente do já recebido; consulte o status e retome.", current["offset"])
+        part_path, _ = self._paths(upload_id)
+
+        f = await asyncio.to_thread(self._open_locked, part_path)
+        try:
+            locked_offset = os.fstat(f.fileno()).st_size
+            if offset != locked_offset:
+                raise UploadOffsetMismatch("Offset diferente do já recebido; consulte o status e retome.", locked_offset)
+            hasher = await asyncio.to_thread(self._hasher_at, upload_id, part_path, offset)
+
+            written = offset
+            try:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if written + len(chunk) > current["size"]:
+                        raise UploadTooLarge("Recebidos mais bytes do que o tamanho declarado.")
+                    await asyncio.to_thread(f.write, chunk)
+                    hasher.update(chunk)
+                    written += len(chunk)
+            finally:
+                await asyncio.to_thread(f.flush)
+                # Trunca um bloco rejeitado no meio, para o offset continuar consistente com o hash
+                if os.fstat(f.fileno()).st_size != written:
+                    await asyncio.to_thread(os.ftruncate, f.fileno(), written)
+                with self._lock:
+                    self._hashers[upload_id] = (hasher, written)
+        finally:
+            # Fechar o arquivo libera o lock
+            await asyncio.to_thread(f.close)
+        return written
+
+    async def complete(self, upload_id: str) -> dict:
+        """Finaliza um upload completo; retorna {"path", "sha256", "filename", "reused"}."""
+        current = await asyncio.to_thread(self.status, upload_id)
+        part_path, meta_path = self._paths(upload_id)
+        # Com o lock, nenhuma requisição atrasada grava no .part enquanto ele é finalizado
+        f = await asyncio.to_thread(self._open_locked, part_path)
+        try:
+            offset = os.fstat(f.fileno()).st_size
+            if offset != current["size"]:
+                raise UploadOffsetMismatch("Upload incompleto.", offset)
+            hasher = await asyncio.to_thread(self._hasher_at, upload_id, part_path, offset)
+            result = await asyncio.to_thread(self._store, part_path, hasher.hexdigest(), current["filename"])
+        finally:
+            await asyncio.to_thread(f.close)
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+        await asyncio.to_thread(os.remove, meta_path)
+        return result
+
+    async def ingest(self, filename: str, chunks) -> dict:
+        """Grava um upload recebido de uma só vez (ex.: multipart), com o mesmo hash e limite."""
+        part_path, _ = self._paths(uuid.uuid4().hex)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with await asyncio.to_thread(open, part_path, 'wb') as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(f"Arquivo maior que o limite de {self.max_bytes // (1024 * 1024)} MB.")
+                    await asyncio.to_thread(f.write, chunk)
+                    hasher.update(chunk)
+            if size == 0:
+                raise UploadError("Arquivo vazio.")
+            return await asyncio.to_thread(self._store, part_path, hasher.hexdigest(), os.path.basename(filename or 'video.mp4'))
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    def _store(self, part_path: str, sha256: str, filename: str) -> dict:
+        destination = os.path.join(self.root, f"sha256-{sha256}{_safe_extension(filename)}")
+        reused = os.path.exists(destination)
+        if reused:
+            print(f"Upload idêntico a um arquivo já recebido, reutilizando: {destination}")
+            os.remove(part_path)
+        else:
+            os.replace(part_path, destination)
+        return {"path": destination, "sha256": sha256, "filename": filename, "reused": reused}
+
+    def purge_stale(self, max_age_sec: int = PARTIAL_UPLOAD_TTL_SEC) -> int:
+        """
+        Remove uploads parciais abandonados. Retorna quantos arquivos foram apagados.
+        O .part e o .json de cada upload expiram juntos, pela atividade mais recente dos dois
+        (o .json só é gravado na criação; o .part, a cada bloco recebido), e um upload com o
+        lock de gravação obtido nunca é removido.
+        """
+        removed = 0
+        limit = time.time() - max_age_sec
+        uploads = {}
+        for entry in os.scandir(self.partial_dir):
+            if entry.is_file():
+                uploads.setdefault(os.path.splitext(entry.name)[0], []).append(entry)
+        for upload_id, entries in uploads.items():
+            if max(entry.stat().st_mtime for entry in entries) >= limit:
+                continue
+            part_path, _ = self._paths(upload_id) if _UPLOAD_ID.match(upload_id) else (None, None)
+            try:
+                f = self._open_locked(part_path) if part_path and os.path.exists(part_path) else None
+            except (UploadBusy, UploadNotFound):
+                continue
+            try:
+                for entry in entries:
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+            finally:
+                if f:
+                    f.close()
+            with self._lock:
+                self._hashers.pop(upload_id, None)
+        return removed
+
+
+async def iter_upload_file(upload, block_size: int = HASH_BLOCK_SIZE):
+    """Adapta um UploadFile do Starlette para o iterador assíncrono de blocos usado acima."""
+    while True:
+        block = await upload.read(block_size)
+        if not block:
+            break
+        yield block
@@ -0,0 +1,258 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+
+# Estados em que o job está (ou deveria estar) sendo executado por algum processo
+ACTIVE_STATUSES = ('processing', 'finalizing')
+
+# Identifica este processo como "dono" dos jobs que ele enfileira/executa.
+# host:pid permite detectar rapidamente donos mortos na mesma máquina.
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+HEARTBEAT_INTERVAL_SEC = 30
+OWNER_TTL_SEC = 3 * HEARTBEAT_INTERVAL_SEC
+# Eventos de progresso mais antigos que isso são descartados
+EVENT_TTL_SEC = 7 * 24 * 3600
+
+# Status em que o job não emite mais eventos até uma nova ação do usuário
+TERMINAL_STATUSES = ('pending_adjustment', 'complete', 'error', 'cancelled')
+
+
+def _owner_pid_is_dead(owner: str) -> bool:
+    """Retorna True quando o dono roda nesta máquina e o processo dele não existe mais."""
+    try:
+        host, pid, token = owner.split(':')
+        pid = int(pid)
+    except ValueError:
+        return False
+    if host != socket.gethostname():
+        return False
+    if pid == os.getpid():
+        # Mesmo PID, outra encarnação do processo (ex.: reinício do container)
+        return owner != OWNER_ID
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+class JobStore(ABC):
+    """
+    Interface do armazenamento de jobs. Cada job é um documento JSON (status, clipes,
+    títulos, etapa atual, parâmetros para retomada...) identificado pelo job_id.
+
+    Um backend estilo Redis pode implementar esta interface guardando cada job em um
+    hash (HSET por campo torna `update` atômico) e os heartbeats em chaves com TTL.
+    """
+
+    @abstractmethod
+    def create(self, job_id: str, data: dict) -> None: ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> dict | None: ...
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> dict | None:
+        """Mescla `fields` no documento do job e retorna o documento atualizado."""
+
+    @abstractmethod
+    def delete(self, job_id: str) -> None: ...
+
+    @abstractmethod
+    def list_by_status(self, statuses) -> list: ...
+
+    @abstractmethod
+    def count_by_status(self) -> dict:
+        """Quantidade de jobs em cada status (usado pelo endpoint /metrics)."""
+
+    @abstractmethod
+    def claim(self, job_id: str, expected_owner: str | None, new_owner: str) -> bool:
+        """Troca o dono do job somente se o dono atual for `expected_owner` (compare-and-swap)."""
+
+    @abstractmethod
+    def heartbeat(self, owner: str) -> None: ...
+
+    @abstractmethod
+    def last_heartbeat(self, owner: str) -> float | None: ...
+
+    @abstractmethod
+    def append_event(self, job_id: str, event: dict) -> int:
+        """Registra um evento de progresso do job e retorna seu número de sequência (crescente)."""
+
+    @abstractmethod
+    def events_since(self, job_id: str, after_seq: int = 0) -> list:
+        """Eventos do job com sequência maior que `after_seq`, em ordem, como (seq, evento)."""
+
+    def is_owner_alive(self, owner: str | None) -> bool:
+        if not owner or _owner_pid_is_dead(owner):
+            return False
+        if owner == OWNER_ID:
+            return True
+        last_seen = self.last_heartbeat(owner)
+        return last_seen is not None and time.time() - last_seen < OWNER_TTL_SEC
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Backend padrão: um arquivo SQLite em modo WAL, compartilhado por todos os workers
+    do uvicorn na mesma máquina (ou volume).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY, status TEXT, owner TEXT, data TEXT NOT NULL,"
+                " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+            conn.execute("CREATE TABLE IF NOT EXISTS owners (owner TEXT PRIMARY KEY, heartbeat REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_job ON events(job_id, seq)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # Uma conexão por thread: os workers do agendador acessam o store em paralelo
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _connect(self) -> "_Transaction":
+        return _Transaction(self._conn())
+
+    def create(self, job_id: str, data: dict) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, owner, data, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, data.get('status'), data.get('owner'), json.dumps(data, ensure_ascii=False), now, now),
+            )
+
+    def get(self, job_id: str) -> dict | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, job_id: str, **fields) -> dict | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if not row:
+                return None
+            data = json.loads(row[0])
+            data.update(fields)
+            conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, data = ?, updated_at = ? WHERE job_id = ?",
+                (data.get('status'), data.get('owner'), json.dumps(data, ensure_ascii=False), time.time(), job_id),
+            )
+        return data
+
+    def delete(self, job_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM events WHERE job_id = ?", (job_id,))
+
+    def list_by_status(self, statuses) -> list:
+        statuses = list(statuses)
+        placeholders = ', '.join('?' for _ in statuses)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT job_id, data FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at", statuses
+            ).fetchall()
+        return [dict(json.loads(data), job_id=job_id) for job_id, data in rows]
+
+    def count_by_status(self) -> dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def claim(self, job_id: str, expected_owner: str | None, new_owner: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT owner, data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if not row or row[0] != expected_owner:
+                return False
+            data = json.loads(row[1])
+            data['owner'] = new_owner
+            conn.execute(
+                "UPDATE jobs SET owner = ?, data = ?, updated_at = ? WHERE job_id = ?",
+                (new_owner, json.dumps(data, ensure_ascii=False), time.time(), job_id),
+            )
+        return True
+
+    def heartbeat(self, owner: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO owners (owner, heartbeat) VALUES (?, ?) "
+                "ON CONFLICT(owner) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (owner, time.time()),
+            )
+            # Remove donos que sumiram há muito tempo
+            conn.execute("DELETE FROM owners WHERE heartbeat < ?", (time.time() - 100 * OWNER_TTL_SEC,))
+            conn.execute("DELETE FROM events WHERE created_at < ?", (time.time() - EVENT_TTL_SEC,))
+
+    def last_heartbeat(self, owner: str) -> float | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT heartbeat FROM owners WHERE owner = ?", (owner,)).fetchone()
+        return row[0] if row else None
+
+    def append_event(self, job_id: str, event: dict) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO events (job_id, data, created_at) VALUES (?, ?, ?)",
+                (job_id, json.dumps(event, ensure_ascii=False), time.time()),
+            )
+            return cursor.lastrowid
+
+    def events_since(self, job_id: str, after_seq: int = 0) -> list:
+        # Leitura simples, sem BEGIN IMMEDIATE: é chamada em laço pelos streams de eventos
+        rows = self._conn().execute(
+            "SELECT seq, data FROM events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after_seq)
+        ).fetchall()
+        return [(seq, json.loads(data)) for seq, data in rows]
+
+
+class _Transaction:
+    """Context manager que envolve um bloco em BEGIN IMMEDIATE/COMMIT (ou ROLLBACK em caso de erro)."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def create_job_store() -> JobStore:
+    """
+    Cria o store configurado em VC_JOB_STORE. Hoje apenas 'sqlite:///<caminho>' é suportado;
+    o padrão é um arquivo em data/jobs.sqlite3.
+    """
+    url = os.environ.get('VC_JOB_STORE', 'sqlite:///data/jobs.sqlite3')
+    scheme, _, location = url.partition('://')
+    if scheme == 'sqlite':
+        return SQLiteJobStore(location.lstrip('/') if not location.startswith('//') else location[1:])
+    raise ValueError(f"Backend de job store não suportado: {scheme}")
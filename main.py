@@ -1,77 +1,212 @@
+import asyncio
+import json
+import mimetypes
 import os
-import shutil
+import threading
+import time
 import uuid
-import yt_dlp
 import zipfile
-from fastapi import FastAPI, File, UploadFile, Request, BackgroundTasks, Form, HTTPException, Path
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse
+from urllib.parse import quote
+from fastapi import FastAPI, File, UploadFile, Request, Form, HTTPException, Path
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from starlette.background import BackgroundTask
 
-from processing import initial_process, finalize_process
+from processing import initial_process, finalize_process, create_workspace, cleanup_workspace, WORKSPACES_DIR
+from scheduler import SCHEDULER, QueueFullError, PRIORITY_INITIAL, PRIORITY_FINALIZE
+from scripts.content_cache import CACHE, normalize_video_url
+from scripts.encoder_profiles import PROFILES, DEFAULT_PROFILE
+from scripts.metrics import METRICS
+from job_store import create_job_store, ACTIVE_STATUSES, TERMINAL_STATUSES, OWNER_ID, HEARTBEAT_INTERVAL_SEC
+from ingest import ResumableUploads, UploadError, UploadOffsetMismatch, iter_upload_file
 
 # --- CONFIGURAÇÃO DA APLICAÇÃO ---
 app = FastAPI()
 
-os.makedirs("uploads", exist_ok=True); os.makedirs("outputs", exist_ok=True); os.makedirs("tmp", exist_ok=True)
+os.makedirs("uploads", exist_ok=True); os.makedirs("outputs", exist_ok=True); os.makedirs("tmp", exist_ok=True); os.makedirs(WORKSPACES_DIR, exist_ok=True)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/clips", StaticFiles(directory="tmp"), name="clips")
 app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
 
 templates = Jinja2Templates(directory="templates")
-JOBS = {}
+# Prévias de um job não mudam até o workspace ser removido; o navegador pode reaproveitá-las
+CLIP_CACHE_MAX_AGE_SEC = int(os.environ.get('VC_CLIP_CACHE_MAX_AGE_SEC', 3600))
+# Store persistente compartilhado por todos os workers do uvicorn (SQLite por padrão)
+JOBS = create_job_store()
+# Uploads gravados em streaming, com hash e limite de tamanho (e retomáveis, via /uploads)
+UPLOADS = ResumableUploads()
+
+# --- AGENDAMENTO E RETOMADA DE JOBS ---
+
+def _submit_initial(job_id: str, job: dict):
+    SCHEDULER.submit(
+        job_id,
+        initial_process,
+        priority=PRIORITY_INITIAL,
+        job_id=job_id,
+        job_store=JOBS,
+        input_video_path=job["input_video_path"],
+        model=job["model"],
+        compute_type=job["compute_type"],
+        pycaps_template=job["pycaps_template"],
+        batch_size=job["batch_size"],
+        workspace_dir=job["workspace"],
+        video_url=job.get("video_url"),
+        encoder_profile=job.get("encoder_profile")
+    )
+
+def _submit_finalize(job_id: str, job: dict):
+    SCHEDULER.submit(
+        job_id,
+        finalize_process,
+        priority=PRIORITY_FINALIZE,
+        job_id=job_id,
+        job_store=JOBS,
+        clips_data=job["clips_data"],
+        original_base_name=job.get("original_name", "video_sem_nome"),
+        pycaps_template=job.get("pycaps_template", "default"),  # Recupera o template armazenado no job
+        workspace_dir=job["workspace"],
+        encoder_profile=job.get("encoder_profile")
+    )
+
+def resume_interrupted_jobs():
+    """
+    Reenfileira os jobs ativos cujo dono (processo que os executava) morreu,
+    por exemplo após um reinício do servidor. O claim é atômico, então apenas
+    um worker do uvicorn assume cada job.
+    """
+    for job in JOBS.list_by_status(ACTIVE_STATUSES):
+        job_id, previous_owner = job["job_id"], job.get("owner")
+        if JOBS.is_owner_alive(previous_owner) or not JOBS.claim(job_id, previous_owner, OWNER_ID):
+            continue
+        print(f"♻️ Retomando Job {job_id} (status: {job['status']}, etapa: {job.get('stage')})")
+        try:
+            if job["status"] == "finalizing":
+                _submit_finalize(job_id, job)
+            else:
+                _submit_initial(job_id, job)
+        except QueueFullError:
+            # Devolve o job para que outro processo (ou a próxima rodada) o assuma
+            JOBS.claim(job_id, OWNER_ID, previous_owner)
+            return
+
+def _heartbeat_loop():
+    while True:
+        try:
+            JOBS.heartbeat(OWNER_ID)
+            resume_interrupted_jobs()
+        except Exception as e:
+            print(f"⚠️ Falha no heartbeat/retomada de jobs: {e}")
+        time.sleep(HEARTBEAT_INTERVAL_SEC)
+
+@app.on_event("startup")
+async def start_job_recovery():
+    threading.Thread(target=_heartbeat_loop, name="job-heartbeat", daemon=True).start()
+    removed = UPLOADS.purge_stale()
+    if removed:
+        print(f"{removed} arquivo(s) de uploads parciais abandonados removidos.")
+
+# --- UPLOAD RETOMÁVEL EM PARTES ---
+
+def _upload_http_error(error: UploadError) -> HTTPException:
+    headers = {"Upload-Offset": str(error.offset)} if isinstance(error, UploadOffsetMismatch) else None
+    return HTTPException(status_code=error.status_code, detail=str(error), headers=headers)
+
+@app.post("/uploads", response_class=JSONResponse)
+async def create_upload(filename: str = Form(...), size: int = Form(...)):
+    """Abre um upload retomável; o cliente envia as partes com PATCH /uploads/<id>."""
+    try:
+        return UPLOADS.create(filename, size)
+    except UploadError as e:
+        raise _upload_http_error(e)
+
+@app.get("/uploads/{upload_id}", response_class=JSONResponse)
+async def upload_status(upload_id: str):
+    """Offset já recebido, para o cliente retomar um upload interrompido."""
+    try:
+        return UPLOADS.status(upload_id)
+    except UploadError as e:
+        raise _upload_http_error(e)
+
+@app.patch("/uploads/{upload_id}", response_class=JSONResponse)
+async def upload_chunk(request: Request, upload_id: str):
+    """Recebe uma parte no corpo da requisição, a partir do offset do cabeçalho Upload-Offset."""
+    try:
+        offset = int(request.headers.get("upload-offset", ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cabeçalho Upload-Offset ausente ou inválido.")
+    try:
+        return {"offset": await UPLOADS.append(upload_id, offset, request.stream())}
+    except UploadError as e:
+        raise _upload_http_error(e)
 
 # --- ENDPOINTS PRINCIPAIS DA APLICAÇÃO ---
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse("index.html", {"request": request, "encoder_profiles": PROFILES.values(), "default_encoder_profile": DEFAULT_PROFILE})
 
 @app.post("/upload/", response_class=HTMLResponse)
-async def upload_video(background_tasks: BackgroundTasks, request: Request, model: str = Form(...), compute_type: str = Form(...), batch_size: int = Form(...), pycaps_template: str = Form(...), video: UploadFile = File(None), video_url: str = Form(None)):
-    if not video and not video_url: 
+async def upload_video(request: Request, model: str = Form(...), compute_type: str = Form(...), batch_size: int = Form(...), pycaps_template: str = Form(...), video: UploadFile = File(None), video_url: str = Form(None), upload_id: str = Form(None), encoder_profile: str = Form(None)):
+    if not video and not video_url and not upload_id: 
         raise HTTPException(status_code=400, detail="Nenhum arquivo de vídeo ou URL fornecido.")
+    if encoder_profile and encoder_profile not in PROFILES:
+        raise HTTPException(status_code=400, detail=f"Perfil de codificação desconhecido: {encoder_profile}")
+    # Rejeita cedo, antes de gravar ou baixar o vídeo, quando a fila já está cheia
+    if SCHEDULER.is_full():
+        raise HTTPException(status_code=429, detail="Fila de processamento cheia. Tente novamente em alguns minutos.")
     
     video_path = ""
-    if video and video.filename:
-        video_path = os.path.join("uploads", video.filename)
-        with open(video_path, "wb") as buffer:
-            shutil.copyfileobj(video.file, buffer)
-    elif video_url:
-        upload_dir = "uploads"
-        unique_filename = f"{uuid.uuid4()}.mp4"
-        video_path = os.path.join(upload_dir, unique_filename)
-        ydl_opts = {"format": "bestvideo[height=1080][ext=mp4]+bestaudio[ext=m4a]/best[height=1080][ext=mp4]/bestvideo[height=720][ext=mp4]+bestaudio[ext=m4a]/best[height=720][ext=mp4]", 'outtmpl': video_path, 'noplaylist': True}
+    original_base_name = None
+    upload_sha256 = None
+    if upload_id or (video and video.filename):
+        # Upload retomável já enviado em partes, ou arquivo do formulário gravado em streaming
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([video_url])
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Não foi possível baixar o vídeo. Erro: {e}")
+            if upload_id:
+                stored = await UPLOADS.complete(upload_id)
+            else:
+                stored = await UPLOADS.ingest(video.filename, iter_upload_file(video))
+        except UploadError as e:
+            raise _upload_http_error(e)
+        video_path = stored["path"]
+        upload_sha256 = stored["sha256"]
+        original_base_name = os.path.splitext(stored["filename"])[0]
+    elif video_url:
+        # URLs conhecidas viram um ID estável, então o mesmo vídeo reaproveita o download anterior.
+        # O download em si é a primeira etapa do job, executada pelo agendador.
+        video_id = normalize_video_url(video_url)
+        video_path = os.path.join("uploads", f"{video_id or uuid.uuid4()}.mp4")
 
-    if not video_path or not os.path.exists(video_path):
-        raise HTTPException(status_code=500, detail="Falha ao salvar ou baixar o vídeo.")
+    if not video_path or (not video_url and not os.path.exists(video_path)):
+        raise HTTPException(status_code=500, detail="Falha ao salvar o vídeo.")
     
-    original_base_name = os.path.splitext(os.path.basename(video_path))[0]
+    original_base_name = original_base_name or os.path.splitext(os.path.basename(video_path))[0]
     job_id = str(uuid.uuid4())
-    JOBS[job_id] = {
+    workspace_dir = create_workspace(job_id)
+    job = {
         "status": "processing",
         "clips": [],
         "original_name": original_base_name,
-        "pycaps_template": pycaps_template  # Armazena o template no dicionário JOBS
+        "pycaps_template": pycaps_template,  # Armazena o template no job
+        "encoder_profile": encoder_profile or DEFAULT_PROFILE,
+        "workspace": workspace_dir,
+        # Parâmetros guardados para permitir retomar o job após um reinício
+        "input_video_path": video_path,
+        "model": model,
+        "compute_type": compute_type,
+        "batch_size": batch_size,
+        "upload_sha256": upload_sha256,
+        "video_url": video_url if not upload_sha256 else None,
+        "owner": OWNER_ID
     }
+    JOBS.create(job_id, job)
     
-    background_tasks.add_task(
-        initial_process,
-        job_id=job_id,
-        jobs_dict=JOBS,
-        input_video_path=video_path,
-        model=model,
-        compute_type=compute_type,
-        pycaps_template=pycaps_template,
-        batch_size=batch_size
-    )
+    try:
+        _submit_initial(job_id, job)
+    except QueueFullError as e:
+        JOBS.delete(job_id)
+        cleanup_workspace(workspace_dir)
+        raise HTTPException(status_code=429, detail=str(e))
     return RedirectResponse(url=f"/adjust/{job_id}", status_code=303)
 
 @app.get("/adjust/{job_id}", response_class=HTMLResponse)
@@ -85,22 +220,106 @@ async def adjust_page(request: Request, job_id: str = Path(...)):
     if job["status"] == "complete":
         return RedirectResponse(url="/outputs", status_code=303)
 
+    if job["status"] == "cancelled":
+        return RedirectResponse(url="/", status_code=303)
+
     # --- MUDANÇA CRÍTICA AQUI ---
     # Prepara os dados para o template, garantindo que o nome do arquivo e a URL também sejam passados.
     clips_for_template = []
     for clip_data in job.get("clips", []):
         path = clip_data["path"]
+        # A página de ajuste usa só as prévias leves; o clipe em `path` segue para a finalização
+        preview = clip_data.get("preview", path)
         clips_for_template.append({
             "path": path,
             "title": clip_data["title"],
             "name": os.path.basename(path),
-            "url": f"/clips/{os.path.basename(path)}"
+            "url": f"/clips/{job_id}/{os.path.basename(preview)}",
+            "poster_url": f"/clips/{job_id}/{os.path.basename(clip_data['poster'])}" if clip_data.get("poster") else None,
+            "sprite_url": f"/clips/{job_id}/{os.path.basename(clip_data['sprite'])}" if clip_data.get("sprite") else None,
+            # Enquadramento sugerido no processamento inicial (ver scripts/roi_suggest.py), se houver
+            "rois": {key: clip_data[key] for key in ("roi1", "roi2") if key in clip_data},
         })
 
     return templates.TemplateResponse("adjust.html", {"request": request, "job_id": job_id, "clips": clips_for_template})
 
+# --- PRÉVIAS DOS CLIPES (com suporte a Range) ---
+
+def _iter_file_range(path: str, start: int, length: int, block_size: int = 256 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(block_size, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+class RangeNotSatisfiable(Exception):
+    """Intervalo bem formado, mas fora do arquivo (resposta 416)."""
+
+def _parse_range(range_header: str, size: int):
+    """
+    Interpreta um cabeçalho 'Range: bytes=...' (um único intervalo). Retorna (início, fim), ou None
+    se o cabeçalho for malformado ou não suportado (deve ser ignorado: RFC 9110, seção 14.2);
+    levanta RangeNotSatisfiable se o intervalo for válido mas não couber no arquivo.
+    """
+    unit, _, spec = range_header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # Sufixo: últimos N bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(int(last), size - 1) if last else size - 1
+
+def _ranged_file_response(request: Request, path: str, max_age: int) -> Response:
+    """
+    Serve um arquivo com suporte a requisições parciais (206), ETag/304 e Cache-Control,
+    para que o player baixe só o trecho que vai tocar e reaproveite o que já tem em cache.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    media_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    headers = {"Accept-Ranges": "bytes", "ETag": etag, "Cache-Control": f"private, max-age={max_age}"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if not range_header or request.headers.get("if-range", etag) != etag:
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    try:
+        byte_range = _parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    start, end = byte_range
+    headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+    return StreamingResponse(_iter_file_range(path, start, end - start + 1), status_code=206, media_type=media_type, headers=headers)
+
+# Os clipes de cada job ficam em WORKSPACES_DIR/<job_id>/ e são servidos em /clips/<job_id>/<arquivo>
+@app.get("/clips/{job_id}/{filename}")
+async def serve_clip(request: Request, job_id: str, filename: str):
+    path = os.path.join(WORKSPACES_DIR, job_id, filename)
+    if os.path.basename(job_id) != job_id or os.path.basename(filename) != filename or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado.")
+    return _ranged_file_response(request, path, CLIP_CACHE_MAX_AGE_SEC)
+
 @app.post("/finalize/{job_id}", response_class=HTMLResponse)
-async def finalize_job(request: Request, background_tasks: BackgroundTasks, job_id: str = Path(...)):
+async def finalize_job(request: Request, job_id: str = Path(...)):
     job = JOBS.get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job não encontrado.")
@@ -128,31 +347,132 @@ async def finalize_job(request: Request, background_tasks: BackgroundTasks, job_
         }
         i += 1
 
-    job["status"] = "finalizing"
-    original_name = job.get("original_name", "video_sem_nome")
-    pycaps_template = job.get("pycaps_template", "default")  # Recupera o template armazenado no JOBS
-    
-    background_tasks.add_task(
-        finalize_process,
-        job_id=job_id,
-        jobs_dict=JOBS,
-        clips_data=clips_data,
-        original_base_name=original_name,
-        pycaps_template=pycaps_template
-    )
+    # Completa com os dados do corte (intervalo e vídeo original) guardados no job
+    for clip in job.get("clips", []):
+        if clip["path"] in clips_data:
+            for key in ("start", "end", "source"):
+                if key in clip:
+                    clips_data[clip["path"]][key] = clip[key]
+
+    previous_status = job["status"]
+    job = JOBS.update(job_id, status="finalizing", clips_data=clips_data, owner=OWNER_ID)
+    JOBS.append_event(job_id, {"type": "status", "time": time.time(), "status": "finalizing"})
+    try:
+        _submit_finalize(job_id, job)
+    except QueueFullError as e:
+        JOBS.update(job_id, status=previous_status)
+        raise HTTPException(status_code=429, detail=str(e))
     return RedirectResponse(url=f"/adjust/{job_id}", status_code=303)
 
+@app.post("/cancel/{job_id}", response_class=JSONResponse)
+async def cancel_job(job_id: str):
+    """Cancela um job em processamento: sai da fila se ainda não começou, ou é interrompido na próxima checagem."""
+    job = JOBS.get(job_id)
+    if not job: raise HTTPException(status_code=404, detail="Job não encontrado.")
+    if job.get("status") != "processing":
+        raise HTTPException(status_code=409, detail="Apenas jobs em processamento podem ser cancelados.")
+    JOBS.update(job_id, cancel_requested=True)
+    if SCHEDULER.cancel(job_id):
+        JOBS.update(job_id, status="cancelled")
+        JOBS.append_event(job_id, {"type": "status", "time": time.time(), "status": "cancelled"})
+        cleanup_workspace(job.get("workspace"))
+    return {"status": JOBS.get(job_id).get("status")}
+
 @app.get("/status/{job_id}", response_class=JSONResponse)
 async def get_status(job_id: str):
     job = JOBS.get(job_id)
     if not job: raise HTTPException(status_code=404, detail="Job não encontrado.")
-    return {"status": job.get("status")}
+    # queue_position é None quando o job já está em execução (ou concluído)
+    return {
+        "status": job.get("status"),
+        "queue_position": SCHEDULER.position(job_id),
+        "stage": job.get("stage"),
+        "download_progress": job.get("download_progress"),
+        "render_progress": job.get("render_progress"),
+        "timings": job.get("timings"),
+    }
+
+# --- MÉTRICAS (formato Prometheus) ---
+# Fila e slots são deste worker do uvicorn; a contagem de jobs vem do store compartilhado.
+METRICS.collector("vc_queue_depth", "Jobs aguardando na fila do agendador.", lambda: SCHEDULER.stats()["queued"])
+METRICS.collector("vc_jobs_running", "Jobs em execução nos workers do agendador.", lambda: SCHEDULER.stats()["running"])
+METRICS.collector("vc_resource_slots_in_use", "Slots ocupados por recurso (transcrição, LLM, encode, download).",
+                  lambda: {(("resource", name),): r["in_use"] for name, r in SCHEDULER.stats()["resources"].items()})
+METRICS.collector("vc_resource_slots_limit", "Limite de slots por recurso.",
+                  lambda: {(("resource", name),): r["limit"] for name, r in SCHEDULER.stats()["resources"].items()})
+METRICS.collector("vc_jobs", "Jobs no store, por status.",
+                  lambda: {(("status", status or "unknown"),): count for status, count in JOBS.count_by_status().items()})
+METRICS.collector("vc_cache_hits_total", "Acertos do cache de conteúdo, por namespace.",
+                  lambda: {(("namespace", ns),): c["hits"] for ns, c in CACHE.stats().items()}, kind="counter")
+METRICS.collector("vc_cache_misses_total", "Faltas do cache de conteúdo, por namespace.",
+                  lambda: {(("namespace", ns),): c["misses"] for ns, c in CACHE.stats().items()}, kind="counter")
+
+@app.get("/metrics")
+async def metrics():
+    """Tempos por etapa, subprocessos (wall/CPU), fila, slots, jobs e cache, para o Prometheus."""
+    body = await asyncio.to_thread(METRICS.render)
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Intervalo entre leituras do log de eventos por stream (leitura local no SQLite, sem requisições do cliente)
+EVENTS_POLL_INTERVAL_SEC = 0.5
+EVENTS_KEEPALIVE_SEC = 15
+
+def _sse(data: dict, event_id: int | None = None) -> str:
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/events/{job_id}")
+async def job_events(request: Request, job_id: str):
+    """
+    Server-Sent Events com o progresso do job: etapas, download, transcrição, chunks
+    analisados, clipes cortados/renderizados (com ETA) e mudanças de status. Reconexões
+    continuam do último evento recebido (cabeçalho Last-Event-ID).
+    """
+    if not JOBS.get(job_id): raise HTTPException(status_code=404, detail="Job não encontrado.")
+    try:
+        last_seq = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_seq = 0
+
+    async def stream():
+        nonlocal last_seq
+        last_position = None
+        last_sent = time.monotonic()
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            events = await asyncio.to_thread(JOBS.events_since, job_id, last_seq)
+            for seq, event in events:
+                last_seq = seq
+                yield _sse(event, seq)
+                last_sent = time.monotonic()
+
+            # A posição na fila só é conhecida pelo processo que enfileirou o job
+            position = SCHEDULER.position(job_id)
+            if position != last_position:
+                last_position = position
+                yield _sse({"type": "queue", "position": position})
+                last_sent = time.monotonic()
+
+            if not events:
+                job = await asyncio.to_thread(JOBS.get, job_id)
+                if not job or job.get("status") in TERMINAL_STATUSES:
+                    return
+            if time.monotonic() - last_sent > EVENTS_KEEPALIVE_SEC:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(EVENTS_POLL_INTERVAL_SEC)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/outputs", response_class=HTMLResponse)
-async def list_outputs(request: Request):
+async def list_outputs(request: Request, job_id: str | None = None):
     outputs_dir = "outputs"
     videos = sorted([f for f in os.listdir(outputs_dir) if f.endswith('.mp4')], reverse=True)
-    return templates.TemplateResponse("outputs.html", {"request": request, "videos": videos})
+    # Vindo de um job recém-finalizado, a página oferece o .zip só com os clipes dele
+    job = JOBS.get(job_id) if job_id else None
+    job_videos = [f for f in job.get("outputs", []) if f in videos] if job else []
+    return templates.TemplateResponse("outputs.html", {"request": request, "videos": videos,
+                                                       "job_id": job_id if job_videos else None, "job_videos": job_videos})
 
 @app.get("/download/{filename}")
 async def download_video(filename: str):
@@ -166,32 +486,73 @@ async def delete_video(filename: str):
     if os.path.exists(path): os.remove(path)
     return RedirectResponse(url="/outputs", status_code=303)
 
-from fastapi import BackgroundTasks
-from fastapi.responses import FileResponse, RedirectResponse
-import os, zipfile
+# Bloco lido de cada vídeo ao montar o .zip em streaming
+ZIP_STREAM_BLOCK_SIZE = 1024 * 1024
+
+class _ZipSink:
+    """
+    Destino do ZipFile sem seek: guarda os bytes escritos até o gerador repassá-los ao cliente.
+    Sem seek, o zipfile grava tamanhos e CRC em data descriptors após cada arquivo.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+def _iter_zip(paths: list):
+    """
+    Gera um .zip (sem compressão: MP4 já é comprimido) bloco a bloco, sem arquivo temporário.
+    É um gerador síncrono: o Starlette o consome em uma thread, fora do event loop.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for path in paths:
+            info = zipfile.ZipInfo.from_file(path, arcname=os.path.basename(path))
+            info.compress_type = zipfile.ZIP_STORED
+            with open(path, 'rb') as source, archive.open(info, 'w') as target:
+                while block := source.read(ZIP_STREAM_BLOCK_SIZE):
+                    target.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+    # Diretório central, escrito ao fechar o arquivo
+    yield sink.drain()
 
 @app.get("/download-all")
-async def download_all_videos():
+async def download_all_videos(job_id: str | None = None):
+    """Baixa os vídeos finalizados (todos, ou só os do job informado) em um .zip gerado em streaming."""
     outputs_dir = "outputs"
-    video_files = [f for f in os.listdir(outputs_dir) if f.endswith('.mp4')]
-    
+    if job_id:
+        job = JOBS.get(job_id)
+        if not job: raise HTTPException(status_code=404, detail="Job não encontrado.")
+        video_files = [f for f in job.get("outputs", []) if os.path.isfile(os.path.join(outputs_dir, f))]
+        archive_name = f"viralcutter_{job.get('original_name', job_id)}.zip"
+    else:
+        video_files = sorted(f for f in os.listdir(outputs_dir) if f.endswith('.mp4'))
+        archive_name = "viralcutter_videos.zip"
+
     if not video_files:
         return RedirectResponse(url="/outputs")
-    
-    # Garante que a pasta tmp exista
-    tmp_dir = "tmp"
-    os.makedirs(tmp_dir, exist_ok=True)
-    
-    zip_path = os.path.join(tmp_dir, "viralcutter_videos.zip")
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for video in video_files:
-            zipf.write(os.path.join(outputs_dir, video), arcname=video)
-    
-    return FileResponse(
-        zip_path,
+
+    return StreamingResponse(
+        _iter_zip([os.path.join(outputs_dir, f) for f in video_files]),
         media_type='application/zip',
-        filename='viralcutter_videos.zip',
-        background=BackgroundTasks().add_task(os.remove, zip_path)
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(archive_name)}"},
     )
 
 
@@ -2,27 +2,76 @@ import os
 import subprocess
 import json
 import shutil
-from scripts import create_viral_segments, cut_segments, edit_video
-from glob import glob
+import threading
+import time
+from scripts import audio_extract, create_viral_segments, cut_segments, download, edit_video, metrics, prerank, roi_suggest, transcription
+from scripts.content_cache import CACHE, hash_audio_stream, make_key
+from scripts.encoder_profiles import get_profile
+from scripts.media_probe import probe
+from scheduler import SCHEDULER, RESOURCE_TRANSCRIPTION, RESOURCE_LLM, RESOURCE_ENCODE, RESOURCE_DOWNLOAD
 
-def generate_whisperx(input_file: str, output_dir: str, model: str, compute_type: str, batch_size: int):
+# 'proxy': o corte gera só prévias leves e a renderização final lê o vídeo original
+# (uma única codificação de alta qualidade); 'full': corta clipes em qualidade final.
+PIPELINE_MODE = os.environ.get('VC_PIPELINE_MODE', 'proxy')
+# Pipeline em fluxo: a transcrição sai em janelas, cada chunk vai ao LLM assim que é coberto
+# e os segmentos promissores são cortados na hora (ver _stream_segments); '0' volta ao fluxo sequencial
+STREAMING_PIPELINE = os.environ.get('VC_STREAMING_PIPELINE', '1') == '1'
+
+metrics.METRICS.counter("vc_stream_candidate_cuts_total", "Cortes antecipados do pipeline em fluxo, por resultado (kept, discarded).")
+
+# Cada job ganha um diretório próprio em WORKSPACES_DIR/<job_id>, para que vários
+# vídeos possam ser processados em paralelo sem que um sobrescreva os arquivos do outro.
+WORKSPACES_DIR = 'workspaces'
+
+def create_workspace(job_id: str) -> str:
+    """
+    Cria (se necessário) e retorna o diretório de trabalho isolado do job.
+    """
+    workspace_dir = os.path.join(WORKSPACES_DIR, job_id)
+    os.makedirs(workspace_dir, exist_ok=True)
+    return workspace_dir
+
+def cleanup_workspace(workspace_dir: str):
+    """
+    Remove o diretório de trabalho de um job, sem tocar nos diretórios dos demais jobs.
+    """
+    if workspace_dir and os.path.isdir(workspace_dir):
+        shutil.rmtree(workspace_dir, ignore_errors=True)
+        print(f"Workspace removido: {workspace_dir}")
+
+def _engine_mode() -> bool:
+    """Indica se a transcrição usa o motor em processo (e não a CLI do WhisperX)."""
+    return os.environ.get('VC_WHISPERX_MODE', 'engine') != 'cli' and transcription.whisperx_available()
+
+def generate_whisperx(input_file: str, output_dir: str, model: str, compute_type: str, batch_size: int, output_name: str | None = 'input_video.tsv', on_progress=None):
     """
     Executa a transcrição do WhisperX e salva o resultado no diretório de saída especificado.
+    Se 'output_name' for informado, o TSV gerado é renomeado para esse nome dentro de 'output_dir'.
+
+    Por padrão usa o motor em processo (scripts.transcription.ENGINE), que mantém os modelos
+    carregados entre jobs. A CLI do WhisperX é usada quando o pacote não pode ser importado
+    ou quando VC_WHISPERX_MODE=cli.
     """
     print("\n" + "="*50); print("INICIANDO PROCESSO DE TRANSCRIÇÃO"); print("="*50)
     if not os.path.exists(input_file): raise FileNotFoundError(f"Arquivo de entrada não encontrado: {input_file}")
     
     os.makedirs(output_dir, exist_ok=True)
+
+    if _engine_mode():
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        output_path = os.path.join(output_dir, output_name or f"{base_name}.tsv")
+        print(f"Salvando transcrição em: {output_path}")
+        return transcription.ENGINE.transcribe_to_tsv(input_file, output_path, model=model, compute_type=compute_type, batch_size=batch_size, on_progress=on_progress)
     
     command = f"""whisperx "{input_file}" --model {model} --task transcribe --align_model WAV2VEC2_ASR_LARGE_LV60K_960H --chunk_size 10 --vad_onset 0.4 --vad_offset 0.3 --compute_type {compute_type} --batch_size {batch_size} --output_dir "{output_dir}" --output_format tsv --verbose True"""
     try:
         print(f"Salvando transcrição em: {output_dir}")
-        subprocess.run(command, shell=True, text=True, capture_output=True, encoding='utf-8', check=True)
+        metrics.run(command, "whisperx", shell=True, text=True, capture_output=True, encoding='utf-8', check=True)
         base_name = os.path.splitext(os.path.basename(input_file))[0]
         expected_tsv = os.path.join(output_dir, f"{base_name}.tsv")
         
-        if output_dir == 'tmp':
-            renamed_tsv = os.path.join('tmp', 'input_video.tsv')
+        if output_name:
+            renamed_tsv = os.path.join(output_dir, output_name)
             # Renomeia apenas se o arquivo esperado existir
             if os.path.exists(expected_tsv):
                 os.rename(expected_tsv, renamed_tsv)
@@ -34,61 +83,378 @@ def generate_whisperx(input_file: str, output_dir: str, model: str, compute_type
         return expected_tsv
     except subprocess.CalledProcessError as e: print(f"\n❌ ERRO WhisperX:\nStderr: {e.stderr}"); raise
 
-def initial_process(job_id: str, jobs_dict: dict, input_video_path: str, model: str, compute_type: str, batch_size: int, pycaps_template: str):
+def _emit(job_store, job_id: str, event_type: str, **data):
+    """Publica um evento de progresso do job (lido pelo stream /events/<job_id>)."""
+    job_store.append_event(job_id, {"type": event_type, "time": time.time(), **data})
+
+def _eta(started: float, done: int, total: int) -> int | None:
+    """Estimativa simples, em segundos, do tempo restante a partir do ritmo até agora."""
+    if not done:
+        return None
+    return round((time.time() - started) / done * (total - done))
+
+def _set_status(job_store, job_id: str, status: str, **fields):
+    """Atualiza o status do job e avisa os streams de eventos (com a mensagem de erro, se houver)."""
+    job_store.update(job_id, status=status, **fields)
+    if "error" in fields:
+        _emit(job_store, job_id, "status", status=status, error=fields["error"])
+    else:
+        _emit(job_store, job_id, "status", status=status)
+
+def _mark_stage(job_store, job_id: str, stage: str, done: bool = False, timings: dict | None = None):
+    """
+    Registra a etapa atual do job no store. Etapas concluídas ficam em 'stages_done'
+    e permitem retomar um job interrompido sem refazer o que já foi salvo no workspace.
+    Se informados, os tempos medidos até aqui ('timings') são salvos junto.
+    """
+    job = job_store.get(job_id) or {}
+    stages_done = job.get("stages_done", [])
+    if done and stage not in stages_done:
+        stages_done = stages_done + [stage]
+    fields = {"timings": timings} if timings is not None else {}
+    job_store.update(job_id, stage=stage, stages_done=stages_done, **fields)
+    _emit(job_store, job_id, "stage", stage=stage, done=done)
+
+class JobCancelled(Exception):
+    """O usuário cancelou o job; a etapa em andamento é interrompida."""
+
+def _cancel_requested(job_store, job_id: str) -> bool:
+    return bool((job_store.get(job_id) or {}).get("cancel_requested"))
+
+def _check_cancelled(job_store, job_id: str):
+    if _cancel_requested(job_store, job_id):
+        raise JobCancelled("Job cancelado pelo usuário.")
+
+def _transcribe(job_store, job_id: str, input_video_path: str, workspace_dir: str, model: str, compute_type: str, batch_size: int,
+                transcript_key: str, timings: dict, on_window=None) -> bool:
     """
-    Etapa 1: Transcreve o vídeo principal e o corta em segmentos.
+    Etapa de transcrição: retoma do workspace, reaproveita o cache ou transcreve o áudio do job.
+    Com `on_window(linhas, coberto_até)` e o motor em processo, a transcrição sai em janelas que
+    terminam logo depois de cada chunk do LLM, entregues (DataFrame em segundos) assim que ficam prontas.
+    Retorna True se as janelas foram entregues; senão, a transcrição completa está em input_video.tsv.
+    """
+    transcript_path = os.path.join(workspace_dir, 'input_video.tsv')
+    stages_done = (job_store.get(job_id) or {}).get("stages_done", [])
+    if "transcription" in stages_done and os.path.exists(transcript_path):
+        print(f"Retomando Job {job_id}: transcrição já existente em {transcript_path}")
+        return False
+
+    _mark_stage(job_store, job_id, "transcription")
+    windowed = False
+    cached_transcript = CACHE.get('transcripts', transcript_key, 'input_video.tsv')
+    if cached_transcript:
+        shutil.copyfile(cached_transcript, transcript_path)
+    else:
+        # Demux + decodificação do áudio uma única vez, fora do slot de transcrição (GPU);
+        # o WAV de 16 kHz fica no workspace para a transcrição e as análises de áudio do job
+        audio_path = audio_extract.extract_audio(input_video_path, workspace_dir, timings=timings)
+        on_progress = lambda phase, percent: _emit(job_store, job_id, "transcription", phase=phase, percent=percent)
+        windowed = on_window is not None and _engine_mode()
+        with SCHEDULER.slot(RESOURCE_TRANSCRIPTION), metrics.timed("transcription", timings):
+            if windowed:
+                audio = audio_extract.open_audio(audio_path)
+                boundaries = create_viral_segments.chunk_cover_times(len(audio) / audio_extract.SAMPLE_RATE)
+                segments = []
+                for _, covered_until, window_segments in transcription.ENGINE.transcribe_windows(
+                        audio, model, compute_type, batch_size, boundaries, on_progress=on_progress):
+                    _check_cancelled(job_store, job_id)
+                    segments += window_segments
+                    on_window(transcription.segments_frame(window_segments), covered_until)
+                transcription.write_tsv(segments, transcript_path)
+            else:
+                generate_whisperx(audio_path, output_dir=workspace_dir, model=model, compute_type=compute_type, batch_size=batch_size,
+                                  on_progress=on_progress)
+        CACHE.put('transcripts', transcript_key, transcript_path, 'input_video.tsv')
+    _mark_stage(job_store, job_id, "transcription", done=True, timings=timings)
+    return windowed
+
+def _stream_segments(job_store, job_id: str, input_video_path: str, workspace_dir: str, model: str, compute_type: str, batch_size: int,
+                     transcript_key: str, segments_key: str, segment_params: dict, timings: dict, encoder_profile: str | None):
+    """
+    Pipeline em fluxo (VC_STREAMING_PIPELINE=1): transcrição, análise do LLM e corte se sobrepõem.
+    Cada chunk de 10 minutos vai ao LLM assim que a transcrição o cobre, e cada segmento que
+    entra com folga no top parcial (ver a histerese de StreamingSegmentFinder) é cortado na hora
+    (em candidateNNN.mp4), então os primeiros clipes ficam prontos antes do fim da análise. No fim,
+    os cortes do top final são renomeados para outputNNN.mp4 (na ordem final) e os que ficaram de
+    fora são apagados e contabilizados (etapa "cut_discarded" e vc_stream_candidate_cuts_total).
+    Retorna (viral_segments, cut_files), como as etapas sequenciais.
+    """
+    started = time.time()
+    num_segments = segment_params["num_segments"]
+    cutter = cut_segments.SegmentCutter(input_video_path, mode="proxy" if PIPELINE_MODE == "proxy" else None, timings=timings,
+                                        profile=get_profile(encoder_profile), slot=lambda: SCHEDULER.slot(RESOURCE_ENCODE))
+    candidates = {}  # chave do segmento -> Future do corte provisório
+    cuts_lock = threading.Lock()
+    cuts_done = []
+
+    def on_candidate_cut(future):
+        if future.cancelled() or future.exception():
+            return
+        with cuts_lock:
+            cuts_done.append(future.result())
+            done = len(cuts_done)
+        if done == 1:
+            metrics.add_timing(timings, "time_to_first_clip", time.time() - started)
+        _emit(job_store, job_id, "clip_cut", index=done - 1, name=os.path.basename(future.result()),
+              done=done, total=max(done, num_segments), eta=None)
+
+    def on_candidate(segment: dict):
+        with cuts_lock:
+            number = len(candidates)
+            future = cutter.submit(number, segment, os.path.join(workspace_dir, f"candidate{number:03d}.mp4"))
+            candidates[create_viral_segments.segment_key(segment)] = future
+        future.add_done_callback(on_candidate_cut)
+
+    finder = None
+    cached_segments = CACHE.get_json('segments', segments_key)
+    if cached_segments is None:
+        segments_started = time.time()
+        # O áudio do job alimenta os sinais de volume do pré-ranqueamento (e é reaproveitado pela transcrição);
+        # só é extraído aqui se o pré-ranqueamento rodar (vídeo longo o bastante)
+        audio = (lambda: audio_extract.job_audio(input_video_path, workspace_dir, timings=timings)) if prerank.PRERANK else None
+        finder = create_viral_segments.StreamingSegmentFinder(
+            **segment_params, timings=timings, on_candidate=on_candidate, expected_duration=probe(input_video_path).duration, audio=audio,
+            on_progress=lambda done, total: _emit(job_store, job_id, "chunk", done=done, total=total, eta=_eta(segments_started, done, total)),
+            slot=lambda: SCHEDULER.slot(RESOURCE_LLM),
+        )
+    try:
+        windowed = _transcribe(job_store, job_id, input_video_path, workspace_dir, model, compute_type, batch_size, transcript_key, timings,
+                               on_window=finder.add_rows if finder else None)
+        _check_cancelled(job_store, job_id)
+
+        _mark_stage(job_store, job_id, "segments")
+        df = create_viral_segments.load_transcript(workspace_dir)
+        if finder is None:
+            viral_segments = cached_segments
+        else:
+            if not windowed:
+                # Transcrição inteira de uma vez (cache, retomada ou CLI): os chunks saem todos em finish
+                finder.add_rows(df, 0.0)
+            with metrics.timed("segments", timings):
+                viral_segments = finder.finish()
+            # Não guarda resultados vazios: normalmente indicam falha do LLM, não ausência de cortes
+            if viral_segments['segments']:
+                CACHE.put_json('segments', segments_key, viral_segments)
+        create_viral_segments.save_segments(df, viral_segments, workspace_dir)
+        _mark_stage(job_store, job_id, "segments", done=True, timings=timings)
+        _check_cancelled(job_store, job_id)
+
+        # Os segmentos finais que não foram anunciados (ex.: vindos do cache) são cortados agora
+        final_cuts = []
+        kept = 0  # segmentos finais que já tinham corte antecipado
+        for index, segment in enumerate(viral_segments['segments']):
+            future = candidates.pop(create_viral_segments.segment_key(segment), None)
+            kept += future is not None
+            if future is None:
+                future = cutter.submit(index, segment, os.path.join(workspace_dir, f"candidate_final{index:03d}.mp4"))
+                future.add_done_callback(on_candidate_cut)
+            final_cuts.append(future)
+        cut_files = []
+        for index, future in enumerate(final_cuts):
+            output_path = os.path.join(workspace_dir, f"output{index:03d}.mp4")
+            os.replace(future.result(), output_path)
+            cut_files.append(output_path)
+        cutter.close()
+        discarded_sec = 0.0
+        for future in candidates.values():
+            if not future.exception() and os.path.exists(future.result()):
+                discarded_sec += cutter.cut_seconds.get(future.result(), 0.0)
+                os.remove(future.result())
+        if candidates:
+            metrics.add_timing(timings, "cut_discarded", discarded_sec, count=len(candidates))
+        metrics.METRICS.inc("vc_stream_candidate_cuts_total", kept, result="kept")
+        metrics.METRICS.inc("vc_stream_candidate_cuts_total", len(candidates), result="discarded")
+        print(f"Pipeline em fluxo: {len(cut_files)} clipes finais ({kept} cortados antecipadamente), "
+              f"{len(candidates)} candidatos descartados ({discarded_sec:.1f}s de corte).")
+        return viral_segments, cut_files
+    except BaseException:
+        if finder is not None:
+            finder.close()
+        cutter.close(cancel=True)
+        raise
+
+def initial_process(job_id: str, job_store, input_video_path: str, model: str, compute_type: str, batch_size: int, pycaps_template: str, workspace_dir: str, video_url: str | None = None, encoder_profile: str | None = None):
+    """
+    Etapa 1: Baixa o vídeo (se veio de uma URL), transcreve e o corta em segmentos.
+    Todos os arquivos intermediários são gravados no workspace do job; `encoder_profile`
+    escolhe o perfil de codificação dos cortes em qualidade final (modo full).
+    Se o job estiver sendo retomado, as etapas já concluídas (e cujos arquivos ainda existem) são puladas.
     """
     print(f"Iniciando processamento inicial para o Job ID: {job_id} com o template PyCaps: {pycaps_template}")
+    job = job_store.get(job_id) or {}
+    stages_done = job.get("stages_done", [])
+    # Tempo de cada etapa (e das chamadas ao LLM e ao ffmpeg), salvo no registro do job
+    timings = job.get("timings", {})
+    segments_path = os.path.join(workspace_dir, 'viral_segments.txt')
+    num_segments, viral_mode, themes, tempo_minimo, tempo_maximo = 10, True, '', 40, 120
     try:
-        generate_whisperx(input_video_path, output_dir='tmp', model=model, compute_type=compute_type, batch_size=batch_size)
-        
-        viral_segments = create_viral_segments.create(num_segments=10, viral_mode=True, themes='', tempo_minimo=40, tempo_maximo=120)
-        cut_files = cut_segments.cut(viral_segments, input_video_path)
+        os.makedirs(workspace_dir, exist_ok=True)
+
+        # O download é uma etapa do job (com fila própria de slots), não da requisição HTTP
+        if not os.path.exists(input_video_path):
+            if not video_url:
+                raise FileNotFoundError(f"Vídeo de entrada não encontrado: {input_video_path}")
+            _mark_stage(job_store, job_id, "download")
+            with SCHEDULER.slot(RESOURCE_DOWNLOAD):
+                _check_cancelled(job_store, job_id)
+                with metrics.timed("download", timings):
+                    download.download(
+                        video_url, input_video_path,
+                        on_progress=lambda progress: (job_store.update(job_id, download_progress=progress), _emit(job_store, job_id, "download", **progress)),
+                        should_cancel=lambda: _cancel_requested(job_store, job_id),
+                    )
+            _mark_stage(job_store, job_id, "download", done=True, timings=timings)
+        _check_cancelled(job_store, job_id)
+
+        # Chaves do cache endereçado por conteúdo: o mesmo áudio com o mesmo modelo
+        # reaproveita a transcrição e, com os mesmos parâmetros, os segmentos do LLM.
+        media_hash = job.get("media_hash")
+        if not media_hash:
+            with metrics.timed("audio_hash", timings):
+                media_hash = hash_audio_stream(input_video_path)
+        job_store.update(job_id, media_hash=media_hash)
+        transcript_key = make_key(media_hash, model, compute_type)
+        resumed_segments = "segments" in stages_done and os.path.exists(segments_path)
+        streaming = STREAMING_PIPELINE and not resumed_segments
+        # Com o pré-ranqueamento, os dois caminhos escolhem janelas diferentes: cada um com a sua chave
+        selection = "streaming" if streaming else "sequential"
+        segments_key = make_key(transcript_key, num_segments, viral_mode, themes, tempo_minimo, tempo_maximo, prerank.cache_token(selection=selection))
+
+        segment_params = dict(num_segments=num_segments, viral_mode=viral_mode, themes=themes, tempo_minimo=tempo_minimo, tempo_maximo=tempo_maximo)
+        cut_files = None
+        if streaming:
+            viral_segments, cut_files = _stream_segments(job_store, job_id, input_video_path, workspace_dir, model, compute_type, batch_size,
+                                                         transcript_key, segments_key, segment_params, timings, encoder_profile)
+        else:
+            _transcribe(job_store, job_id, input_video_path, workspace_dir, model, compute_type, batch_size, transcript_key, timings)
+            _check_cancelled(job_store, job_id)
+
+            if resumed_segments:
+                print(f"Retomando Job {job_id}: segmentos já existentes em {segments_path}")
+                with open(segments_path, 'r', encoding='utf-8') as f:
+                    viral_segments = json.load(f)
+            else:
+                _mark_stage(job_store, job_id, "segments")
+                # Extraído só em um miss do cache de segmentos, e se o pré-ranqueamento rodar
+                audio = (lambda: audio_extract.job_audio(input_video_path, workspace_dir, timings=timings)) if prerank.PRERANK else None
+                segments_started = time.time()
+                with SCHEDULER.slot(RESOURCE_LLM), metrics.timed("segments", timings):
+                    viral_segments = create_viral_segments.create(
+                        **segment_params, workspace_dir=workspace_dir, cache_key=segments_key, timings=timings, audio=audio,
+                        on_progress=lambda done, total: _emit(job_store, job_id, "chunk", done=done, total=total, eta=_eta(segments_started, done, total)),
+                    )
+                _mark_stage(job_store, job_id, "segments", done=True, timings=timings)
+        _check_cancelled(job_store, job_id)
+
+        _mark_stage(job_store, job_id, "cutting")
+        cut_started = time.time()
+        total_cuts = len(viral_segments['segments'])
+        cuts_done = []
+
+        def on_clip_cut(index: int, path: str):
+            cuts_done.append(index)
+            _emit(job_store, job_id, "clip_cut", index=index, name=os.path.basename(path),
+                  done=len(cuts_done), total=total_cuts, eta=_eta(cut_started, len(cuts_done), total_cuts))
+
+        with SCHEDULER.slot(RESOURCE_ENCODE):
+            if cut_files is None:
+                with metrics.timed("cutting", timings):
+                    cut_files = cut_segments.cut(viral_segments, input_video_path, workspace_dir=workspace_dir, mode="proxy" if PIPELINE_MODE == "proxy" else None,
+                                                 on_progress=on_clip_cut, timings=timings, profile=get_profile(encoder_profile))
+            with metrics.timed("previews", timings):
+                previews = cut_segments.create_previews(cut_files, proxies_ready=PIPELINE_MODE == "proxy")
+            # Enquadramento sugerido a partir das prévias (leves de decodificar), pronto antes de a página de ajuste abrir
+            with metrics.timed("roi_suggest", timings):
+                suggestions = roi_suggest.suggest_rois([preview["preview"] for preview in previews], timings=timings)
+        _mark_stage(job_store, job_id, "cutting", done=True, timings=timings)
 
         # --- MUDANÇA CRÍTICA AQUI ---
         # Agora salvamos uma lista de dicionários, cada um contendo o caminho e o título do clipe.
         # Isso garante que o título gerado pela IA seja associado ao arquivo de vídeo correto.
         clips_with_titles = []
-        for segment_data, file_path in zip(viral_segments['segments'], cut_files):
-            clips_with_titles.append({
+        for segment_data, file_path, preview, suggestion in zip(viral_segments['segments'], cut_files, previews, suggestions):
+            clip = {
                 "path": file_path,
-                "title": segment_data.get("title", "Título Padrão") # Usa .get para segurança
-            })
+                "title": segment_data.get("title", "Título Padrão"), # Usa .get para segurança
+                "start": segment_data["start"],
+                "end": segment_data["end"],
+                **preview
+            }
+            if PIPELINE_MODE == "proxy":
+                # A prévia não serve para a saída final: a renderização parte do original
+                clip["source"] = input_video_path
+            if suggestion:
+                clip["roi1"], clip["roi2"] = suggestion["roi1"], suggestion["roi2"]
+            clips_with_titles.append(clip)
         
-        jobs_dict[job_id]["clips"] = clips_with_titles
-        jobs_dict[job_id]["status"] = "pending_adjustment"
+        _set_status(job_store, job_id, "pending_adjustment", clips=clips_with_titles, timings=timings)
         print(f"Processamento inicial para o Job {job_id} concluído. Aguardando ajuste do usuário.")
+    except (JobCancelled, download.DownloadCancelled) as e:
+        _set_status(job_store, job_id, "cancelled")
+        print(f"Job {job_id} cancelado: {e}")
+        cleanup_workspace(workspace_dir)
     except Exception as e:
-        jobs_dict[job_id]["status"] = "error"
+        _set_status(job_store, job_id, "error", error=str(e), timings=timings)
         print(f"\n❌ ERRO no processamento inicial do Job {job_id}: {str(e)}")
+        cleanup_workspace(workspace_dir)
 
-def finalize_process(job_id: str, jobs_dict: dict, clips_data: dict, original_base_name: str, pycaps_template: str):
+def finalize_process(job_id: str, job_store, clips_data: dict, original_base_name: str, pycaps_template: str, workspace_dir: str, encoder_profile: str | None = None):
     """
     Etapa 2: Pega os dados de ajuste, cria legendas, e então reenquadra E queima as legendas/títulos de uma só vez.
+    A renderização usa o perfil de codificação `encoder_profile` (ou o padrão).
     """
     print(f"Iniciando processamento final para o Job ID: {job_id}")
+    timings = (job_store.get(job_id) or {}).get("timings", {})
     try:
+        _mark_stage(job_store, job_id, "rendering")
+        # Progresso por clipe, visível em /status e no stream de eventos enquanto o pool renderiza
+        render_progress = {"total": len(clips_data), "done": 0, "failed": 0,
+                           "clips": {os.path.basename(path): "rendering" for path in clips_data}}
+        job_store.update(job_id, render_progress=render_progress)
+        render_started = time.time()
+        destination_folder = 'outputs'
+        # Arquivos entregues por este job em outputs/ (usados no download em .zip do job)
+        outputs = []
+
+        def on_clip_rendered(video_path: str, result: dict):
+            name = os.path.basename(video_path)
+            render_progress["clips"][name] = result["status"]
+            render_progress["done" if result["status"] == "done" else "failed"] += 1
+            job_store.update(job_id, render_progress=render_progress)
+            event = {"name": name, "status": result["status"], "done": render_progress["done"], "failed": render_progress["failed"],
+                     "total": render_progress["total"]}
+            if result["status"] == "done":
+                metrics.merge_timings(timings, result["timings"])
+                # Cada clipe é entregue assim que fica pronto, sem esperar os demais
+                unique_final_name = f"{original_base_name}_{os.path.basename(result['output'])}"
+                destination_path = os.path.join(destination_folder, unique_final_name)
+                shutil.move(result["output"], destination_path)
+                print(f"Arquivo final movido e renomeado para: {destination_path}")
+                outputs.append(unique_final_name)
+                job_store.update(job_id, outputs=outputs)
+                event["url"] = f"/outputs/{unique_final_name}"
+            else:
+                event["error"] = result["error"]
+            finished = render_progress["done"] + render_progress["failed"]
+            _emit(job_store, job_id, "clip_rendered", eta=_eta(render_started, finished, render_progress["total"]), **event)
+
         # Passa o pycaps_template para a função edit
-        edit_video.edit(clips_data, pycaps_template)
+        with SCHEDULER.slot(RESOURCE_ENCODE), metrics.timed("rendering", timings):
+            results = edit_video.edit(clips_data, pycaps_template, workspace_dir=workspace_dir, on_progress=on_clip_rendered,
+                                      profile=get_profile(encoder_profile))
 
-        source_folder = 'burned_sub'
-        destination_folder = 'outputs'
-        final_files = glob(os.path.join(source_folder, '*.mp4'))
-        for file_path in final_files:
-            clip_base_name = os.path.basename(file_path)
-            unique_final_name = f"{original_base_name}_{clip_base_name}"
-            destination_path = os.path.join(destination_folder, unique_final_name)
-            shutil.move(file_path, destination_path)
-            print(f"Arquivo final movido e renomeado para: {destination_path}")
+        render_errors = {os.path.basename(path): result["error"] for path, result in results.items() if result["status"] == "error"}
+        if results and len(render_errors) == len(results):
+            raise RuntimeError(f"Nenhum clipe foi renderizado: {render_errors}")
         
-        jobs_dict[job_id]["status"] = "complete"
+        _mark_stage(job_store, job_id, "rendering", done=True)
+        # Clipes que falharam não impedem a entrega dos demais
+        _set_status(job_store, job_id, "complete", render_errors=render_errors, timings=timings)
         print(f"Processamento final para o Job {job_id} concluído com sucesso!")
 
     except Exception as e:
-        jobs_dict[job_id]["status"] = "error"
+        _set_status(job_store, job_id, "error", error=str(e), timings=timings)
         print(f"\n❌ ERRO no processamento final do Job {job_id}: {str(e)}")
     finally:
-        # Limpa as pastas temporárias
-        for dir_name in ['tmp', 'final', 'subs_ass', 'burned_sub']:
-            if os.path.exists(dir_name) and os.path.isdir(dir_name):
-                shutil.rmtree(dir_name)
\ No newline at end of file
+        # Limpa apenas o workspace deste job; os demais jobs continuam intactos
+        cleanup_workspace(workspace_dir)
@@ -0,0 +1,156 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Prioridades (menor valor = executa primeiro). A finalização tem prioridade porque
+# o usuário já ajustou os cortes e está aguardando o resultado.
+PRIORITY_FINALIZE = 0
+PRIORITY_INITIAL = 10
+
+# Classes de recurso com limites de concorrência independentes
+RESOURCE_TRANSCRIPTION = 'transcription'
+RESOURCE_LLM = 'llm'
+RESOURCE_ENCODE = 'encode'
+RESOURCE_DOWNLOAD = 'download'
+
+
+class QueueFullError(Exception):
+    """Levantada quando a fila de jobs atingiu o tamanho máximo configurado."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        print(f"⚠️ Valor inválido para {name}, usando o padrão {default}.")
+        return default
+
+
+class JobScheduler:
+    """
+    Agendador de jobs com fila de prioridade (FIFO dentro da mesma prioridade),
+    um número fixo de workers e semáforos por classe de recurso.
+
+    Os workers executam as etapas do pipeline; cada etapa pesada deve reservar um
+    slot do recurso correspondente com `slot()`, para que uma rajada de uploads não
+    dispute CPU/GPU além do configurado.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, resource_limits: dict):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.resource_limits = dict(resource_limits)
+        self._resources = {name: threading.BoundedSemaphore(limit) for name, limit in self.resource_limits.items()}
+        self._in_use = {name: 0 for name in self.resource_limits}
+        self._heap = []
+        self._counter = itertools.count()
+        self._running = {}
+        self._cond = threading.Condition()
+        self._workers = []
+
+    @classmethod
+    def from_env(cls) -> "JobScheduler":
+        cpu_count = os.cpu_count() or 2
+        return cls(
+            max_workers=_env_int('VC_MAX_WORKERS', 4),
+            max_queue=_env_int('VC_MAX_QUEUE', 20),
+            resource_limits={
+                RESOURCE_TRANSCRIPTION: _env_int('VC_TRANSCRIPTION_SLOTS', 1),
+                RESOURCE_LLM: _env_int('VC_LLM_SLOTS', 4),
+                RESOURCE_ENCODE: _env_int('VC_ENCODE_SLOTS', max(1, cpu_count // 4)),
+                RESOURCE_DOWNLOAD: _env_int('VC_DOWNLOAD_SLOTS', 2),
+            },
+        )
+
+    def _ensure_workers(self):
+        # Os workers são criados sob demanda para não iniciar threads ao apenas importar o módulo
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{len(self._workers)}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def is_full(self) -> bool:
+        with self._cond:
+            return len(self._heap) >= self.max_queue
+
+    def submit(self, job_id: str, fn, priority: int = PRIORITY_INITIAL, **kwargs) -> int:
+        """
+        Enfileira `fn(**kwargs)` para o job e retorna a posição na fila (1 = próximo a executar).
+        Levanta QueueFullError se a fila estiver cheia.
+        """
+        with self._cond:
+            if len(self._heap) >= self.max_queue:
+                raise QueueFullError(f"Fila cheia ({self.max_queue} jobs aguardando).")
+            heapq.heappush(self._heap, (priority, next(self._counter), job_id, fn, kwargs))
+            self._ensure_workers()
+            self._cond.notify()
+            return self._position_locked(job_id)
+
+    def _position_locked(self, job_id: str):
+        for position, entry in enumerate(sorted(self._heap), start=1):
+            if entry[2] == job_id:
+                return position
+        return None
+
+    def position(self, job_id: str):
+        """Retorna a posição do job na fila, ou None se ele não estiver aguardando."""
+        with self._cond:
+            return self._position_locked(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Remove o job da fila se ele ainda não começou. Retorna True se ele estava aguardando."""
+        with self._cond:
+            for index, entry in enumerate(self._heap):
+                if entry[2] == job_id:
+                    self._heap.pop(index)
+                    heapq.heapify(self._heap)
+                    return True
+        return False
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job_id, fn, kwargs = heapq.heappop(self._heap)
+                self._running[job_id] = time.time()
+            try:
+                fn(**kwargs)
+            except Exception as e:
+                print(f"\n❌ ERRO não tratado no worker para o Job {job_id}: {e}")
+            finally:
+                with self._cond:
+                    self._running.pop(job_id, None)
+
+    @contextmanager
+    def slot(self, resource: str):
+        """Reserva um slot da classe de recurso durante o bloco `with`."""
+        semaphore = self._resources[resource]
+        semaphore.acquire()
+        with self._cond:
+            self._in_use[resource] += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_use[resource] -= 1
+            semaphore.release()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued": len(self._heap),
+                "running": len(self._running),
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "resources": {
+                    name: {"in_use": self._in_use[name], "limit": limit}
+                    for name, limit in self.resource_limits.items()
+                },
+            }
+
+
+SCHEDULER = JobScheduler.from_env()
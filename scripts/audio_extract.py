@@ -0,0 +1,112 @@
+import os
+import struct
+import threading
+
+import numpy as np
+
+from scripts import metrics
+
+# Formato esperado pelo WhisperX (e por qualquer análise de áudio do pipeline): mono, 16 kHz
+SAMPLE_RATE = 16000
+# WAV float32 no workspace do job: o WhisperX (motor ou CLI) lê direto, e o trecho de dados
+# é mapeado em memória como um array NumPy sem cópia nem nova decodificação
+AUDIO_FILENAME = 'audio_16k.wav'
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Um lock por arquivo de destino: consumidores simultâneos do mesmo job esperam a primeira extração
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+def _lock_for(path: str) -> threading.Lock:
+    with _path_locks_guard:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _data_chunk(path: str) -> tuple | None:
+    """
+    Lê os cabeçalhos RIFF e retorna (offset, número de amostras) do chunk 'data' se o arquivo
+    for um WAV float32 mono a SAMPLE_RATE; caso contrário, None.
+    """
+    try:
+        with open(path, 'rb') as f:
+            riff = f.read(12)
+            if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+                return None
+            matches_format = False
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return None
+                chunk_id, size = header[:4], struct.unpack('<I', header[4:])[0]
+                if chunk_id == b'fmt ':
+                    fmt = f.read(size)
+                    tag, channels, rate = struct.unpack('<HHI', fmt[:8])
+                    bits = struct.unpack('<H', fmt[14:16])[0]
+                    if tag == _WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                        tag = struct.unpack('<H', fmt[24:26])[0]
+                    matches_format = (tag, channels, rate, bits) == (_WAVE_FORMAT_IEEE_FLOAT, 1, SAMPLE_RATE, 32)
+                elif chunk_id == b'data':
+                    return (f.tell(), size // 4) if matches_format else None
+                else:
+                    f.seek(size, os.SEEK_CUR)
+                if size % 2:
+                    f.seek(1, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None
+
+
+def is_extracted_audio(path: str) -> bool:
+    """Indica se `path` é um áudio no formato gerado por `extract_audio` (e pode ser aberto com `open_audio`)."""
+    return _data_chunk(path) is not None
+
+
+def extract_audio(input_file: str, workspace_dir: str, timings: dict | None = None) -> str:
+    """
+    Extrai (uma única vez por job) o primeiro stream de áudio de `input_file` para um WAV
+    float32 mono a 16 kHz no workspace e retorna o caminho. Se o arquivo já existe
+    (ex.: job retomado), é reaproveitado. A gravação é feita em um arquivo temporário
+    e renomeada ao final, então o arquivo em `workspace_dir` está sempre completo.
+    """
+    output_path = os.path.join(workspace_dir, AUDIO_FILENAME)
+    with _lock_for(output_path):
+        if is_extracted_audio(output_path):
+            print(f"Áudio já extraído anteriormente, reutilizando: {output_path}")
+            return output_path
+
+        temp_path = f"{output_path}.{os.getpid()}.part.wav"
+        command = [
+            'ffmpeg', '-v', 'error', '-nostdin', '-threads', '0', '-i', input_file,
+            '-map', '0:a:0', '-vn', '-sn', '-dn', '-map_metadata', '-1', '-fflags', '+bitexact',
+            '-ac', '1', '-ar', str(SAMPLE_RATE), '-c:a', 'pcm_f32le', '-f', 'wav', '-y', temp_path,
+        ]
+        result = metrics.run(command, "audio_extract", timings=timings, capture_output=True, text=True)
+        if result.returncode != 0 or not is_extracted_audio(temp_path):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise RuntimeError(f"Falha ao extrair o áudio de {input_file}: {result.stderr.strip()}")
+        os.replace(temp_path, output_path)
+        print(f"Áudio extraído ({SAMPLE_RATE} Hz, mono): {output_path}")
+        return output_path
+
+
+def open_audio(path: str) -> np.ndarray:
+    """
+    Mapeia em memória as amostras de um WAV gerado por `extract_audio` (float32 em [-1, 1],
+    o mesmo formato de whisperx.load_audio). As páginas só são lidas do disco quando acessadas;
+    o modo copy-on-write deixa o array gravável para bibliotecas que exigem isso (ex.: torch.from_numpy),
+    sem alterar o arquivo.
+    """
+    layout = _data_chunk(path)
+    if layout is None:
+        raise ValueError(f"Não é um áudio float32 mono a {SAMPLE_RATE} Hz: {path}")
+    offset, samples = layout
+    if samples == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(path, dtype='<f4', mode='c', offset=offset, shape=(samples,))
+
+
+def job_audio(input_file: str, workspace_dir: str, timings: dict | None = None) -> np.ndarray:
+    """Atalho: extrai o áudio do job (se ainda não foi extraído) e o retorna mapeado em memória."""
+    return open_audio(extract_audio(input_file, workspace_dir, timings=timings))
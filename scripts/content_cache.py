@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+# Padrões de URL do YouTube que contêm o ID do vídeo (11 caracteres)
+_YOUTUBE_ID_PATTERNS = [
+    re.compile(r"(?:youtube\.com|youtube-nocookie\.com)/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)([A-Za-z0-9_-]{11})"),
+    re.compile(r"youtu\.be/([A-Za-z0-9_-]{11})"),
+]
+
+
+def normalize_video_url(url: str) -> str | None:
+    """
+    Normaliza uma URL de vídeo para um identificador estável (ex.: 'youtube-dQw4w9WgXcQ'),
+    de forma que variações da mesma URL (youtu.be, shorts, parâmetros extras) apontem
+    para o mesmo vídeo. Retorna None se a URL não for reconhecida.
+    """
+    for pattern in _YOUTUBE_ID_PATTERNS:
+        match = pattern.search(url or "")
+        if match:
+            return f"youtube-{match.group(1)}"
+    return None
+
+
+def make_key(*parts) -> str:
+    """Gera uma chave de cache a partir das partes informadas (hash + modelo + parâmetros...)."""
+    return hashlib.sha256("|".join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def hash_audio_stream(input_file: str) -> str:
+    """
+    Calcula o SHA-256 dos pacotes do primeiro stream de áudio (sem decodificar, via '-c copy').
+    Assim, o mesmo áudio gera o mesmo hash mesmo que o contêiner ou o vídeo mudem.
+    Se o ffmpeg falhar, usa o hash do arquivo inteiro.
+    """
+    digest = hashlib.sha256()
+    command = ["ffmpeg", "-v", "error", "-i", input_file, "-map", "0:a:0", "-c", "copy", "-f", "data", "-"]
+    try:
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as process:
+            for block in iter(lambda: process.stdout.read(1024 * 1024), b""):
+                digest.update(block)
+        if process.returncode == 0:
+            return f"audio-{digest.hexdigest()}"
+    except FileNotFoundError:
+        print("⚠️ 'ffmpeg' não encontrado; usando o hash do arquivo completo.")
+
+    digest = hashlib.sha256()
+    with open(input_file, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return f"file-{digest.hexdigest()}"
+
+
+class ContentCache:
+    """
+    Cache em disco endereçado por conteúdo: cada entrada é um diretório
+    <root>/<namespace>/<key>/ com um ou mais arquivos. O tamanho total é limitado
+    e as entradas menos usadas recentemente (mtime do diretório) são removidas primeiro.
+    """
+
+    def __init__(self, root: str, max_mb: int):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._stats = {}
+        # Tamanho total estimado (bytes), mantido a cada put/invalidate; None até a primeira varredura
+        self._total_bytes = None
+
+    def _entry_dir(self, namespace: str, key: str) -> str:
+        return os.path.join(self.root, namespace, key)
+
+    def _count(self, namespace: str, outcome: str):
+        with self._lock:
+            counters = self._stats.setdefault(namespace, {"hits": 0, "misses": 0})
+            counters[outcome] += 1
+
+    def get(self, namespace: str, key: str, filename: str) -> str | None:
+        """Retorna o caminho do arquivo em cache (marcando-o como usado) ou None."""
+        path = os.path.join(self._entry_dir(namespace, key), filename)
+        if os.path.exists(path):
+            now = time.time()
+            try:
+                os.utime(self._entry_dir(namespace, key), (now, now))
+            except FileNotFoundError:
+                # A entrada foi removida (evict de outro job) entre a checagem e o utime: conta como MISS
+                path = None
+            if path:
+                self._count(namespace, "hits")
+                print(f"⚡ Cache HIT ({namespace}): {key[:12]}...")
+                return path
+        self._count(namespace, "misses")
+        print(f"Cache MISS ({namespace}): {key[:12]}...")
+        return None
+
+    def put(self, namespace: str, key: str, source_path: str, filename: str) -> str:
+        """Copia `source_path` para o cache e aplica o limite de tamanho."""
+        entry_dir = self._entry_dir(namespace, key)
+        os.makedirs(entry_dir, exist_ok=True)
+        destination = os.path.join(entry_dir, filename)
+        # Grava em arquivo temporário e renomeia, para que leitores nunca vejam um arquivo pela metade
+        partial = f"{destination}.{os.getpid()}.{threading.get_ident()}.part"
+        shutil.copyfile(source_path, partial)
+        self._replace(partial, destination)
+        return destination
+
+    def get_json(self, namespace: str, key: str):
+        path = self.get(namespace, key, 'data.json')
+        if not path:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def put_json(self, namespace: str, key: str, data) -> str:
+        entry_dir = self._entry_dir(namespace, key)
+        os.makedirs(entry_dir, exist_ok=True)
+        destination = os.path.join(entry_dir, 'data.json')
+        partial = f"{destination}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        self._replace(partial, destination)
+        return destination
+
+    def _replace(self, partial: str, destination: str):
+        """
+        Publica `partial` em `destination` e atualiza o total em memória com a diferença de tamanho;
+        o diretório só é varrido (evict) quando esse total passa de `max_bytes`.
+        """
+        added = os.path.getsize(partial)
+        try:
+            added -= os.path.getsize(destination)
+        except FileNotFoundError:
+            pass
+        os.replace(partial, destination)
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += added
+            over_limit = self._total_bytes is None or self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def invalidate(self, namespace: str, key: str):
+        """Remove uma entrada do cache (ex.: conteúdo que se mostrou inválido)."""
+        entry_dir = self._entry_dir(namespace, key)
+        try:
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+        except FileNotFoundError:
+            return
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes = max(0, self._total_bytes - size)
+
+    def evict(self):
+        """
+        Varre o cache, remove as entradas menos usadas até ele caber em `max_bytes` e ressincroniza
+        o total em memória (que pode divergir quando outros processos gravam no mesmo diretório).
+        """
+        if not os.path.isdir(self.root):
+            with self._lock:
+                self._total_bytes = 0
+            return
+        entries = []
+        total = 0
+        for namespace in os.listdir(self.root):
+            namespace_dir = os.path.join(self.root, namespace)
+            if not os.path.isdir(namespace_dir):
+                continue
+            for key in os.listdir(namespace_dir):
+                entry_dir = os.path.join(namespace_dir, key)
+                try:
+                    size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+                    entries.append((os.stat(entry_dir).st_mtime, size, entry_dir))
+                except FileNotFoundError:
+                    continue
+                total += size
+        if total > self.max_bytes:
+            for _, size, entry_dir in sorted(entries):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+                print(f"♻️ Entrada removida do cache: {entry_dir}")
+                if total <= self.max_bytes:
+                    break
+        with self._lock:
+            self._total_bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {namespace: dict(counters) for namespace, counters in self._stats.items()}
+
+
+CACHE = ContentCache(
+    root=os.environ.get('VC_CACHE_DIR', 'cache'),
+    max_mb=int(os.environ.get('VC_CACHE_MAX_MB', 2048)),
+)
@@ -1,7 +1,61 @@
-import g4f
+import numpy as np
 import pandas as pd
+import contextlib
 import json
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import metrics, prerank
+from .content_cache import CACHE
+from .llm_backends import get_backend
+
+# --- Configuração das chamadas ao LLM ---
+LLM_MAX_IN_FLIGHT = int(os.environ.get('VC_LLM_MAX_IN_FLIGHT', 4))  # chunks analisados simultaneamente
+LLM_TIMEOUT_SEC = float(os.environ.get('VC_LLM_TIMEOUT_SEC', 120))  # tempo máximo por requisição
+LLM_MAX_RETRIES = int(os.environ.get('VC_LLM_MAX_RETRIES', 3))  # novas tentativas por chunk
+LLM_RETRY_BACKOFF_SEC = 2.0
+# --- Configuração de Chunking ---
+CHUNK_DURATION_SEC = 600  # 10 minutos por chunk
+OVERLAP_DURATION_SEC = 10   # 10 segundos de sobreposição
+# Margem nas bordas de cada chunk, para garantir que a última palavra do chunk esteja incluída
+CHUNK_MARGIN_SEC = 0.1
+# --- Cortes antecipados do pipeline em fluxo (histerese) ---
+# Um candidato só é anunciado para corte depois que essa fração do vídeo já foi analisada pelo LLM
+# e, com o top parcial completo, se o score dele superar o do K-ésimo por essa margem (pontos de 0 a 100)
+STREAM_CUT_MIN_PROGRESS = float(os.environ.get('VC_STREAM_CUT_MIN_PROGRESS', 0.5))
+STREAM_CUT_SCORE_MARGIN = float(os.environ.get('VC_STREAM_CUT_SCORE_MARGIN', 10))
+
+class TranscriptIndex:
+    """
+    Índice temporal da transcrição: arrays ordenados por 'start' que permitem obter as
+    linhas de qualquer janela [início, fim] com duas buscas binárias (searchsorted),
+    em vez de varrer o DataFrame inteiro com máscaras booleanas a cada janela.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        if not df['start'].is_monotonic_increasing:
+            df = df.sort_values('start', kind='stable')
+        self.df = df.reset_index(drop=True)
+        self.starts = self.df['start'].to_numpy(dtype=float)
+        self.ends = self.df['end'].to_numpy(dtype=float)
+        # Máximo acumulado dos 'end': garante um array não decrescente para a busca binária.
+        # Em transcrições do WhisperX os 'end' já são crescentes, e o resultado é idêntico
+        # ao filtro (start >= início) & (end <= fim).
+        self.ends_max = np.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+        self.texts = self.df['text'].astype(str).to_numpy()
+
+    def window(self, start_time: float, end_time: float) -> slice:
+        """Retorna o slice das linhas com start >= start_time e end <= end_time."""
+        lo = int(np.searchsorted(self.starts, start_time, side='left'))
+        hi = int(np.searchsorted(self.ends_max, end_time, side='right'))
+        return slice(lo, max(lo, hi))
+
+    @property
+    def total_duration(self) -> float:
+        return float(self.ends.max()) if len(self.ends) else 0
+
 
 def get_transcript_chunks(df: pd.DataFrame, chunk_duration_sec: int, overlap_duration_sec: int):
     """
@@ -11,30 +65,23 @@ def get_transcript_chunks(df: pd.DataFrame, chunk_duration_sec: int, overlap_dur
     - 'start_time_offset': O tempo de início (em segundos) do chunk em relação ao vídeo completo.
     """
     chunks = []
-    total_duration = df['end'].max() if not df.empty else 0
+    index = TranscriptIndex(df)
+    total_duration = index.total_duration
     current_start_time = 0.0
 
     while current_start_time < total_duration:
         chunk_end_time = min(current_start_time + chunk_duration_sec, total_duration)
 
-        # Seleciona as linhas do DataFrame que caem dentro do chunk atual
+        # Seleciona as linhas que caem dentro do chunk atual (um slice do índice ordenado)
         # Adicionamos uma pequena margem para garantir que a última palavra do chunk esteja incluída
-        chunk_df = df[(df['start'] >= current_start_time - 0.1) & (df['end'] <= chunk_end_time + 0.1)].copy()
+        rows = index.window(current_start_time - CHUNK_MARGIN_SEC, chunk_end_time + CHUNK_MARGIN_SEC)
 
-        if not chunk_df.empty:
-            chunk_text = " ".join(chunk_df['text'].astype(str))
-            
-            # Garantir que o offset do chunk seja o 'start' real do primeiro item
-            # ou o 'current_start_time' se for mais preciso para o propósito de contexto.
+        if rows.stop > rows.start:
             # Aqui, usaremos o 'current_start_time' como referência para o LLM.
             chunks.append({
-                "chunk_text": chunk_text,
+                "chunk_text": " ".join(index.texts[rows]),
                 "start_time_offset": current_start_time
             })
-        else:
-            # Se não houver texto no chunk, mas ainda houver duração total,
-            # avançamos para evitar loops infinitos em espaços vazios.
-            pass
 
         # Move o ponteiro para o próximo chunk, considerando a sobreposição
         current_start_time += (chunk_duration_sec - overlap_duration_sec)
@@ -46,121 +93,212 @@ def get_transcript_chunks(df: pd.DataFrame, chunk_duration_sec: int, overlap_dur
     return chunks
 
 
-def create(num_segments, viral_mode, themes, tempo_minimo, tempo_maximo):
+def chunk_cover_times(total_duration: float, chunk_duration_sec: int = CHUNK_DURATION_SEC, overlap_duration_sec: int = OVERLAP_DURATION_SEC) -> list:
     """
-    Analyzes the transcription and generates a list of potential viral segments,
-    using chunking with overlap for long videos. It also extracts keywords for each
-    segment and saves them to separate .tsv files corresponding to the video segments.
+    Tempos a partir dos quais cada chunk de get_transcript_chunks (exceto o último) está
+    coberto por inteiro pela transcrição: o fim do chunk mais a margem. O pipeline em fluxo
+    fecha as janelas de transcrição logo depois deles.
     """
-    print("Analisando transcrição para encontrar segmentos virais...")
+    step = chunk_duration_sec - overlap_duration_sec
+    ends = np.arange(0, total_duration, step) + chunk_duration_sec + CHUNK_MARGIN_SEC
+    return [float(end) for end in ends if end < total_duration]
 
-    # Define the output paths
-    output_path = os.path.join('tmp', 'viral_segments.txt')
-    keywords_output_path = os.path.join('tmp', 'viral_segments_keywords.txt')
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    # Read the transcription data
-    try:
-        df = pd.read_csv(os.path.join('tmp', 'input_video.tsv'), sep='\t')
-    except FileNotFoundError:
-        print("ERRO: Arquivo 'input_video.tsv' não encontrado. A transcrição falhou.")
-        raise
+def theme_keywords(viral_mode, themes) -> list:
+    """Temas do job (separados por vírgula) usados como palavras-chave no pré-ranqueamento."""
+    if viral_mode or not themes:
+        return []
+    return [theme.strip().lower() for theme in str(themes).split(',') if theme.strip()]
 
-    if df.empty:
-        print("A transcrição está vazia. Nenhum segmento pode ser gerado.")
-        return {"segments": []}
-    
-    df['start'] = df['start'] / 1000
-    df['end'] = df['end'] / 1000
-    print("DEBUG: Colunas 'start' e 'end' convertidas para segundos.")
 
-    # --- Configuração de Chunking ---
-    CHUNK_DURATION_SEC = 600  # 10 minutos por chunk
-    OVERLAP_DURATION_SEC = 10   # 10 segundos de sobreposição
+def region_chunks(index: TranscriptIndex, regions: list) -> list:
+    """Chunks (mesmo formato de get_transcript_chunks) com o texto de cada região [(início, fim)] escolhida no pré-ranqueamento."""
+    chunks = []
+    for start, end in regions:
+        rows = index.window(start - CHUNK_MARGIN_SEC, end + CHUNK_MARGIN_SEC)
+        if rows.stop > rows.start:
+            chunks.append({"chunk_text": " ".join(index.texts[rows]), "start_time_offset": start})
+    return chunks
+
+
+def export_segment_transcripts(df: pd.DataFrame, segments: list, workspace_dir: str):
+    """
+    Grava a transcrição de cada segmento em {workspace_dir}/outputNNN.tsv (tempos em segundos).
+    Cada arquivo é formatado de forma vetorizada e escrito de uma só vez.
+    """
+    index = TranscriptIndex(df)
+    for idx, segment in enumerate(segments):
+        rows = index.window(segment.get('start', 0), segment.get('end', 0))
+        # Formata apenas as linhas do segmento, em bloco, e grava tudo com um único write
+        lines = np.char.add(np.char.add(np.char.mod('%.3f\t', index.starts[rows]), np.char.mod('%.3f\t', index.ends[rows])), index.texts[rows].astype(str))
+        transcription_output_path = os.path.join(workspace_dir, f"output{idx:03d}.tsv")
+        with open(transcription_output_path, 'w', encoding='utf-8') as f:
+            f.write("start\tend\ttext\n")  # Cabeçalho do arquivo TSV
+            if len(lines):
+                f.write("\n".join(lines) + "\n")
+        print(f"Transcrição do segmento {idx} salva em {transcription_output_path}")
 
-    transcript_chunks = get_transcript_chunks(df, CHUNK_DURATION_SEC, OVERLAP_DURATION_SEC)
-    
-    if not transcript_chunks:
-        print("Nenhum chunk de transcrição foi gerado. Verifique os dados de entrada.")
-        return {"segments": []}
 
-    all_potential_segments = []
-
-    for i, chunk_info in enumerate(transcript_chunks):
-        chunk_text = chunk_info['chunk_text']
-        chunk_offset = chunk_info['start_time_offset']
-
-        print(f"Processando chunk {i+1}/{len(transcript_chunks)} (Início: {chunk_offset:.2f}s)...")
-
-        # Build the prompt for the AI
-        if viral_mode:
-            theme_prompt = "analisando a transcrição para encontrar os momentos mais virais e de maior impacto."
-        else:
-            theme_prompt = f"com base nos seguintes temas: {themes}."
-
-        # O prompt agora inclui o offset do chunk e instrui o LLM a retornar tempos absolutos e palavras-chave
-        prompt = f"""
-        "Based on THIS TRANSCRIPT EXCERPT, act as an expert in viral video cuts for social media, {theme_prompt}
-        Identify all the themes covered and select segments that have between {tempo_minimo} and {tempo_maximo} seconds with the highest virality scores.
-        If you identify more than one theme in the description, try to distribute the segments among them. Ignore long introductions and pauses.
-        THE SEGMENTS MUST MAKE SENSE ON THEIR OWN, even when viewed out of context.
-        IT IS CRITICAL that the start and end times are ABSOLUTE in relation to the beginning of the FULL VIDEO, considering that this transcript begins approximately at the second {chunk_offset:.2f} of the original video.
-        For each segment, provide:
-        - The start and end times (in seconds), ABSOLUTE in relation to the beginning of the video.
-        - A short and attractive title in Portuguese (maximum 10 ... 5 words).
-        - A brief description of why this segment is a good fit (maximum 15 words).
-        - A 'virality' score from 0 to 100.
-        - A list of up to 5 keywords in Portuguese that summarize the topic of the segment.
-
-        The response MUST be a valid JSON object, with no additional text before or after.
-        The JSON format should be:
+def build_prompt(chunk_text: str, chunk_offset: float, viral_mode, themes, tempo_minimo, tempo_maximo) -> str:
+    """
+    Monta o prompt enviado ao LLM para um chunk da transcrição.
+    """
+    # Build the prompt for the AI
+    if viral_mode:
+        theme_prompt = "analisando a transcrição para encontrar os momentos mais virais e de maior impacto."
+    else:
+        theme_prompt = f"com base nos seguintes temas: {themes}."
+
+    # O prompt agora inclui o offset do chunk e instrui o LLM a retornar tempos absolutos e palavras-chave
+    prompt = f"""
+    "Based on THIS TRANSCRIPT EXCERPT, act as an expert in viral video cuts for social media, {theme_prompt}
+    Identify all the themes covered and select segments that have between {tempo_minimo} and {tempo_maximo} seconds with the highest virality scores.
+    If you identify more than one theme in the description, try to distribute the segments among them. Ignore long introductions and pauses.
+    THE SEGMENTS MUST MAKE SENSE ON THEIR OWN, even when viewed out of context.
+    IT IS CRITICAL that the start and end times are ABSOLUTE in relation to the beginning of the FULL VIDEO, considering that this transcript begins approximately at the second {chunk_offset:.2f} of the original video.
+    For each segment, provide:
+    - The start and end times (in seconds), ABSOLUTE in relation to the beginning of the video.
+    - A short and attractive title in Portuguese (maximum 10 ... 5 words).
+    - A brief description of why this segment is a good fit (maximum 15 words).
+    - A 'virality' score from 0 to 100.
+    - A list of up to 5 keywords in Portuguese that summarize the topic of the segment.
+
+    The response MUST be a valid JSON object, with no additional text before or after.
+    The JSON format should be:
+    {{
+      "segments": [
         {{
-          "segments": [
-            {{
-              "start": <start_time_in_seconds>,
-              "end": <end_time_in_seconds>,
-              "title": "<title>",
-              "description": "<description>",
-              "score": <score>,
-              "keywords": ["<keyword1>", "<keyword2>", "..."]
-            }}
-          ]
+          "start": <start_time_in_seconds>,
+          "end": <end_time_in_seconds>,
+          "title": "<title>",
+          "description": "<description>",
+          "score": <score>,
+          "keywords": ["<keyword1>", "<keyword2>", "..."]
         }}
+      ]
+    }}
+
+    Transcription of the excerpt:
+    '{chunk_text}'"
+    """
+    return prompt
 
-        Transcription of the excerpt:
-        '{chunk_text}'"
-        """
 
+def analyze_chunk(backend, index: int, total: int, prompt: str, timeout: float = LLM_TIMEOUT_SEC, max_retries: int = LLM_MAX_RETRIES, timings: dict | None = None) -> list:
+    """
+    Envia o prompt de um chunk ao backend de LLM e retorna os segmentos válidos da resposta.
+    Falhas de rede e respostas com JSON inválido são repetidas com backoff exponencial;
+    se todas as tentativas falharem, o chunk é ignorado (lista vazia).
+    Cada chamada ao backend é medida na etapa 'llm_call' (e acumulada em `timings`).
+    """
+    for attempt in range(max_retries + 1):
+        cleaned_response = None
         try:
-            response = g4f.ChatCompletion.create(
-                model=g4f.models.gpt_4,
-                messages=[{"role": "user", "content": prompt}],
-            )
+            with metrics.timed("llm_call", timings):
+                response = backend.complete(prompt, timeout)
             # Clean the response to ensure it's valid JSON
             cleaned_response = response.strip().replace('```json', '').replace('```', '')
             chunk_viral_segments = json.loads(cleaned_response)
-            
-            # Adicionar os segmentos do chunk à lista geral
-            for segment in chunk_viral_segments.get('segments', []):
-                # Basic validation: ensure times are within reasonable bounds
-                if segment.get('start', -1) >= 0 and segment.get('end', 0) > segment.get('start', -1):
-                    all_potential_segments.append(segment)
 
+            # Basic validation: ensure times are within reasonable bounds
+            return [
+                segment for segment in chunk_viral_segments.get('segments', [])
+                if segment.get('start', -1) >= 0 and segment.get('end', 0) > segment.get('start', -1)
+            ]
         except json.JSONDecodeError as e:
-            print(f"ERRO: Falha ao decodificar JSON do chunk {i+1}. Resposta inválida: {cleaned_response}. Erro: {e}")
+            # Não deixa uma resposta inválida memorizada: a próxima tentativa consulta o modelo de novo
+            backend.invalidate(prompt)
+            print(f"ERRO: Falha ao decodificar JSON do chunk {index+1}/{total} (tentativa {attempt+1}). Resposta inválida: {cleaned_response}. Erro: {e}")
         except Exception as e:
-            print(f"ERRO: Falha ao gerar ou processar segmentos virais para o chunk {i+1}. {e}")
-            # Decide if you want to continue or stop
+            backend.invalidate(prompt)
+            print(f"ERRO: Falha ao gerar ou processar segmentos virais para o chunk {index+1}/{total} (tentativa {attempt+1}). {e}")
+
+        if attempt < max_retries:
+            # Backoff exponencial com jitter para não sincronizar as novas tentativas dos chunks
+            time.sleep(LLM_RETRY_BACKOFF_SEC * (2 ** attempt) * (1 + random.random() / 2))
+
+    print(f"⚠️ Chunk {index+1}/{total} ignorado após {max_retries + 1} tentativas.")
+    return []
+
+
+def _resolve_audio(audio):
+    """`audio` pode vir como função que o carrega: a extração só acontece se o pré-ranqueamento rodar."""
+    return audio() if callable(audio) else audio
+
+
+def find_segments(df: pd.DataFrame, num_segments, viral_mode, themes, tempo_minimo, tempo_maximo, max_in_flight: int = LLM_MAX_IN_FLIGHT, backend=None, on_progress=None, timings=None,
+                  audio=None):
+    """
+    Envia os chunks da transcrição ao LLM (até 'max_in_flight' requisições simultâneas),
+    usando o backend informado ou o configurado em VC_LLM_BACKEND (com cache de respostas),
+    agrega as respostas na ordem dos chunks, remove duplicatas e retorna os
+    'num_segments' segmentos de maior score no formato {"segments": [...]}.
+    Em vídeos longos, o pré-ranqueamento local (scripts/prerank.py, sobre a transcrição e o
+    áudio do job em `audio`, se informado: o array ou uma função que o retorna, chamada só
+    se o pré-ranqueamento rodar) envia só as VC_PRERANK_TOP_K melhores regiões.
+    `on_progress(concluídos, total)` é chamado a cada chunk analisado.
+    """
+    index = TranscriptIndex(df)
+    if prerank.enabled(index.total_duration):
+        with metrics.timed("prerank", timings):
+            loudness = prerank.loudness_per_second(_resolve_audio(audio)) if audio is not None else None
+            regions = prerank.select_regions(index.df, loudness=loudness, keywords=theme_keywords(viral_mode, themes))
+            transcript_chunks = region_chunks(index, regions)
+        covered = sum(end - start for start, end in regions)
+        print(f"Pré-ranqueamento: {len(regions)} regiões ({covered:.0f}s de {index.total_duration:.0f}s) enviadas ao LLM.")
+    else:
+        transcript_chunks = get_transcript_chunks(df, CHUNK_DURATION_SEC, OVERLAP_DURATION_SEC)
+    
+    if not transcript_chunks:
+        print("Nenhum chunk de transcrição foi gerado. Verifique os dados de entrada.")
+        return {"segments": []}
+
+    backend = backend or get_backend()
+    total = len(transcript_chunks)
+    prompts = [
+        build_prompt(chunk_info['chunk_text'], chunk_info['start_time_offset'], viral_mode, themes, tempo_minimo, tempo_maximo)
+        for chunk_info in transcript_chunks
+    ]
+    print(f"Processando {total} chunks com até {max_in_flight} requisições simultâneas ao LLM...")
+
+    # executor.map devolve os resultados na ordem dos chunks, o que mantém a
+    # agregação determinística independentemente de qual requisição termina primeiro.
+    completed = [0]
+    completed_lock = threading.Lock()
+
+    def analyze(index: int, prompt: str) -> list:
+        segments = analyze_chunk(backend, index, total, prompt, timings=timings)
+        if on_progress:
+            with completed_lock:
+                completed[0] += 1
+                done = completed[0]
+            on_progress(done, total)
+        return segments
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, total))) as executor:
+        results = list(executor.map(analyze, range(total), prompts))
 
     # --- Pós-processamento: Remover Duplicatas e Selecionar os Melhores ---
     print("Agregando e filtrando segmentos de todos os chunks...")
+    return select_segments(results, num_segments)
+
+
+def segment_key(segment: dict) -> tuple:
+    """
+    Chave que identifica "duplicatas": tempos arredondados (para evitar problemas de float e
+    considerá-los iguais se estiverem muito próximos) e o título.
+    """
+    return (round(segment.get('start', 0), 1), round(segment.get('end', 0), 1), segment.get('title', '').lower())
 
+
+def select_segments(chunk_results: list, num_segments) -> dict:
+    """
+    Agrega as respostas dos chunks (na ordem dos chunks), remove duplicatas e retorna os
+    'num_segments' segmentos de maior score no formato {"segments": [...]}.
+    """
     unique_segments = {}
-    for segment in all_potential_segments:
-        # Arredondar tempos para evitar problemas de float e considerá-los "iguais" se estiverem muito próximos
-        # Usar uma tupla (start_rounded, end_rounded, title) como chave para identificar "duplicatas"
-        key = (round(segment.get('start', 0), 1), round(segment.get('end', 0), 1), segment.get('title', '').lower())
-        
+    for segment in (segment for chunk_segments in chunk_results for segment in chunk_segments):
+        key = segment_key(segment)
         # Se um segmento com a mesma chave já existe, mantenha o de maior score
         if key not in unique_segments or segment.get('score', 0) > unique_segments[key].get('score', 0):
             unique_segments[key] = segment
@@ -171,26 +309,233 @@ def create(num_segments, viral_mode, themes, tempo_minimo, tempo_maximo):
     final_segments.sort(key=lambda x: x.get('score', 0), reverse=True)
     
     # Garante que pegue no máximo o número de segmentos disponíveis.
-    final_segments_to_save = {"segments": final_segments[:max(0, num_segments)]}
+    return {"segments": final_segments[:max(0, num_segments)]}
+
+
+class StreamingSegmentFinder:
+    """
+    Análise em fluxo (pipeline de processing.py): recebe a transcrição janela a janela
+    (`add_rows`) e envia cada chunk ao LLM assim que a transcrição o cobre por inteiro,
+    sem esperar o fim do vídeo. Os chunks são os mesmos de get_transcript_chunks (e os
+    prompts, idênticos, aproveitam o cache de respostas do LLM), e `finish` devolve a
+    mesma seleção de find_segments. Com o pré-ranqueamento (ver scripts/prerank.py e
+    `expected_duration`), o orçamento global de `prerank_top_k` janelas (VC_PRERANK_TOP_K) é liberado aos poucos,
+    proporcionalmente à duração já coberta: a cada chunk coberto, as janelas liberadas vão para
+    as melhores ainda não enviadas de toda a transcrição recebida até ali (um trecho fraco não
+    recebe nenhuma), e o que sobrar do orçamento é gasto em `finish`, com a transcrição inteira.
+    Nunca são enviadas mais de `prerank_top_k` janelas, como no caminho sequencial.
+
+    Cada segmento que entra no top-'num_segments' parcial com folga é anunciado uma única vez
+    em `on_candidate(segmento)`, para que o corte comece antes do fim da análise: só depois de
+    `cut_min_progress` do vídeo analisado, com o top parcial completo e com score pelo menos
+    `cut_score_margin` acima do K-ésimo (histerese, para não cortar candidatos que logo saem do top).
+    Candidatos que saírem do top final devem ser descartados por quem os cortou.
+    `slot()` (opcional) é reservado pelo primeiro chunk analisado e mantido até `finish`/`close`,
+    sem bloquear quem entrega a transcrição.
+    """
+
+    def __init__(self, num_segments, viral_mode, themes, tempo_minimo, tempo_maximo, max_in_flight: int = LLM_MAX_IN_FLIGHT,
+                 backend=None, on_candidate=None, on_progress=None, timings=None, expected_duration: float | None = None, slot=None,
+                 audio=None, prerank_top_k: int = prerank.PRERANK_TOP_K, cut_min_progress: float = STREAM_CUT_MIN_PROGRESS,
+                 cut_score_margin: float = STREAM_CUT_SCORE_MARGIN):
+        self.num_segments = num_segments
+        self._cut_min_progress = cut_min_progress
+        self._cut_score_margin = cut_score_margin
+        self._expected_duration = expected_duration
+        self._analyzed_until = 0.0  # fim do trecho coberto mais adiantado já analisado
+        self._prompt_args = (viral_mode, themes, tempo_minimo, tempo_maximo)
+        self._backend = backend or get_backend()
+        self._on_candidate = on_candidate
+        self._on_progress = on_progress
+        self._timings = timings
+        self._slot = slot
+        self._slot_stack = contextlib.ExitStack()
+        self._slot_lock = threading.Lock()
+        self._slot_held = False
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+        self._lock = threading.Lock()
+        self._frames = []
+        self._index = None
+        self._next_start = 0.0
+        self._futures = []  # na ordem dos chunks
+        self._results = {}  # posição do chunk -> segmentos
+        self._announced = set()
+        self._done = 0
+        step = CHUNK_DURATION_SEC - OVERLAP_DURATION_SEC
+        self._expected_chunks = int(np.ceil(expected_duration / step)) if expected_duration else 0
+        self._keywords = theme_keywords(viral_mode, themes)
+        self._loudness = None
+        # Pré-ranqueamento: janelas já enviadas (inícios) e orçamento liberado e ainda não gasto
+        self._top_k = prerank_top_k
+        self._prerank = bool(expected_duration) and prerank.enabled(expected_duration, prerank_top_k)
+        self._sent_windows = []
+        self._credit = 0.0
+        if self._prerank:
+            self._credit_per_chunk = prerank_top_k * step / expected_duration
+            self._expected_chunks = prerank_top_k
+            if audio is not None:
+                with metrics.timed("prerank", timings):
+                    self._loudness = prerank.loudness_per_second(_resolve_audio(audio))
+
+    def add_rows(self, df: pd.DataFrame, covered_until: float):
+        """
+        Acrescenta linhas da transcrição (tempos em segundos) que cobrem o vídeo até
+        `covered_until` e envia ao LLM os chunks que terminam antes disso.
+        """
+        if len(df):
+            self._frames.append(df)
+            self._index = TranscriptIndex(pd.concat(self._frames, ignore_index=True))
+        while self._index is not None and self._next_start + CHUNK_DURATION_SEC + CHUNK_MARGIN_SEC <= covered_until:
+            self._submit(self._next_start + CHUNK_DURATION_SEC)
+
+    def _submit(self, chunk_end_time: float):
+        # Mesma janela (e margem) de get_transcript_chunks
+        chunk_start = self._next_start
+        rows = self._index.window(chunk_start - CHUNK_MARGIN_SEC, chunk_end_time + CHUNK_MARGIN_SEC)
+        self._next_start += CHUNK_DURATION_SEC - OVERLAP_DURATION_SEC
+        if self._prerank:
+            self._credit += self._credit_per_chunk
+            self._send_windows(int(self._credit), chunk_end_time)
+            return
+        if rows.stop <= rows.start:
+            return
+        self._send_chunks([{"chunk_text": " ".join(self._index.texts[rows]), "start_time_offset": chunk_start}], chunk_end_time)
+
+    def _send_windows(self, count: int, covered_until: float):
+        """Envia as `count` melhores janelas ainda não enviadas da transcrição recebida até `covered_until` (dentro do orçamento)."""
+        count = min(count, self._top_k - len(self._sent_windows))
+        if count <= 0 or self._index is None:
+            return
+        with metrics.timed("prerank", self._timings):
+            windows = prerank.select_windows(self._index.df, top_k=count, loudness=self._loudness, keywords=self._keywords,
+                                             span=(0.0, covered_until), taken=self._sent_windows)
+            chunks = region_chunks(self._index, prerank.merge_windows(windows, span_end=covered_until))
+        self._sent_windows.extend(windows)
+        self._credit -= len(windows)
+        self._send_chunks(chunks, covered_until)
+
+    def _send_chunks(self, chunks: list, chunk_end_time: float):
+        for chunk in chunks:
+            prompt = build_prompt(chunk["chunk_text"], chunk["start_time_offset"], *self._prompt_args)
+            position = len(self._futures)
+            print(f"Trecho {position + 1} ({chunk['start_time_offset']:.0f}s, até {chunk_end_time:.0f}s) coberto pela transcrição; enviando ao LLM.")
+            self._futures.append(self._executor.submit(self._analyze, position, prompt, chunk_end_time))
+
+    def _cut_candidates(self, partial: list) -> list:
+        """Segmentos do top parcial que já podem ser cortados (ver histerese na docstring da classe)."""
+        if self._expected_duration and self._analyzed_until < self._cut_min_progress * self._expected_duration:
+            return []
+        if len(partial) < self.num_segments:
+            return []
+        kth_score = partial[-1].get('score', 0)
+        return [segment for segment in partial
+                if segment_key(segment) not in self._announced and segment.get('score', 0) >= kth_score + self._cut_score_margin]
+
+    def _analyze(self, position: int, prompt: str, chunk_end_time: float) -> list:
+        with self._slot_lock:
+            if self._slot and not self._slot_held:
+                self._slot_stack.enter_context(self._slot())
+                self._slot_held = True
+        total = max(self._expected_chunks, len(self._futures))
+        segments = analyze_chunk(self._backend, position, total, prompt, timings=self._timings)
+        with self._lock:
+            self._results[position] = segments
+            self._done += 1
+            done = self._done
+            self._analyzed_until = max(self._analyzed_until, chunk_end_time)
+            # Top parcial, com os chunks já analisados na ordem dos chunks (como na seleção final)
+            partial = select_segments([self._results[i] for i in sorted(self._results)], self.num_segments)["segments"]
+            candidates = self._cut_candidates(partial)
+            self._announced.update(segment_key(segment) for segment in candidates)
+        if self._on_progress:
+            self._on_progress(done, max(total, done))
+        if self._on_candidate:
+            for segment in candidates:
+                self._on_candidate(segment)
+        return segments
+
+    def finish(self) -> dict:
+        """Envia os chunks restantes (a transcrição está completa), espera as respostas e retorna a seleção final."""
+        try:
+            if self._index is not None:
+                total_duration = self._index.total_duration
+                while self._next_start < total_duration:
+                    self._submit(min(self._next_start + CHUNK_DURATION_SEC, total_duration))
+                if self._prerank:
+                    # Transcrição completa: o orçamento restante vai para as melhores janelas do vídeo inteiro
+                    self._send_windows(self._top_k, total_duration)
+            if not self._futures:
+                print("Nenhum chunk de transcrição foi gerado. Verifique os dados de entrada.")
+                return {"segments": []}
+            results = [future.result() for future in self._futures]
+            print("Agregando e filtrando segmentos de todos os chunks...")
+            return select_segments(results, self.num_segments)
+        finally:
+            self.close()
+
+    def close(self):
+        """Interrompe a análise (chunks ainda não enviados são descartados) e libera o slot."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._slot_stack.close()
 
-    # Save the segments to the specified file
+
+def load_transcript(workspace_dir: str) -> pd.DataFrame:
+    """Lê {workspace_dir}/input_video.tsv (tempos em ms, formato do WhisperX) com os tempos convertidos para segundos."""
+    try:
+        df = pd.read_csv(os.path.join(workspace_dir, 'input_video.tsv'), sep='\t')
+    except FileNotFoundError:
+        print("ERRO: Arquivo 'input_video.tsv' não encontrado. A transcrição falhou.")
+        raise
+    df['start'] = df['start'] / 1000
+    df['end'] = df['end'] / 1000
+    return df
+
+
+def save_segments(df: pd.DataFrame, viral_segments: dict, workspace_dir: str):
+    """Grava {workspace_dir}/viral_segments.txt e a transcrição de cada segmento selecionado."""
+    output_path = os.path.join(workspace_dir, 'viral_segments.txt')
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
     with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(final_segments_to_save, f, ensure_ascii=False, indent=4)
+        json.dump(viral_segments, f, ensure_ascii=False, indent=4)
 
-    print(f"Segmentos virais finais ({len(final_segments_to_save['segments'])} selecionados) salvos em {output_path}")
+    print(f"Segmentos virais finais ({len(viral_segments['segments'])} selecionados) salvos em {output_path}")
 
-    # --- NOVO: Gerar transcrição dos segmentos ---
     print("Gerando transcrição dos segmentos selecionados...")
-    for idx, segment in enumerate(final_segments_to_save.get('segments', [])):
-        start_time = segment.get('start', 0)
-        end_time = segment.get('end', 0)
-        transcription_output_path = os.path.join('tmp', f"output{idx:03d}.tsv")
-        with open(transcription_output_path, 'w', encoding='utf-8') as f:
-            f.write("start\tend\ttext\n")  # Cabeçalho do arquivo TSV
-            segment_transcription = df[(df['start'] >= start_time) & (df['end'] <= end_time)]
-            for _, row in segment_transcription.iterrows():
-                f.write(f"{row['start']:.3f}\t{row['end']:.3f}\t{row['text']}\n")
-        print(f"Transcrição do segmento {idx} salva em {transcription_output_path}")
-    # --- FIM DO NOVO BLOCO ---
+    export_segment_transcripts(df, viral_segments.get('segments', []), workspace_dir)
+
+
+def create(num_segments, viral_mode, themes, tempo_minimo, tempo_maximo, workspace_dir='tmp', cache_key=None, backend=None, on_progress=None, timings=None,
+           audio=None):
+    """
+    Analyzes the transcription and generates a list of potential viral segments,
+    using chunking with overlap for long videos. It also extracts keywords for each
+    segment and saves them to separate .tsv files corresponding to the video segments.
+    All files are read from and written to the job's workspace directory.
+    When a cache_key is given, previously computed segments for the same transcript
+    and parameters are reused instead of querying the LLM again. The LLM backend
+    defaults to the one configured in VC_LLM_BACKEND (see scripts/llm_backends.py).
+    `audio` (the job's 16 kHz audio, see scripts/audio_extract.py, or a function that
+    loads it, called only if the pre-ranking runs) feeds the loudness signals of the
+    local pre-ranking (see scripts/prerank.py).
+    """
+    print("Analisando transcrição para encontrar segmentos virais...")
+
+    # Read the transcription data
+    df = load_transcript(workspace_dir)
+
+    if df.empty:
+        print("A transcrição está vazia. Nenhum segmento pode ser gerado.")
+        return {"segments": []}
+
+    cached_segments = CACHE.get_json('segments', cache_key) if cache_key else None
+    if cached_segments is not None:
+        final_segments_to_save = cached_segments
+    else:
+        final_segments_to_save = find_segments(df, num_segments, viral_mode, themes, tempo_minimo, tempo_maximo, backend=backend, on_progress=on_progress, timings=timings,
+                                               audio=audio)
+        # Não guarda resultados vazios: normalmente indicam falha do LLM, não ausência de cortes
+        if cache_key and final_segments_to_save['segments']:
+            CACHE.put_json('segments', cache_key, final_segments_to_save)
 
-    return final_segments_to_save
\ No newline at end of file
+    save_segments(df, final_segments_to_save, workspace_dir)
+    return final_segments_to_save
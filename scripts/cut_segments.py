@@ -1,95 +1,445 @@
+import contextlib
 import os
+import shutil
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from . import metrics
+from .encoder_profiles import EncoderProfile, get_profile
+from .media_probe import MediaProbeError, is_valid_video, probe, probe_keyframes
 
-def is_video_valid(file_path: str) -> bool:
-    """Verifica se o vídeo é válido usando ffprobe."""
-    try:
-        result = subprocess.run(
-            [
-                "ffprobe", "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=codec_name",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                file_path
-            ],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return bool(result.stdout.strip())  # se encontrou codec de vídeo, é válido
-    except subprocess.CalledProcessError:
+# --- Configuração do corte ---
+CUT_MODE = os.environ.get('VC_CUT_MODE', 'smart')  # 'smart' (copia o miolo entre keyframes), 'reencode' ou 'proxy'
+CUT_MAX_WORKERS = int(os.environ.get('VC_CUT_MAX_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+# Abaixo disso não vale a pena copiar o miolo: o corte é simplesmente reencodado
+SMART_CUT_MIN_COPY_SEC = 2.0
+# Altura das prévias geradas no modo 'proxy'
+PROXY_HEIGHT = 360
+# Tira de miniaturas (sprite) exibida na página de ajuste
+SPRITE_TILES = 10
+SPRITE_TILE_WIDTH = 160
+# --- Corte em lote: uma única decodificação da fonte alimenta as saídas de vários segmentos ---
+# auto: usa o lote em grupos densos de segmentos (modos 'proxy' e 'reencode'); off: nunca; always: sempre
+BATCH_CUT = os.environ.get('VC_BATCH_CUT', 'auto')
+# Segmentos separados por uma lacuna maior que isso ficam em grupos diferentes (a lacuna seria decodificada à toa)
+BATCH_MAX_GAP_SEC = float(os.environ.get('VC_BATCH_CUT_MAX_GAP_SEC', 30))
+# Densidade mínima do grupo (soma das durações / trecho decodificado) para valer o lote
+BATCH_MIN_DENSITY = float(os.environ.get('VC_BATCH_CUT_MIN_DENSITY', 0.75))
+
+
+def _run(command: list, stage: str = "cut", timings: dict | None = None):
+    metrics.run(command, stage, check=True, capture_output=True, text=True, timings=timings)
+
+
+def decodes_cleanly(path: str, timings: dict | None = None) -> bool:
+    """Decodifica o vídeo inteiro (sem gravar nada) e indica se o decodificador não reportou nenhum erro."""
+    result = metrics.run(["ffmpeg", "-v", "error", "-nostdin", "-i", path, "-map", "0:v:0", "-f", "null", "-"],
+                         "cut_verify", capture_output=True, text=True, timings=timings)
+    return result.returncode == 0 and not result.stderr.strip()
+
+
+def _reencode_output_args(profile: EncoderProfile, threads: int) -> list:
+    return [*profile.video_args("cut", threads), "-c:a", "aac", "-b:a", "192k", "-movflags", "+faststart"]
+
+
+def _proxy_output_args(threads: int) -> list:
+    return ["-c:v", "libx264", "-preset", "veryfast", "-crf", "30", "-threads", str(threads),
+            "-c:a", "aac", "-b:a", "96k", "-movflags", "+faststart"]
+
+
+def cut_segment_reencode(input_video_path: str, start_time: float, end_time: float, output_filename: str, threads: int, timings: dict | None = None,
+                         profile: EncoderProfile | None = None):
+    """Corta o segmento reencodando tudo (preciso, porém caro), com o codificador do perfil."""
+    profile = profile or get_profile()
+    hw_filter = ["-vf", profile.filter_suffix().lstrip(",")] if profile.vaapi else []
+    _run([
+        "ffmpeg",
+        *profile.input_args(),
+        "-ss", str(start_time),
+        "-to", str(end_time),
+        "-i", input_video_path,
+        *hw_filter,
+        *_reencode_output_args(profile, threads),
+        "-y",
+        output_filename,
+    ], timings=timings)
+
+
+def cut_segment_proxy(input_video_path: str, start_time: float, end_time: float, output_filename: str, threads: int, timings: dict | None = None):
+    """
+    Gera apenas uma prévia leve do segmento (baixa resolução e bitrate), usada na página
+    de ajuste. A renderização final lê o vídeo original, então a prévia não precisa de qualidade.
+    """
+    _run([
+        "ffmpeg",
+        "-ss", str(start_time),
+        "-to", str(end_time),
+        "-i", input_video_path,
+        "-vf", f"scale=-2:{PROXY_HEIGHT}",
+        *_proxy_output_args(threads),
+        "-y",
+        output_filename,
+    ], timings=timings)
+
+
+# Perfis H.264 (nome do ffprobe -> nome do x264) que as bordas reencodadas conseguem reproduzir
+_X264_PROFILES = {
+    "Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high",
+    "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444",
+}
+
+
+def smart_cut_encode_args(video_stream: dict) -> list | None:
+    """
+    Parâmetros do x264 para as bordas do smart cut reproduzirem o stream copiado no miolo:
+    mesmo perfil, nível e formato de pixel (o avcC do MP4 final descreve só o SPS da primeira
+    parte). Retorna None se o stream não puder ser igualado (perfil desconhecido, entrelaçado...):
+    nesse caso o segmento é reencodado por completo.
+    """
+    x264_profile = _X264_PROFILES.get(video_stream.get("profile"))
+    level = int(video_stream.get("level") or 0)
+    pix_fmt = video_stream.get("pix_fmt")
+    if not x264_profile or level <= 0 or not pix_fmt or video_stream.get("field_order", "progressive") not in ("progressive", "unknown"):
+        return None
+    return ["-profile:v", x264_profile, "-level:v", f"{level / 10:.1f}", "-pix_fmt", pix_fmt]
+
+
+def cut_segment_smart(input_video_path: str, start_time: float, end_time: float, output_filename: str, keyframes: list, threads: int, timings: dict | None = None,
+                      profile: EncoderProfile | None = None) -> bool:
+    """
+    Smart cut: copia sem reencodar os GOPs inteiros entre o primeiro e o último keyframe
+    do segmento e reencoda apenas os GOPs parciais das bordas. As partes são unidas
+    em MPEG-TS (SPS/PPS em banda) e o áudio do intervalo exato é encodado na mesma etapa.
+    Retorna False quando o segmento não tem GOPs inteiros suficientes para compensar, quando
+    as bordas não conseguem reproduzir o stream da fonte (ver `smart_cut_encode_args`) ou quando
+    a saída não decodifica sem erros do início ao fim (ver `decodes_cleanly`).
+    As bordas usam sempre o x264 (com preset/CRF do perfil), para concatenar com o miolo copiado.
+    """
+    inner = [k for k in keyframes if start_time <= k <= end_time]
+    if len(inner) < 2 or inner[-1] - inner[0] < SMART_CUT_MIN_COPY_SEC:
+        return False
+    video_stream = probe(input_video_path).video_stream
+    matching_args = smart_cut_encode_args(video_stream)
+    if matching_args is None:
+        print(f"Stream da fonte não reproduzível nas bordas ({video_stream.get('profile')}, {video_stream.get('pix_fmt')}); usando reencode.")
         return False
+    copy_start, copy_end = inner[0], inner[-1]
+    profile = profile or get_profile()
+    # Mesma base de tempo do stream copiado no MP4 final
+    timescale = video_stream.get("time_base", "").partition("/")[2]
+    timescale_args = ["-video_track_timescale", timescale] if timescale.isdigit() else []
 
-def is_valid_video(path: str) -> bool:
+    parts_dir = f"{os.path.splitext(output_filename)[0]}_parts"
+    os.makedirs(parts_dir, exist_ok=True)
     try:
-        probe = subprocess.run(
-            ["ffprobe", "-v", "error", "-select_streams", "v:0",
-             "-show_entries", "stream=codec_name", "-of", "default=noprint_wrappers=1:nokey=1", path],
-            capture_output=True, text=True, check=True
-        )
-        return bool(probe.stdout.strip())
-    except subprocess.CalledProcessError:
-        return False
-    
-def cut(viral_segments, input_video_path):
+        encode_args = ["-an", *profile.video_args("cut", threads, software=True), *matching_args,
+                       "-bsf:v", "h264_mp4toannexb", "-f", "mpegts", "-y"]
+        parts = []
+        # Borda inicial: do ponto de corte até o primeiro keyframe (exclusivo)
+        if copy_start - start_time > 0.001:
+            head = os.path.join(parts_dir, "head.ts")
+            _run(["ffmpeg", "-ss", str(start_time), "-to", str(copy_start), "-i", input_video_path, *encode_args, head], timings=timings)
+            parts.append(head)
+        # Miolo: GOPs completos, copiados sem reencode (o seek cai exatamente no keyframe)
+        middle = os.path.join(parts_dir, "middle.ts")
+        _run(["ffmpeg", "-ss", str(copy_start), "-i", input_video_path, "-t", str(copy_end - copy_start),
+              "-an", "-c:v", "copy", "-bsf:v", "h264_mp4toannexb", "-f", "mpegts", "-y", middle], timings=timings)
+        parts.append(middle)
+        # Borda final: do último keyframe até o fim do segmento
+        if end_time - copy_end > 0.001:
+            tail = os.path.join(parts_dir, "tail.ts")
+            _run(["ffmpeg", "-ss", str(copy_end), "-to", str(end_time), "-i", input_video_path, *encode_args, tail], timings=timings)
+            parts.append(tail)
+
+        concat_list = os.path.join(parts_dir, "parts.txt")
+        with open(concat_list, 'w', encoding='utf-8') as f:
+            f.writelines(f"file '{os.path.abspath(part)}'\n" for part in parts)
+
+        _run([
+            "ffmpeg",
+            "-f", "concat", "-safe", "0", "-i", concat_list,
+            "-ss", str(start_time), "-to", str(end_time), "-i", input_video_path,
+            "-map", "0:v:0", "-map", "1:a:0?",
+            "-c:v", "copy",
+            "-c:a", "aac", "-b:a", "192k",
+            *timescale_args,
+            "-movflags", "+faststart",
+            "-y",
+            output_filename,
+        ], timings=timings)
+        if not decodes_cleanly(output_filename, timings=timings):
+            print(f"Smart cut de {output_filename} não decodifica sem erros; usando reencode.")
+            return False
+        return True
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+
+def cut_segments_batch(input_video_path: str, segments: list, output_filenames: list, mode: str, threads: int,
+                       timings: dict | None = None, profile: EncoderProfile | None = None):
+    """
+    Corta vários segmentos com um único ffmpeg: a fonte é lida e decodificada uma vez, do
+    início do primeiro segmento ao fim do último, e um filter graph (split + trim) distribui
+    os quadros para uma saída por segmento. Trechos sobrepostos não são decodificados de novo.
+    `mode` é 'proxy' (prévias, escaladas uma vez antes do split) ou 'reencode' (perfil de codificação).
+    """
+    profile = profile or get_profile()
+    window_start = min(segment["start"] for segment in segments)
+    window_end = max(segment["end"] for segment in segments)
+    count = len(segments)
+    has_audio = probe(input_video_path).has_audio
+
+    scale = f"scale=-2:{PROXY_HEIGHT}," if mode == "proxy" else ""
+    hw_suffix = profile.filter_suffix() if mode != "proxy" else ""
+    graph = [f"[0:v]{scale}split={count}" + "".join(f"[v{i}]" for i in range(count))]
+    if has_audio:
+        graph.append(f"[0:a]asplit={count}" + "".join(f"[a{i}]" for i in range(count)))
+    for i, segment in enumerate(segments):
+        # Após o seek na entrada, os timestamps começam em zero no início da janela
+        start, end = segment["start"] - window_start, segment["end"] - window_start
+        graph.append(f"[v{i}]trim=start={start:.3f}:end={end:.3f},setpts=PTS-STARTPTS{hw_suffix}[ov{i}]")
+        if has_audio:
+            graph.append(f"[a{i}]atrim=start={start:.3f}:end={end:.3f},asetpts=PTS-STARTPTS[oa{i}]")
+
+    output_args = _proxy_output_args(threads) if mode == "proxy" else _reencode_output_args(profile, threads)
+    command = [
+        "ffmpeg",
+        *(profile.input_args() if mode != "proxy" else []),
+        "-ss", str(window_start),
+        "-to", str(window_end),
+        "-i", input_video_path,
+        "-filter_complex", ";".join(graph),
+    ]
+    for i, output_filename in enumerate(output_filenames):
+        command += ["-map", f"[ov{i}]", *(["-map", f"[oa{i}]"] if has_audio else []), *output_args, "-y", output_filename]
+    _run(command, stage="cut_batch", timings=timings)
+
+
+def plan_batches(segments: list, policy: str = BATCH_CUT) -> list:
+    """
+    Agrupa os índices dos segmentos para o corte em lote. Em ordem de início, um segmento
+    entra no grupo anterior se a lacuna até ele for de no máximo BATCH_MAX_GAP_SEC; grupos
+    com densidade (soma das durações / trecho decodificado) abaixo de BATCH_MIN_DENSITY
+    voltam a ser cortados segmento a segmento. Retorna uma lista de listas de índices.
+    """
+    if policy == "off" or len(segments) < 2:
+        return [[i] for i in range(len(segments))]
+    clusters, current, current_end = [], [], 0.0
+    for i in sorted(range(len(segments)), key=lambda i: segments[i]["start"]):
+        if current and (policy == "always" or segments[i]["start"] - current_end <= BATCH_MAX_GAP_SEC):
+            current.append(i)
+            current_end = max(current_end, segments[i]["end"])
+        else:
+            if current:
+                clusters.append(current)
+            current, current_end = [i], segments[i]["end"]
+    clusters.append(current)
+
+    groups = []
+    for cluster in clusters:
+        span = max(segments[i]["end"] for i in cluster) - min(segments[i]["start"] for i in cluster)
+        covered = sum(segments[i]["end"] - segments[i]["start"] for i in cluster)
+        if len(cluster) > 1 and span > 0 and (policy == "always" or covered / span >= BATCH_MIN_DENSITY):
+            groups.append(sorted(cluster))
+        else:
+            groups.extend([i] for i in cluster)
+    return groups
+
+
+def _cut_group(group: list, segments: list, input_video_path: str, output_filenames: list, mode: str, keyframes: list,
+               threads: int, timings: dict | None, profile: EncoderProfile) -> list:
+    """Corta um grupo do plano (em lote se tiver mais de um segmento). Retorna [(índice, caminho)]."""
+    if len(group) > 1:
+        outputs = [output_filenames[i] for i in group]
+        try:
+            # As saídas do lote dividem as threads de um único slot do pool
+            cut_segments_batch(input_video_path, [segments[i] for i in group], outputs, mode,
+                               max(1, threads // len(group)), timings, profile)
+            if all(is_valid_video(path) for path in outputs):
+                print(f"Segmentos {group} cortados em lote (uma decodificação): {outputs}")
+                return list(zip(group, outputs))
+            print(f"Corte em lote dos segmentos {group} gerou arquivos inválidos; cortando um a um.")
+        except subprocess.CalledProcessError as e:
+            print(f"Corte em lote dos segmentos {group} falhou, cortando um a um:\nStderr: {e.stderr}")
+    return [(i, _cut_one(i, segments[i], input_video_path, output_filenames[i], mode, keyframes, threads, timings, profile)) for i in group]
+
+
+def _cut_one(i: int, segment: dict, input_video_path: str, output_filename: str, mode: str, keyframes: list, threads: int, timings: dict | None = None,
+             profile: EncoderProfile | None = None) -> str:
+    start_time = segment["start"]
+    end_time = segment["end"]
+    if mode == "proxy":
+        try:
+            cut_segment_proxy(input_video_path, start_time, end_time, output_filename, threads, timings)
+        except subprocess.CalledProcessError as e:
+            print(f"ERRO ao gerar a prévia do segmento {i}:\nStderr: {e.stderr}")
+            raise
+        if not is_valid_video(output_filename):
+            raise ValueError(f"Arquivo de saída inválido: {output_filename}")
+        print(f"Prévia do segmento {i} gerada: {output_filename}")
+        return output_filename
+
+    if mode == "smart":
+        try:
+            if cut_segment_smart(input_video_path, start_time, end_time, output_filename, keyframes, threads, timings, profile) and is_valid_video(output_filename):
+                print(f"Segmento {i} cortado com sucesso (smart cut): {output_filename}")
+                return output_filename
+        except subprocess.CalledProcessError as e:
+            print(f"Smart cut do segmento {i} falhou, usando reencode completo:\nStderr: {e.stderr}")
+
+    # Reencode completo com qualidade alta
+    try:
+        cut_segment_reencode(input_video_path, start_time, end_time, output_filename, threads, timings, profile)
+        if not is_valid_video(output_filename):
+            raise ValueError(f"Arquivo de saída inválido: {output_filename}")
+    except subprocess.CalledProcessError as e:
+        print(f"ERRO ao cortar segmento {i} mesmo com reencode:\nStderr: {e.stderr}")
+        raise
+    print(f"Segmento {i} cortado com sucesso (reencode): {output_filename}")
+    return output_filename
+
+
+def _prepare_source(input_video_path: str, mode: str) -> tuple:
+    """
+    Lê (uma vez por fonte) o que o modo de corte precisa: no modo 'smart', o índice de keyframes.
+    Retorna (modo efetivo, keyframes); fontes que não são H.264 caem para 'reencode'.
+    """
+    if mode != "smart":
+        return mode, []
+    try:
+        if probe(input_video_path).video_codec == "h264":
+            keyframes = probe_keyframes(input_video_path)
+            print(f"Índice de keyframes carregado: {len(keyframes)} keyframes")
+            return mode, keyframes
+        print("Fonte não é H.264; smart cut desativado, usando reencode.")
+    except MediaProbeError as e:
+        print(f"Não foi possível ler os keyframes, usando reencode: {e}")
+    return "reencode", []
+
+
+def cut(viral_segments, input_video_path, workspace_dir="tmp", mode=None, max_workers=None, on_progress=None, timings=None, profile=None, batch=None):
+    """
+    Corta os segmentos em paralelo (até 'max_workers' processos ffmpeg simultâneos).
+    No modo 'smart', o índice de keyframes da fonte é lido uma única vez e cada corte
+    copia os GOPs internos, reencodando só as bordas; para fontes que não são H.264,
+    ou se algo falhar, o segmento é reencodado por completo. No modo 'proxy' são
+    geradas apenas prévias em baixa resolução. Nos modos 'proxy' e 'reencode', grupos
+    densos de segmentos são cortados em lote, com uma única decodificação (ver
+    plan_batches; `batch` sobrescreve VC_BATCH_CUT).
+    `on_progress(índice, caminho)` é chamado assim que cada segmento fica pronto e o tempo
+    de cada chamada ao ffmpeg é acumulado em `timings` (etapa 'cut'), se informado.
+    `profile` define o codificador dos cortes em qualidade final (as prévias não dependem dele).
+    Retorna os caminhos dos arquivos na mesma ordem dos segmentos.
+    """
     print("Iniciando o corte dos segmentos de vídeo...")
-    output_dir = "tmp"
+    output_dir = workspace_dir
     os.makedirs(output_dir, exist_ok=True)
+    segments = viral_segments["segments"]
+    if not segments:
+        return []
+
+    profile = profile or get_profile()
+    max_workers = max(1, min(max_workers or CUT_MAX_WORKERS, len(segments)))
+    # Divide as threads do x264 entre os processos para não sobrecarregar a CPU
+    threads = max(1, (os.cpu_count() or 2) // max_workers)
+    mode, keyframes = _prepare_source(input_video_path, mode or CUT_MODE)
+
+    output_filenames = [os.path.join(output_dir, f"output{str(i).zfill(3)}.mp4") for i in range(len(segments))]
+    # O smart cut copia a maior parte do vídeo sem decodificar: o lote só compensa quando tudo é reencodado
+    groups = plan_batches(segments, batch or BATCH_CUT) if mode in ("proxy", "reencode") else [[i] for i in range(len(segments))]
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_cut_group, group, segments, input_video_path, output_filenames, mode, keyframes, threads, timings, profile)
+            for group in groups
+        ]
+        # Propaga o primeiro erro; cada segmento é anunciado assim que seu grupo termina
+        for future in as_completed(futures):
+            for index, path in future.result():
+                results[index] = path
+                if on_progress:
+                    on_progress(index, path)
+    return [results[i] for i in range(len(segments))]
+
+
+class SegmentCutter:
+    """
+    Corta segmentos avulsos à medida que eles chegam (pipeline em fluxo, ver processing.py),
+    com a fonte preparada uma única vez (modo efetivo e keyframes). Cada corte roda no pool
+    próprio (até 'max_workers' ffmpeg simultâneos) e, se informado, dentro de `slot()`
+    (ex.: um slot de codificação do agendador), reservado só enquanto o ffmpeg trabalha.
+    """
+
+    def __init__(self, input_video_path: str, mode: str | None = None, max_workers: int | None = None, timings: dict | None = None,
+                 profile: EncoderProfile | None = None, slot=None):
+        self.input_video_path = input_video_path
+        self.mode, self.keyframes = _prepare_source(input_video_path, mode or CUT_MODE)
+        self.profile = profile or get_profile()
+        self.timings = timings
+        self._slot = slot or contextlib.nullcontext
+        max_workers = max(1, max_workers or CUT_MAX_WORKERS)
+        self.threads = max(1, (os.cpu_count() or 2) // max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Tempo de relógio de cada corte concluído, por arquivo de saída (ex.: para contabilizar cortes descartados)
+        self.cut_seconds = {}
+
+    def _cut(self, index: int, segment: dict, output_filename: str) -> str:
+        with self._slot():
+            started = time.time()
+            path = _cut_one(index, segment, self.input_video_path, output_filename, self.mode, self.keyframes, self.threads, self.timings, self.profile)
+            self.cut_seconds[path] = time.time() - started
+            return path
+
+    def submit(self, index: int, segment: dict, output_filename: str):
+        """Agenda o corte de `segment` em `output_filename`; retorna um Future com o caminho."""
+        return self._executor.submit(self._cut, index, segment, output_filename)
+
+    def close(self, cancel: bool = False):
+        """Espera os cortes agendados (ou, com `cancel`, descarta os que ainda não começaram)."""
+        self._executor.shutdown(wait=True, cancel_futures=cancel)
+
+
+def create_preview_assets(clip_path: str, make_proxy: bool, threads: int) -> dict:
+    """
+    Gera os arquivos leves usados pela página de ajuste para um clipe:
+    a prévia em baixa resolução (se o próprio clipe ainda não for uma), um pôster
+    (primeiro quadro útil) e uma tira de miniaturas em um único JPEG.
+    Pôster e sprite são opcionais: uma falha neles não interrompe o job.
+    """
+    base = os.path.splitext(clip_path)[0]
+    assets = {"preview": clip_path}
+    duration = probe(clip_path).duration
+    if make_proxy:
+        preview_path = f"{base}_preview.mp4"
+        cut_segment_proxy(clip_path, 0, duration, preview_path, threads)
+        assets["preview"] = preview_path
+
+    poster_path = f"{base}_poster.jpg"
+    sprite_path = f"{base}_sprite.jpg"
+    try:
+        _run(["ffmpeg", "-ss", str(min(1.0, duration / 2)), "-i", assets["preview"],
+              "-frames:v", "1", "-q:v", "4", "-y", poster_path], stage="preview")
+        assets["poster"] = poster_path
+        _run(["ffmpeg", "-i", assets["preview"],
+              "-vf", f"fps={SPRITE_TILES}/{duration:.3f},scale={SPRITE_TILE_WIDTH}:-2,tile={SPRITE_TILES}x1",
+              "-frames:v", "1", "-q:v", "5", "-y", sprite_path], stage="preview")
+        assets["sprite"] = sprite_path
+    except subprocess.CalledProcessError as e:
+        print(f"⚠️ Não foi possível gerar pôster/miniaturas de {clip_path}: {e.stderr}")
+    return assets
+
 
-    created_files = []
-    for i, segment in enumerate(viral_segments["segments"]):
-        start_time = segment["start"]
-        end_time = segment["end"]
-        output_filename = os.path.join(output_dir, f"output{str(i).zfill(3)}.mp4")
-
-        # 1️⃣ Tenta com -c copy (rápido)
-        #copy_cmd = [
-        #    "ffmpeg",
-        #    "-ss", str(start_time),  # seeking antes do input é mais preciso
-        #    "-i", input_video_path,
-        #    "-t", str(end_time - start_time),  # duração em vez de tempo final
-        #    "-c", "copy",
-        #    "-async", "1",  # ressincroniza o áudio
-        #    "-y",
-        #    output_filename,
-        #]
-
-        success = False
-        #try:
-        #    subprocess.run(copy_cmd, check=True, capture_output=True, text=True)
-        #    if is_video_valid(output_filename):
-        #        print(f"Segmento {i} cortado com sucesso (copy): {output_filename}")
-        #        success = True
-        #    else:
-        #        print(f"Segmento {i} com copy resultou inválido, tentando reencode...")
-        #except subprocess.CalledProcessError as e:
-        #    print(f"Erro ao cortar segmento {i} com copy: {e.stderr}")
-
-        # 2️⃣ Se falhar, reencode com qualidade alta
-        if not success:
-            reencode_cmd = [
-                "ffmpeg",
-                "-ss", str(start_time),
-                "-to", str(end_time),
-                "-i", input_video_path,
-                "-c:v", "libx264",
-                "-preset", "faster",
-                "-crf", "18",
-                "-c:a", "aac", "-b:a", "192k",
-                "-movflags", "+faststart",
-                "-y",
-                output_filename,
-            ]
-            try:
-                subprocess.run(reencode_cmd, check=True, capture_output=True, text=True)
-                if not is_valid_video(output_filename):
-                    raise ValueError(f"Arquivo de saída inválido: {output_filename}")
-                success = True
-            except subprocess.CalledProcessError as e:
-                print(f"ERRO ao cortar segmento {i} mesmo com reencode:\nStderr: {e.stderr}")
-                raise
-
-        if success:
-            created_files.append(output_filename)
-
-    return created_files
+def create_previews(cut_files: list, proxies_ready: bool, max_workers=None) -> list:
+    """
+    Gera (em paralelo) os arquivos de prévia de cada clipe cortado. Com `proxies_ready`
+    (cortes feitos no modo 'proxy'), os próprios clipes já servem de prévia.
+    Retorna um dicionário por clipe, na mesma ordem de `cut_files`.
+    """
+    if not cut_files:
+        return []
+    max_workers = max(1, min(max_workers or CUT_MAX_WORKERS, len(cut_files)))
+    threads = max(1, (os.cpu_count() or 2) // max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(create_preview_assets, path, not proxies_ready, threads) for path in cut_files]
+        return [future.result() for future in futures]
@@ -0,0 +1,84 @@
+import glob
+import os
+import threading
+import time
+import uuid
+
+# Mesma seleção de formatos usada antes no endpoint de upload (1080p, com fallback para 720p)
+DOWNLOAD_FORMAT = "bestvideo[height=1080][ext=mp4]+bestaudio[ext=m4a]/best[height=1080][ext=mp4]/bestvideo[height=720][ext=mp4]+bestaudio[ext=m4a]/best[height=720][ext=mp4]"
+# Intervalo mínimo entre atualizações de progresso (e checagens de cancelamento)
+PROGRESS_INTERVAL_SEC = 1.0
+
+
+class DownloadCancelled(Exception):
+    """O download foi interrompido porque o job foi cancelado."""
+
+
+# Um lock por arquivo de destino: dois jobs do mesmo vídeo não baixam em paralelo,
+# o segundo espera e reaproveita o arquivo do primeiro.
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+def _lock_for(path: str) -> threading.Lock:
+    with _path_locks_guard:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def download(video_url: str, output_path: str, on_progress=None, should_cancel=None) -> str:
+    """
+    Baixa o vídeo com yt-dlp para `output_path`, reaproveitando o arquivo se ele já existir.
+    O download é feito em um arquivo temporário e renomeado ao final, então um arquivo em
+    `output_path` está sempre completo.
+
+    `on_progress(dict)` recebe bytes baixados/total, velocidade e ETA (no máximo uma vez por
+    PROGRESS_INTERVAL_SEC); se `should_cancel()` retornar True, o download é interrompido
+    com DownloadCancelled.
+    """
+    with _lock_for(output_path):
+        if os.path.exists(output_path):
+            print(f"Vídeo já baixado anteriormente, reutilizando: {output_path}")
+            return output_path
+
+        import yt_dlp
+
+        base, extension = os.path.splitext(output_path)
+        temp_base = f"{base}.downloading-{uuid.uuid4().hex[:8]}"
+        last_report = [0.0]
+
+        def progress_hook(status: dict):
+            now = time.monotonic()
+            if status.get("status") == "downloading" and now - last_report[0] < PROGRESS_INTERVAL_SEC:
+                return
+            last_report[0] = now
+            if should_cancel and should_cancel():
+                raise yt_dlp.utils.DownloadCancelled("Download cancelado pelo usuário.")
+            if on_progress:
+                on_progress({
+                    "status": status.get("status"),
+                    "downloaded_bytes": status.get("downloaded_bytes"),
+                    "total_bytes": status.get("total_bytes") or status.get("total_bytes_estimate"),
+                    "speed": status.get("speed"),
+                    "eta": status.get("eta"),
+                })
+
+        ydl_opts = {
+            "format": DOWNLOAD_FORMAT,
+            "outtmpl": f"{temp_base}{extension}",
+            "noplaylist": True,
+            "progress_hooks": [progress_hook],
+            "quiet": True,
+            "noprogress": True,
+        }
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                ydl.download([video_url])
+            os.replace(f"{temp_base}{extension}", output_path)
+        except yt_dlp.utils.DownloadCancelled as e:
+            raise DownloadCancelled(str(e)) from e
+        finally:
+            # Remove fragmentos e formatos parciais deixados pelo yt-dlp
+            for leftover in glob.glob(f"{glob.escape(temp_base)}*"):
+                os.remove(leftover)
+        print(f"Download concluído: {output_path}")
+        return output_path
@@ -1,171 +1,190 @@
-import cv2
+import multiprocessing
 import subprocess
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from . import metrics
+from .encoder_profiles import EncoderProfile, get_profile
+from .media_probe import probe
 from .pycaps_processing import process_with_pycaps
 
-def get_video_fps(video_path: str) -> str | None:
+# Clipes renderizados em paralelo (cada um em um processo próprio: FFmpeg + PyCaps)
+RENDER_MAX_WORKERS = int(os.environ.get('VC_RENDER_MAX_WORKERS', max(1, min(4, (os.cpu_count() or 2) // 2))))
+
+def render_clip(video_path: str, data: dict, pycaps_template: str, workspace_dir: str, threads: int = 0, profile: EncoderProfile | None = None) -> tuple:
     """
-    Usa ffprobe para detectar o framerate de um vídeo e o retorna como uma fração (string).
-    Retorna None se a detecção falhar.
+    Renderiza um único clipe: TELA DIVIDIDA + TÍTULO com FFmpeg (vídeo intermediário)
+    e legendas com PyCaps. Roda em um processo do pool de `edit`; `threads` limita o
+    FFmpeg (0 = automático) e `profile` define o codificador (perfil padrão se omitido). Retorna (caminho final, tempos das etapas 'render_ffmpeg' e
+    'pycaps') e lança exceção em caso de falha.
+
+    Se o clipe tiver 'source', 'start' e 'end' (modo proxy), o reenquadramento é feito
+    direto sobre o vídeo original, sem passar pelo clipe de prévia.
     """
+    output_dir = os.path.join(workspace_dir, 'burned_sub')
+    profile = profile or get_profile()
+    # O registro de métricas deste processo se perde com ele: os tempos voltam no retorno
+    timings = {}
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Arquivo de vídeo não encontrado: {video_path}")
+
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    title_text = data.get('title', '')
+
+    # No modo proxy, o clipe em video_path é apenas uma prévia em baixa resolução:
+    # a renderização lê direto do vídeo original, no intervalo do segmento.
+    source_path = data.get('source')
+    render_from_source = bool(source_path) and os.path.exists(source_path)
+    render_input = source_path if render_from_source else video_path
+    if render_from_source:
+        input_args = ['-ss', str(data['start']), '-to', str(data['end']), '-i', source_path]
+    else:
+        input_args = ['-i', video_path]  # Removido '-c:v', 'libdav1d',
+    
+    # --- FRAMERATE E DIMENSÕES (uma única leitura do ffprobe, memorizada) ---
+    print(f"🔎 Lendo metadados de: {render_input}...")
+    media = probe(render_input)
+    framerate = media.fps
+    
+    if not framerate: 
+        raise ValueError(f"Não foi possível determinar o FPS do vídeo: {video_path}")
+    print(f"✅ FPS detectado: {framerate} ({media.width}x{media.height})")
+
+    # --- PREPARAÇÃO DO FILTRO DE TÍTULO ---
+    escaped_title = (
+        title_text.replace("'", "\\'")
+                  .replace(":", "\\:")
+                  .replace(",", "\\,")
+    )
+    font_path = '/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf'
+    title_filter = (
+        f"drawtext=fontfile='{font_path}':text='{escaped_title}':"
+        "fontcolor=white:fontsize=60:box=1:boxcolor=black@0.5:boxborderw=10:"
+        "x=(w-text_w)/2:y=50"
+    )
+
+    # --- DIMENSÕES / ROIs ---
+    frame_width = media.width
+    frame_height = media.height
+
+    roi1 = data['roi1']
+    roi2 = data['roi2']
+
+    roi1_px = {
+        'x': int(frame_width * roi1['x'] / 100),
+        'y': int(frame_height * roi1['y'] / 100),
+        'w': int(frame_width * roi1['w'] / 100),
+        'h': int(frame_height * roi1['h'] / 100)
+    }
+    roi2_px = {
+        'x': int(frame_width * roi2['x'] / 100),
+        'y': int(frame_height * roi2['y'] / 100),
+        'w': int(frame_width * roi2['w'] / 100),
+        'h': int(frame_height * roi2['h'] / 100)
+    }
+
+    final_w = 1080
+    final_h_half = 960
+
+    filter_roi1 = (
+        f"crop={roi1_px['w']}:{roi1_px['h']}:{roi1_px['x']}:{roi1_px['y']},"
+        f"scale={final_w}:{final_h_half}"
+    )
+    filter_roi2 = (
+        f"crop={roi2_px['w']}:{roi2_px['h']}:{roi2_px['x']}:{roi2_px['y']},"
+        f"scale={final_w}:{final_h_half}"
+    )
+
+    # --- NOVO FILTER_COMPLEX COM RESET DE TIMESTAMPS ---
+    filter_complex_string = (
+        # Reset timestamps e primeira transformação
+        f"[0:v]setpts=PTS-STARTPTS,{filter_roi1}[top];"
+        # Reset timestamps e segunda transformação
+        f"[0:v]setpts=PTS-STARTPTS,{filter_roi2}[bottom];"
+        # Combina as duas partes
+        f"[top][bottom]vstack=inputs=2[stacked];"
+        # Adiciona o título
+        f"[stacked]{title_filter}{profile.filter_suffix()}[video_out];"
+        # Reset timestamp do áudio separadamente
+        f"[0:a]asetpts=PTS-STARTPTS[audio_out]"
+    )
+
+    # --- Saída intermediária sem legendas ---
+    intermediate_path = os.path.join(output_dir, f"{base_name}_no_subs.mp4")
+    final_output_path = os.path.join(output_dir, f"{base_name}_final.mp4")
+    trasncription_output_path = os.path.join(workspace_dir, f"{base_name}.tsv")
+    
+    # Renderizando da fonte, o intermediário é um mezanino (qualidade alta, preset rápido):
+    # o PyCaps reencoda de qualquer forma, e essa é a única compressão "final".
+    video_args = profile.video_args('mezzanine' if render_from_source else 'render', threads)
     command = [
-        'ffprobe',
-        '-v', 'error',          # Não exibe o banner, apenas erros
-        '-select_streams', 'v:0', # Seleciona apenas o primeiro stream de vídeo
-        '-show_entries', 'stream=r_frame_rate', # Pede para mostrar apenas a entrada do framerate
-        '-of', 'default=noprint_wrappers=1:nokey=1' # Formato de saída: apenas o valor, sem a chave "r_frame_rate="
+        'ffmpeg', *profile.input_args(), *input_args,
+        '-filter_complex', filter_complex_string,
+        '-map', '[video_out]',
+        '-map', '[audio_out]',
+        *video_args,
+        '-g', '30', '-keyint_min', '30',
+        '-r', framerate, 
+        '-vsync', 'cfr',     
+        '-c:a', 'aac', '-b:a', '192k',
+        '-movflags', '+faststart',
+        '-y', intermediate_path
     ]
-    
-    # Adiciona o caminho do vídeo ao final do comando
-    command.append(video_path)
 
+    print(f"🎬 Gerando versão SEM legendas: {intermediate_path} ...")
     try:
-        # Executa o comando e captura a saída
-        result = subprocess.run(
-            command,
-            check=True,
-            capture_output=True,
-            text=True,
-            encoding='utf-8'
-        )
-        # A saída é a fração do FPS, ex: "30/1" ou "30000/1001".
-        # .strip() remove quebras de linha ou espaços em branco.
-        fps_fraction = result.stdout.strip()
-        
-        if not fps_fraction:
-            print(f"⚠️ FFprobe não retornou um FPS para o vídeo: {video_path}")
-            return None
-            
-        return fps_fraction
-        
-    except FileNotFoundError:
-        print("❌ Erro: 'ffprobe' não foi encontrado. Certifique-se de que o FFmpeg está instalado e no PATH do sistema.")
-        return None
+        metrics.run(command, "render_ffmpeg", check=True, capture_output=True, text=True, encoding='utf-8', timings=timings)
     except subprocess.CalledProcessError as e:
-        print(f"❌ Erro ao executar ffprobe no arquivo {video_path}: {e.stderr}")
-        return None
-    except Exception as e:
-        print(f"❌ Ocorreu um erro inesperado ao obter o FPS: {e}")
-        return None
+        print(f"❌ Erro no FFmpeg: {e.stderr}")
+        raise
+    
+    # --- Chama o script de legendas ---
+    with metrics.timed("pycaps", timings):
+        process_with_pycaps(intermediate_path, final_output_path, trasncription_output_path, pycaps_template)
+    return (final_output_path if os.path.exists(final_output_path) else intermediate_path), timings
 
 
-def edit(clips_data: dict, pycaps_template: str):
+def edit(clips_data: dict, pycaps_template: str, workspace_dir: str = 'tmp', max_workers: int | None = None, on_progress=None, profile: EncoderProfile | None = None) -> dict:
     """
     Mantém a edição de TELA DIVIDIDA + TÍTULO com FFmpeg (gera vídeo intermediário),
     e então usa PyCaps (TemplateLoader('hype')) para gerar/queimar legendas automaticamente.
-    Saída final: burned_sub/{base_name}_final.mp4
+    Saída final: {workspace_dir}/burned_sub/{base_name}_final.mp4
+
+    Os clipes são renderizados em paralelo em um pool de processos (até 'max_workers'),
+    dividindo as threads do FFmpeg entre eles. A falha de um clipe não interrompe os demais:
+    o retorno mapeia cada caminho para {"status": "done", "output": ..., "timings": ...} ou
+    {"status": "error", "error": ...}, e `on_progress(video_path, resultado)` é chamado
+    a cada clipe concluído. `profile` é o perfil de codificação (ver encoder_profiles.py).
     """
     print("Iniciando processo de TELA DIVIDIDA + TÍTULOS (FFmpeg) e LEGENDAS (PyCaps)...")
 
-    output_dir = 'burned_sub'
+    output_dir = os.path.join(workspace_dir, 'burned_sub')
     os.makedirs(output_dir, exist_ok=True)
-
-    for video_path, data in clips_data.items():
-        if not os.path.exists(video_path):
-            print(f"⚠️ Arquivo de vídeo não encontrado, pulando: {video_path}")
-            continue
-
-        base_name = os.path.splitext(os.path.basename(video_path))[0]
-        title_text = data.get('title', '')
-        
-        # --- DETECÇÃO AUTOMÁTICA DO FRAMERATE ---
-        print(f"🔎 Detectando FPS para: {video_path}...")
-        framerate = get_video_fps(video_path)
-        
-        # Se a detecção falhar, pula para o próximo vídeo
-        if not framerate: 
-            print(f"❌ Não foi possível determinar o FPS. Pulando o vídeo: {video_path}")
-            continue
-        print(f"✅ FPS detectado: {framerate}")
-
-        # --- PREPARAÇÃO DO FILTRO DE TÍTULO ---
-        escaped_title = (
-            title_text.replace("'", "\\'")
-                      .replace(":", "\\:")
-                      .replace(",", "\\,")
-        )
-        font_path = '/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf'
-        title_filter = (
-            f"drawtext=fontfile='{font_path}':text='{escaped_title}':"
-            "fontcolor=white:fontsize=60:box=1:boxcolor=black@0.5:boxborderw=10:"
-            "x=(w-text_w)/2:y=50"
-        )
-
-        # --- DIMENSÕES / ROIs ---
-        cap = cv2.VideoCapture(video_path)
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        cap.release()
-
-        roi1 = data['roi1']
-        roi2 = data['roi2']
-
-        roi1_px = {
-            'x': int(frame_width * roi1['x'] / 100),
-            'y': int(frame_height * roi1['y'] / 100),
-            'w': int(frame_width * roi1['w'] / 100),
-            'h': int(frame_height * roi1['h'] / 100)
+    if not clips_data:
+        return {}
+
+    max_workers = max(1, min(max_workers or RENDER_MAX_WORKERS, len(clips_data)))
+    threads = max(1, (os.cpu_count() or 2) // max_workers)
+    # Resolvido aqui (inclusive a checagem do VAAPI) e enviado pronto aos processos do pool
+    profile = profile or get_profile()
+    results = {}
+    # 'spawn': o pool é criado a partir de threads do agendador, onde fork não é seguro
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {
+            executor.submit(render_clip, video_path, data, pycaps_template, workspace_dir, threads, profile): video_path
+            for video_path, data in clips_data.items()
         }
-        roi2_px = {
-            'x': int(frame_width * roi2['x'] / 100),
-            'y': int(frame_height * roi2['y'] / 100),
-            'w': int(frame_width * roi2['w'] / 100),
-            'h': int(frame_height * roi2['h'] / 100)
-        }
-
-        final_w = 1080
-        final_h_half = 960
-
-        filter_roi1 = (
-            f"crop={roi1_px['w']}:{roi1_px['h']}:{roi1_px['x']}:{roi1_px['y']},"
-            f"scale={final_w}:{final_h_half}"
-        )
-        filter_roi2 = (
-            f"crop={roi2_px['w']}:{roi2_px['h']}:{roi2_px['x']}:{roi2_px['y']},"
-            f"scale={final_w}:{final_h_half}"
-        )
-
-        # --- NOVO FILTER_COMPLEX COM RESET DE TIMESTAMPS ---
-        filter_complex_string = (
-            # Reset timestamps e primeira transformação
-            f"[0:v]setpts=PTS-STARTPTS,{filter_roi1}[top];"
-            # Reset timestamps e segunda transformação
-            f"[0:v]setpts=PTS-STARTPTS,{filter_roi2}[bottom];"
-            # Combina as duas partes
-            f"[top][bottom]vstack=inputs=2[stacked];"
-            # Adiciona o título
-            f"[stacked]{title_filter}[video_out];"
-            # Reset timestamp do áudio separadamente
-            f"[0:a]asetpts=PTS-STARTPTS[audio_out]"
-        )
-
-        # --- Saída intermediária sem legendas ---
-        intermediate_path = os.path.join(output_dir, f"{base_name}_no_subs.mp4")
-        final_output_path = os.path.join(output_dir, f"{base_name}_final.mp4")
-        trasncription_output_path = os.path.join('tmp', f"{base_name}.tsv")
-        
-        command = [
-            'ffmpeg', '-i', video_path,  # Removido '-c:v', 'libdav1d',
-            '-filter_complex', filter_complex_string,
-            '-map', '[video_out]',
-            '-map', '[audio_out]',
-            '-c:v', 'libx264', '-preset', 'slow', '-crf', '18',
-            '-g', '30', '-keyint_min', '30',
-            '-r', framerate, 
-            '-vsync', 'cfr',     
-            '-c:a', 'aac', '-b:a', '192k',
-            '-movflags', '+faststart',
-            '-y', intermediate_path
-        ]
-
-        print(f"🎬 Gerando versão SEM legendas: {intermediate_path} ...")
-        try:
-            subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8')
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Erro no FFmpeg: {e.stderr}")
-            raise
-        
-        # --- Chama o script de legendas ---
-        process_with_pycaps(intermediate_path, final_output_path, trasncription_output_path, pycaps_template)
+        for future in as_completed(futures):
+            video_path = futures[future]
+            try:
+                output, timings = future.result()
+                metrics.record_timings(timings)
+                results[video_path] = {"status": "done", "output": output, "timings": timings}
+                print(f"✅ Clipe renderizado: {video_path}")
+            except Exception as e:
+                results[video_path] = {"status": "error", "error": str(e)}
+                print(f"❌ Falha ao renderizar o clipe {video_path}: {e}")
+            if on_progress:
+                on_progress(video_path, results[video_path])
 
     print("Todos os vídeos processados.")
+    return results
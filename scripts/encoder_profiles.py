@@ -0,0 +1,108 @@
+import json
+import os
+import subprocess
+from dataclasses import dataclass, fields, replace
+from functools import lru_cache
+
+# Perfil usado quando o job não escolhe um
+DEFAULT_PROFILE = os.environ.get('VC_ENCODER_PROFILE', 'standard')
+# Codificação por hardware (Intel VAAPI, driver instalado no Dockerfile); sem o dispositivo, volta para o x264
+USE_VAAPI = os.environ.get('VC_VAAPI', '0') == '1'
+VAAPI_DEVICE = os.environ.get('VC_VAAPI_DEVICE', '/dev/dri/renderD128')
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    """
+    Parâmetros de codificação H.264 de um perfil, por papel:
+    - cut: clipes cortados em qualidade final (VC_PIPELINE_MODE=full) e bordas do smart cut;
+    - render: vídeo renderizado a partir do clipe cortado;
+    - mezzanine: vídeo renderizado direto do original (modo proxy), entregue ao PyCaps.
+    `threads` = 0 divide os núcleos entre os processos do FFmpeg automaticamente.
+    """
+
+    name: str
+    label: str
+    cut_preset: str
+    cut_crf: int
+    render_preset: str
+    render_crf: int
+    mezzanine_preset: str
+    mezzanine_crf: int
+    threads: int = 0
+    vaapi: bool = False
+
+    def input_args(self) -> list:
+        """Argumentos que vêm antes das entradas do FFmpeg (inicialização do dispositivo VAAPI)."""
+        return ['-vaapi_device', VAAPI_DEVICE] if self.vaapi else []
+
+    def filter_suffix(self) -> str:
+        """Sufixo da cadeia de filtros de vídeo: com VAAPI, os quadros são enviados à GPU no fim."""
+        return ',format=nv12,hwupload' if self.vaapi else ''
+
+    def video_args(self, role: str, threads: int, software: bool = False) -> list:
+        """Codec e qualidade do papel ('cut', 'render' ou 'mezzanine'); `software` força o x264."""
+        preset, crf = getattr(self, f"{role}_preset"), getattr(self, f"{role}_crf")
+        if self.vaapi and not software:
+            return ['-c:v', 'h264_vaapi', '-qp', str(crf)]
+        return ['-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-threads', str(self.threads or threads)]
+
+
+_BUILTIN_PROFILES = (
+    # Rascunho: presets rápidos, ~3-5x mais rápido que o padrão na renderização, para jobs em lote
+    EncoderProfile('draft', 'Rascunho (rápido)', 'veryfast', 23, 'veryfast', 23, 'ultrafast', 16),
+    # Padrão: os mesmos parâmetros usados antes dos perfis
+    EncoderProfile('standard', 'Padrão', 'faster', 18, 'slow', 18, 'veryfast', 14),
+    # Arquivo: máxima qualidade, bem mais lento
+    EncoderProfile('archival', 'Arquivo (máxima qualidade)', 'slow', 16, 'slower', 16, 'medium', 12),
+)
+
+
+def _load_profiles() -> dict:
+    """
+    Perfis embutidos, com ajustes opcionais em VC_ENCODER_PROFILES (JSON), ex.:
+    {"draft": {"render_crf": 26, "threads": 2}, "standard": {"vaapi": true}}.
+    """
+    profiles = {profile.name: replace(profile, vaapi=USE_VAAPI) for profile in _BUILTIN_PROFILES}
+    overrides = json.loads(os.environ.get('VC_ENCODER_PROFILES') or '{}')
+    allowed = {f.name for f in fields(EncoderProfile)} - {'name'}
+    for name, values in overrides.items():
+        unknown = set(values) - allowed
+        if unknown:
+            raise ValueError(f"Campos desconhecidos no perfil de codificação '{name}': {sorted(unknown)}")
+        base = profiles.get(name) or replace(profiles['standard'], name=name, label=name)
+        profiles[name] = replace(base, **values)
+    return profiles
+
+
+PROFILES = _load_profiles()
+
+
+@lru_cache(maxsize=None)
+def vaapi_available(device: str = VAAPI_DEVICE) -> bool:
+    """Verifica (uma vez por processo) se o FFmpeg consegue codificar H.264 via VAAPI no dispositivo."""
+    if not os.path.exists(device):
+        return False
+    try:
+        subprocess.run([
+            'ffmpeg', '-v', 'error', '-vaapi_device', device,
+            '-f', 'lavfi', '-i', 'testsrc=size=256x144:rate=1:duration=1',
+            '-vf', 'format=nv12,hwupload', '-c:v', 'h264_vaapi', '-frames:v', '1', '-f', 'null', '-',
+        ], check=True, capture_output=True, timeout=30)
+        return True
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+def get_profile(name: str | None = None) -> EncoderProfile:
+    """
+    Retorna o perfil pelo nome (ou o padrão). Se ele pede VAAPI e o dispositivo não está
+    utilizável, devolve o mesmo perfil com codificação por software.
+    """
+    profile = PROFILES.get(name or DEFAULT_PROFILE)
+    if profile is None:
+        raise ValueError(f"Perfil de codificação desconhecido: {name}")
+    if profile.vaapi and not vaapi_available():
+        print(f"⚠️ VAAPI indisponível em {VAAPI_DEVICE}; perfil '{profile.name}' usando x264.")
+        profile = replace(profile, vaapi=False)
+    return profile
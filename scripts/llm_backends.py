@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from .content_cache import CACHE, make_key
+
+LLM_CACHE_TTL_SEC = float(os.environ.get('VC_LLM_CACHE_TTL_SEC', 30 * 24 * 3600))
+
+
+class LLMBackend(ABC):
+    """
+    Interface dos backends de LLM usados na descoberta de segmentos.
+    `name` identifica o modelo e faz parte da chave do cache de respostas.
+    """
+
+    name = "llm"
+
+    @abstractmethod
+    def complete(self, prompt: str, timeout: float) -> str:
+        """Envia o prompt e retorna o texto bruto da resposta."""
+
+    def invalidate(self, prompt: str):
+        """Descarta uma resposta memorizada que se mostrou inválida (no-op por padrão)."""
+
+
+class G4FBackend(LLMBackend):
+    """Backend padrão, usando o g4f (importado sob demanda)."""
+
+    def __init__(self, model_name: str = "gpt_4"):
+        self.model_name = model_name
+        self.name = f"g4f:{model_name}"
+
+    def complete(self, prompt: str, timeout: float) -> str:
+        import g4f
+        return g4f.ChatCompletion.create(
+            model=getattr(g4f.models, self.model_name),
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout,
+        )
+
+
+class StubBackend(LLMBackend):
+    """
+    Backend offline para testes e benchmarks. Se `fixture_path` apontar para um JSON,
+    ele é devolvido como resposta; caso contrário, gera segmentos sintéticos
+    determinísticos (mesmo prompt -> mesma resposta) dentro do trecho do prompt.
+    """
+
+    name = "stub"
+
+    def __init__(self, fixture_path: str | None = None, latency_sec: float = 0.0):
+        self.fixture_path = fixture_path
+        self.latency_sec = latency_sec
+
+    def complete(self, prompt: str, timeout: float) -> str:
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+        if self.fixture_path:
+            with open(self.fixture_path, 'r', encoding='utf-8') as f:
+                return f.read()
+
+        offset = _first_float(r"begins approximately at the second ([\d.]+)", prompt, 0.0)
+        tempo_minimo = _first_float(r"between ([\d.]+) and", prompt, 40.0)
+        tempo_maximo = _first_float(r"and ([\d.]+) seconds", prompt, 120.0)
+        rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+        segments = []
+        for i in range(3):
+            start = round(offset + rng.uniform(0, 400), 2)
+            segments.append({
+                "start": start,
+                "end": round(start + rng.uniform(tempo_minimo, tempo_maximo), 2),
+                "title": f"Segmento sintético {i + 1}",
+                "description": "Resposta gerada pelo backend stub.",
+                "score": rng.randint(0, 100),
+                "keywords": ["stub", "teste"],
+            })
+        return json.dumps({"segments": segments}, ensure_ascii=False)
+
+
+def _first_float(pattern: str, text: str, default: float) -> float:
+    match = re.search(pattern, text)
+    return float(match.group(1)) if match else default
+
+
+class CachedBackend(LLMBackend):
+    """
+    Memoiza as respostas de outro backend em disco (namespace 'llm' do ContentCache),
+    com chave derivada do prompt completo e do modelo. Entradas mais antigas que
+    `ttl_sec` são ignoradas; o limite de tamanho é o do próprio ContentCache.
+    """
+
+    def __init__(self, backend: LLMBackend, ttl_sec: float = LLM_CACHE_TTL_SEC, cache=CACHE):
+        self.backend = backend
+        self.ttl_sec = ttl_sec
+        self.cache = cache
+        self.name = backend.name
+
+    def _key(self, prompt: str) -> str:
+        return make_key(self.backend.name, prompt)
+
+    def complete(self, prompt: str, timeout: float) -> str:
+        key = self._key(prompt)
+        cached = self.cache.get_json('llm', key)
+        if cached is not None and time.time() - cached.get('created_at', 0) < self.ttl_sec:
+            return cached['response']
+        response = self.backend.complete(prompt, timeout)
+        self.cache.put_json('llm', key, {"created_at": time.time(), "model": self.backend.name, "response": response})
+        return response
+
+    def invalidate(self, prompt: str):
+        self.cache.invalidate('llm', self._key(prompt))
+
+
+def get_backend(name: str | None = None) -> LLMBackend:
+    """
+    Cria o backend configurado em VC_LLM_BACKEND ('g4f' ou 'stub'), envolvido pelo
+    cache de respostas, a menos que VC_LLM_CACHE=0.
+    """
+    name = name or os.environ.get('VC_LLM_BACKEND', 'g4f')
+    if name == 'g4f':
+        backend = G4FBackend(os.environ.get('VC_LLM_MODEL', 'gpt_4'))
+    elif name == 'stub':
+        backend = StubBackend(os.environ.get('VC_LLM_FIXTURE'))
+    else:
+        raise ValueError(f"Backend de LLM desconhecido: {name}")
+    if os.environ.get('VC_LLM_CACHE', '1') == '0':
+        return backend
+    return CachedBackend(backend)
@@ -0,0 +1,172 @@
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from fractions import Fraction
+from . import metrics
+
+# Quantas mídias diferentes ficam memorizadas por processo
+PROBE_CACHE_SIZE = 512
+
+
+class MediaProbeError(Exception):
+    """O ffprobe não conseguiu ler o arquivo (inexistente, corrompido ou sem FFmpeg instalado)."""
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """Metadados de um arquivo de mídia, extraídos de uma única chamada ao ffprobe."""
+
+    path: str
+    duration: float
+    format_name: str
+    width: int = 0
+    height: int = 0
+    fps: str | None = None  # fração exata, ex.: "30000/1001" (formato aceito por '-r' do FFmpeg)
+    video_codec: str | None = None
+    audio_codec: str | None = None
+    audio_sample_rate: int = 0
+    streams: tuple = field(default=(), repr=False)
+
+    @property
+    def has_video(self) -> bool:
+        return self.video_codec is not None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_codec is not None
+
+    @property
+    def video_stream(self) -> dict:
+        """Campos do ffprobe do stream de vídeo principal (perfil, nível, pix_fmt, time_base...); vazio se não houver."""
+        return next((s for s in self.streams if s.get("codec_type") == "video" and not s.get("disposition", {}).get("attached_pic")), {})
+
+    @property
+    def fps_value(self) -> float:
+        return float(Fraction(self.fps)) if self.fps else 0.0
+
+
+class _Memo:
+    """LRU pequeno, thread-safe, cuja chave inclui mtime e tamanho: arquivos regravados são relidos."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path: str):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_INFO_MEMO = _Memo(PROBE_CACHE_SIZE)
+_KEYFRAMES_MEMO = _Memo(PROBE_CACHE_SIZE)
+
+
+def _ffprobe(args: list, path: str) -> str:
+    try:
+        result = metrics.run(["ffprobe", "-v", "error", *args, path], "ffprobe", capture_output=True, text=True, check=True)
+    except FileNotFoundError:
+        raise MediaProbeError("'ffprobe' não foi encontrado. Certifique-se de que o FFmpeg está instalado e no PATH do sistema.")
+    except subprocess.CalledProcessError as e:
+        raise MediaProbeError(f"Erro ao executar ffprobe no arquivo {path}: {e.stderr.strip()}")
+    return result.stdout
+
+
+def _parse(path: str, data: dict) -> MediaInfo:
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video" and not s.get("disposition", {}).get("attached_pic")), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    fmt = data.get("format", {})
+
+    fps = None
+    if video:
+        for candidate in (video.get("r_frame_rate"), video.get("avg_frame_rate")):
+            if candidate and candidate not in ("0/0", "0/1"):
+                fps = candidate
+                break
+
+    duration = fmt.get("duration") or (video or audio or {}).get("duration") or 0
+    return MediaInfo(
+        path=path,
+        duration=float(duration),
+        format_name=fmt.get("format_name", ""),
+        width=int(video.get("width", 0)) if video else 0,
+        height=int(video.get("height", 0)) if video else 0,
+        fps=fps,
+        video_codec=video.get("codec_name") if video else None,
+        audio_codec=audio.get("codec_name") if audio else None,
+        audio_sample_rate=int(audio.get("sample_rate", 0)) if audio else 0,
+        streams=tuple(streams),
+    )
+
+
+def probe(path: str) -> MediaInfo:
+    """
+    Retorna os metadados do arquivo (`ffprobe -show_streams -show_format`, em JSON).
+    O resultado fica memorizado por caminho + mtime + tamanho, então cada arquivo é
+    lido uma única vez por processo. Lança MediaProbeError se o arquivo não puder ser lido.
+    """
+    try:
+        key = _Memo.key(path)
+    except FileNotFoundError:
+        raise MediaProbeError(f"Arquivo não encontrado: {path}")
+    info = _INFO_MEMO.get(key)
+    if info is None:
+        output = _ffprobe(["-show_streams", "-show_format", "-of", "json"], path)
+        info = _parse(path, json.loads(output or "{}"))
+        _INFO_MEMO.put(key, info)
+    return info
+
+
+def probe_keyframes(path: str) -> list:
+    """
+    Timestamps dos keyframes do primeiro stream de vídeo, lidos apenas dos pacotes
+    (flag 'K'), sem decodificar nenhum frame. Também memorizado; só é calculado sob demanda.
+    """
+    key = _Memo.key(path)
+    keyframes = _KEYFRAMES_MEMO.get(key)
+    if keyframes is None:
+        output = _ffprobe(["-select_streams", "v:0", "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0"], path)
+        keyframes = []
+        for line in output.splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags and pts_time not in ('', 'N/A'):
+                keyframes.append(float(pts_time))
+        keyframes.sort()
+        _KEYFRAMES_MEMO.put(key, keyframes)
+    return list(keyframes)
+
+
+def is_valid_video(path: str) -> bool:
+    """Verifica se o arquivo pode ser lido e contém um stream de vídeo."""
+    try:
+        return probe(path).has_video
+    except MediaProbeError:
+        return False
+
+
+def clear_cache():
+    _INFO_MEMO.clear()
+    _KEYFRAMES_MEMO.clear()
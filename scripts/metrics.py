@@ -0,0 +1,208 @@
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites dos histogramas de duração (segundos): de chamadas rápidas ao ffprobe até transcrições longas
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in sorted(labels.items()):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class MetricsRegistry:
+    """
+    Registro mínimo de métricas (contadores, histogramas e séries calculadas na hora),
+    exportado no formato de texto do Prometheus em /metrics. Cada processo tem o seu;
+    os processos de renderização devolvem seus tempos ao processo principal (ver `record_timings`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}    # name -> {labels_tuple: value}
+        self._histograms = {}  # name -> {labels_tuple: [bucket_counts, sum, count]}
+        self._collectors = {}  # name -> callable que retorna {labels_tuple: value} ou um número
+
+    def counter(self, name: str, help_text: str):
+        self._help[name] = (help_text, "counter")
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str):
+        self._help[name] = (help_text, "histogram")
+        self._histograms.setdefault(name, {})
+
+    def collector(self, name: str, help_text: str, fn, kind: str = "gauge"):
+        """Série lida de outro componente (agendador, cache, store) a cada exportação."""
+        self._help[name] = (help_text, kind)
+        self._collectors[name] = fn
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.setdefault(key, [[0] * len(DURATION_BUCKETS), 0.0, 0])
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> str:
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {key: (list(s[0]), s[1], s[2]) for key, s in series.items()} for name, series in self._histograms.items()}
+        for name, series in counters.items():
+            lines += self._header(name)
+            lines += [f"{name}{_format_labels(dict(key))} {value}" for key, value in series.items()]
+        for name, series in histograms.items():
+            lines += self._header(name)
+            for key, (buckets, total, count) in series.items():
+                labels = dict(key)
+                for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {bucket_count}")
+                lines.append(f"{name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for name, fn in self._collectors.items():
+            try:
+                values = fn()
+            except Exception as e:
+                print(f"⚠️ Falha ao calcular a métrica {name}: {e}")
+                continue
+            lines += self._header(name)
+            if isinstance(values, dict):
+                lines += [f"{name}{_format_labels(dict(key))} {value}" for key, value in values.items()]
+            else:
+                lines.append(f"{name} {values}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, name: str) -> list:
+        help_text, kind = self._help.get(name, ("", "untyped"))
+        return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+METRICS = MetricsRegistry()
+METRICS.histogram("vc_stage_duration_seconds", "Duração (wall time) de cada etapa do pipeline.")
+METRICS.counter("vc_subprocesses_total", "Subprocessos (ffmpeg/ffprobe/whisperx) executados, por etapa.")
+METRICS.counter("vc_subprocess_wall_seconds_total", "Tempo de relógio gasto em subprocessos, por etapa.")
+METRICS.counter("vc_subprocess_cpu_seconds_total", "Tempo de CPU (usuário + sistema) consumido por subprocessos, por etapa.")
+
+
+# Os dicionários de tempos de um job são atualizados por várias threads (cortes, chamadas ao LLM)
+_timings_lock = threading.Lock()
+
+
+def add_timing(timings: dict | None, stage: str, wall_sec: float, cpu_sec: float = 0.0, count: int = 1):
+    """Acumula uma medição em um dicionário de tempos {etapa: {count, wall_sec, cpu_sec}} (ex.: o do job)."""
+    if timings is None:
+        return
+    with _timings_lock:
+        entry = timings.setdefault(stage, {"count": 0, "wall_sec": 0.0, "cpu_sec": 0.0})
+        entry["count"] += count
+        entry["wall_sec"] = round(entry["wall_sec"] + wall_sec, 3)
+        entry["cpu_sec"] = round(entry["cpu_sec"] + cpu_sec, 3)
+
+
+def merge_timings(timings: dict | None, other: dict):
+    """Soma em `timings` os tempos de outro dicionário do mesmo formato."""
+    for stage, entry in other.items():
+        add_timing(timings, stage, entry["wall_sec"], entry["cpu_sec"], count=entry["count"])
+
+
+def record_timings(timings: dict):
+    """
+    Registra neste processo tempos medidos em outro (ex.: um processo do pool de renderização,
+    cujo registro se perde quando ele termina). Entradas com CPU vêm de subprocessos.
+    """
+    for stage, entry in timings.items():
+        count = entry["count"]
+        for _ in range(count):
+            METRICS.observe("vc_stage_duration_seconds", entry["wall_sec"] / count, stage=stage)
+        if entry["cpu_sec"]:
+            METRICS.inc("vc_subprocesses_total", count, stage=stage)
+            METRICS.inc("vc_subprocess_wall_seconds_total", entry["wall_sec"], stage=stage)
+            METRICS.inc("vc_subprocess_cpu_seconds_total", entry["cpu_sec"], stage=stage)
+
+
+@contextmanager
+def timed(stage: str, timings: dict | None = None):
+    """Mede o wall time do bloco, registra no histograma da etapa e, se informado, em `timings`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        METRICS.observe("vc_stage_duration_seconds", elapsed, stage=stage)
+        add_timing(timings, stage, elapsed)
+
+
+def _read_stream(stream, outputs: dict, name: str):
+    outputs[name] = stream.read()
+    stream.close()
+
+
+def _wait_with_rusage(process: subprocess.Popen):
+    """
+    Colhe o filho com os.wait4 (API pública), guardando o código de saída em `returncode`
+    (o wait() do Popen passa a retornar direto) e devolvendo o uso de recursos (CPU) exato
+    daquele processo, sem somar outros filhos que rodam em paralelo.
+    """
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return rusage
+
+
+def run(command, stage: str, check: bool = False, timings: dict | None = None, **kwargs) -> subprocess.CompletedProcess:
+    """
+    Equivalente a subprocess.run(command, check=..., **kwargs) (sem `input`) que mede o wall
+    time e o tempo de CPU do subprocesso (via wait4, sem somar outros filhos que rodam em
+    paralelo) e os registra com o rótulo `stage` (e em `timings`, se informado).
+    """
+    if kwargs.pop("capture_output", False):
+        kwargs["stdout"] = subprocess.PIPE
+        kwargs["stderr"] = subprocess.PIPE
+    started = time.perf_counter()
+    outputs = {}
+    with subprocess.Popen(command, **kwargs) as process:
+        # As saídas são lidas em threads (como no communicate), para o filho não travar com o pipe cheio
+        readers = [threading.Thread(target=_read_stream, args=(stream, outputs, name), daemon=True)
+                   for name, stream in (("stdout", process.stdout), ("stderr", process.stderr)) if stream is not None]
+        for reader in readers:
+            reader.start()
+        try:
+            rusage = _wait_with_rusage(process)
+        except BaseException:
+            process.kill()
+            raise
+        for reader in readers:
+            reader.join()
+    wall_sec = time.perf_counter() - started
+    cpu_sec = rusage.ru_utime + rusage.ru_stime
+
+    METRICS.observe("vc_stage_duration_seconds", wall_sec, stage=stage)
+    METRICS.inc("vc_subprocesses_total", stage=stage)
+    METRICS.inc("vc_subprocess_wall_seconds_total", wall_sec, stage=stage)
+    METRICS.inc("vc_subprocess_cpu_seconds_total", cpu_sec, stage=stage)
+    add_timing(timings, stage, wall_sec, cpu_sec)
+
+    result = subprocess.CompletedProcess(process.args, process.returncode, outputs.get("stdout"), outputs.get("stderr"))
+    if check:
+        result.check_returncode()
+    return result
@@ -0,0 +1,188 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from . import audio_extract
+
+# --- Pré-ranqueamento local: só as regiões mais promissoras da transcrição vão ao LLM ---
+# 0 volta à cobertura completa (todos os chunks de 10 minutos são enviados)
+PRERANK = os.environ.get('VC_PRERANK', '1') == '1'
+# Quantas janelas candidatas (no vídeo inteiro) são enviadas ao LLM
+PRERANK_TOP_K = int(os.environ.get('VC_PRERANK_TOP_K', 8))
+# Tamanho e passo das janelas candidatas; a janela precisa caber o maior segmento pedido ao LLM
+PRERANK_WINDOW_SEC = float(os.environ.get('VC_PRERANK_WINDOW_SEC', 180))
+PRERANK_HOP_SEC = float(os.environ.get('VC_PRERANK_HOP_SEC', 60))
+# Se as K janelas cobririam quase o vídeo todo, não há o que economizar: usa a cobertura completa
+PRERANK_MAX_COVERAGE = 0.8
+# Palavras (e expressões) que costumam marcar trechos de impacto; os temas do job são somados a elas
+PRERANK_KEYWORDS = [
+    word.strip().lower() for word in os.environ.get(
+        'VC_PRERANK_KEYWORDS',
+        'incrível,segredo,nunca,sempre,dinheiro,verdade,história,erro,problema,importante,polêmica,'
+        'ninguém,todo mundo,absurdo,imagina,olha,sério,cara,mano',
+    ).split(',') if word.strip()
+]
+# Pausas a partir desse tamanho (s) contam como quebra de ritmo
+PAUSE_MIN_SEC = 1.5
+# Peso de cada sinal no score (sobre os valores padronizados entre as janelas candidatas)
+WEIGHTS = {
+    "speech_rate": 1.0,      # palavras por segundo de fala
+    "speech_ratio": 0.5,     # fração da janela com fala
+    "pauses": -0.5,          # pausas longas por minuto
+    "energy_peaks": 1.0,     # segundos acima do percentil 90 de volume do vídeo
+    "energy_dynamics": 0.5,  # variação do volume (dB) dentro da janela
+    "keyword_density": 1.0,  # palavras-chave por 100 palavras, incluindo ! e ?
+}
+# Blocos de áudio lidos por vez ao calcular o volume (limita o uso de memória do mapeamento)
+_AUDIO_BLOCK_SEC = 600
+
+
+def enabled(total_duration: float, top_k: int = PRERANK_TOP_K, window_sec: float = PRERANK_WINDOW_SEC) -> bool:
+    """Indica se o pré-ranqueamento vale para um vídeo dessa duração (senão, cobertura completa)."""
+    return PRERANK and top_k > 0 and top_k * window_sec < PRERANK_MAX_COVERAGE * total_duration
+
+
+def cache_token(top_k: int = PRERANK_TOP_K, window_sec: float = PRERANK_WINDOW_SEC, hop_sec: float = PRERANK_HOP_SEC,
+                selection: str = "sequential") -> str:
+    """
+    Parte da chave do cache de segmentos: resultados com e sem pré-ranqueamento não se misturam,
+    nem os da seleção sequencial (transcrição inteira) com os do pipeline em fluxo (`selection`="streaming"),
+    que escolhe as janelas à medida que a transcrição chega.
+    """
+    if not PRERANK:
+        return "full"
+    return f"prerank-{selection}-{top_k}-{window_sec:g}-{hop_sec:g}-{','.join(PRERANK_KEYWORDS)}"
+
+
+def loudness_per_second(audio: np.ndarray) -> np.ndarray:
+    """Volume (dB RMS) de cada segundo do áudio a 16 kHz, lido em blocos do array mapeado em memória."""
+    rate = audio_extract.SAMPLE_RATE
+    seconds = len(audio) // rate
+    loudness = np.empty(seconds, dtype=np.float32)
+    for block_start in range(0, seconds, _AUDIO_BLOCK_SEC):
+        block_end = min(seconds, block_start + _AUDIO_BLOCK_SEC)
+        frames = np.asarray(audio[block_start * rate:block_end * rate], dtype=np.float32).reshape(-1, rate)
+        loudness[block_start:block_end] = np.einsum('ij,ij->i', frames, frames) / rate
+    return 10 * np.log10(loudness + 1e-10)
+
+
+def _keyword_pattern(keywords: list) -> re.Pattern:
+    escaped = sorted((re.escape(keyword) for keyword in keywords), key=len, reverse=True)
+    return re.compile(r"[!?]|\b(?:" + "|".join(escaped) + r")\b" if escaped else r"[!?]", re.IGNORECASE)
+
+
+def window_features(df: pd.DataFrame, starts: np.ndarray, window_sec: float, loudness: np.ndarray | None = None,
+                    keywords: list | None = None) -> pd.DataFrame:
+    """
+    Sinais de cada janela candidata [início, início + window_sec), calculados de forma vetorizada:
+    os valores por linha da transcrição (e o volume por segundo, ver `loudness_per_second`) são
+    acumulados em uma linha do tempo de 1 s (bincount + cumsum), e a soma de cada janela sai da
+    diferença de dois acumulados. Sem `loudness`, os sinais de volume ficam zerados.
+    """
+    horizon = int(np.ceil(max(float(df['end'].max()) if len(df) else 0.0, starts.max() + window_sec if len(starts) else 0.0))) + 1
+    row_second = np.clip(df['start'].to_numpy(dtype=float).astype(int), 0, horizon - 1)
+    texts = df['text'].astype(str)
+
+    def timeline(values) -> np.ndarray:
+        # Acumulado com um zero na frente: soma de [a, b) = acc[b] - acc[a]
+        return np.concatenate(([0.0], np.cumsum(np.bincount(row_second, weights=values, minlength=horizon))))
+
+    words = timeline(texts.str.split().str.len().fillna(0).to_numpy(dtype=float))
+    speech = timeline((df['end'] - df['start']).clip(lower=0).to_numpy(dtype=float))
+    hits = timeline(texts.str.count(_keyword_pattern(PRERANK_KEYWORDS + (keywords or []))).to_numpy(dtype=float))
+    gaps = df['start'].to_numpy(dtype=float)[1:] - df['end'].to_numpy(dtype=float)[:-1]
+    pauses = timeline(np.concatenate(([0.0], (gaps >= PAUSE_MIN_SEC).astype(float))))
+
+    lo = np.clip(starts.astype(int), 0, horizon)
+    hi = np.clip((starts + window_sec).astype(int), 0, horizon)
+
+    def window_sum(acc: np.ndarray) -> np.ndarray:
+        return acc[hi] - acc[lo]
+
+    window_words, window_speech = window_sum(words), window_sum(speech)
+    features = pd.DataFrame({
+        "start": starts,
+        "speech_rate": window_words / np.maximum(window_speech, 1.0),
+        "speech_ratio": np.minimum(window_speech / window_sec, 1.0),
+        "pauses": window_sum(pauses) / (window_sec / 60),
+        "keyword_density": 100 * window_sum(hits) / np.maximum(window_words, 1.0),
+        "energy_peaks": 0.0,
+        "energy_dynamics": 0.0,
+    })
+
+    if loudness is not None and len(loudness):
+        loudness = loudness.astype(float)
+        peaks = np.concatenate(([0.0], np.cumsum(loudness >= np.percentile(loudness, 90))))
+        level = np.concatenate(([0.0], np.cumsum(loudness)))
+        level_sq = np.concatenate(([0.0], np.cumsum(loudness ** 2)))
+        a, b = np.minimum(lo, len(loudness)), np.minimum(hi, len(loudness))
+        seconds = np.maximum(b - a, 1)
+        mean = (level[b] - level[a]) / seconds
+        features["energy_peaks"] = (peaks[b] - peaks[a]) / seconds
+        features["energy_dynamics"] = np.sqrt(np.maximum((level_sq[b] - level_sq[a]) / seconds - mean ** 2, 0.0))
+    return features
+
+
+def score_windows(features: pd.DataFrame) -> np.ndarray:
+    """Score de cada janela: soma ponderada dos sinais padronizados (z-score) entre as candidatas."""
+    scores = np.zeros(len(features))
+    for name, weight in WEIGHTS.items():
+        values = features[name].to_numpy(dtype=float)
+        spread = values.std()
+        if spread > 0:
+            scores += weight * (values - values.mean()) / spread
+    return scores
+
+
+def select_windows(df: pd.DataFrame, top_k: int = PRERANK_TOP_K, loudness: np.ndarray | None = None, keywords: list | None = None,
+                   span: tuple | None = None, window_sec: float = PRERANK_WINDOW_SEC, hop_sec: float = PRERANK_HOP_SEC,
+                   taken: tuple = ()) -> list:
+    """
+    Ranqueia as janelas candidatas (a cada `hop_sec`) de `span` (padrão: a transcrição inteira),
+    com o volume por segundo do áudio do job em `loudness` (opcional), e retorna os inícios das
+    `top_k` melhores, do maior para o menor score, sem sobreposição entre si nem com as janelas
+    já escolhidas antes (inícios em `taken`).
+    """
+    if df.empty or top_k <= 0:
+        return []
+    span_start, span_end = span or (0.0, float(df['end'].max()))
+    starts = np.arange(span_start, max(span_start, span_end - window_sec) + hop_sec, hop_sec)
+    starts = starts[starts < span_end]
+    scores = score_windows(window_features(df, starts, window_sec, loudness, keywords))
+
+    # Supressão de não-máximos: as melhores janelas, sem sobreposição entre si
+    chosen, blocked = [], [float(start) for start in taken]
+    for index in np.argsort(-scores, kind='stable'):
+        start = float(starts[index])
+        if all(abs(start - other) >= window_sec for other in blocked):
+            chosen.append(start)
+            blocked.append(start)
+            if len(chosen) == top_k:
+                break
+    return chosen
+
+
+def merge_windows(starts: list, window_sec: float = PRERANK_WINDOW_SEC, span_end: float | None = None) -> list:
+    """Une as janelas vizinhas (inícios em `starts`) em regiões [(início, fim)] em ordem cronológica."""
+    regions = []
+    for start in sorted(starts):
+        end = start + window_sec if span_end is None else min(start + window_sec, span_end)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def select_regions(df: pd.DataFrame, top_k: int = PRERANK_TOP_K, loudness: np.ndarray | None = None, keywords: list | None = None,
+                   span: tuple | None = None, window_sec: float = PRERANK_WINDOW_SEC, hop_sec: float = PRERANK_HOP_SEC) -> list:
+    """
+    As `top_k` melhores janelas de `span` (ver `select_windows`), com as vizinhas unidas em
+    regiões [(início, fim)] em ordem cronológica.
+    """
+    if df.empty or top_k <= 0:
+        return []
+    span_end = span[1] if span else float(df['end'].max())
+    return merge_windows(select_windows(df, top_k, loudness, keywords, span, window_sec, hop_sec), window_sec, span_end)
@@ -0,0 +1,229 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import metrics
+from .media_probe import MediaProbeError, probe
+
+# --- Sugestão automática de enquadramento (roi1/roi2) para a página de ajuste ---
+# 0 desliga: a página abre com as caixas nas posições padrão
+ROI_SUGGEST = os.environ.get('VC_ROI_SUGGEST', '1') == '1'
+# Amostragem de cada clipe: quadros por segundo e largura (px) dos quadros decodificados
+ROI_SAMPLE_FPS = float(os.environ.get('VC_ROI_SAMPLE_FPS', 1))
+ROI_SAMPLE_WIDTH = int(os.environ.get('VC_ROI_SAMPLE_WIDTH', 320))
+# Clipes analisados em paralelo (cada um: um FFmpeg decodificando + um detector)
+ROI_MAX_WORKERS = int(os.environ.get('VC_ROI_MAX_WORKERS', max(1, min(4, (os.cpu_count() or 2) // 2))))
+# Confiança mínima de cada rosto detectado
+ROI_MIN_CONFIDENCE = float(os.environ.get('VC_ROI_MIN_CONFIDENCE', 0.5))
+# Altura da caixa em relação à altura do rosto (cabeça e ombros) e posição do rosto na caixa (fração do topo)
+ROI_FACE_SCALE = 4.0
+ROI_FACE_TOP = 0.4
+# Dois grupos de rostos só contam como duas pessoas se os centros estiverem a pelo menos essa
+# distância (fração da largura) e o menor grupo tiver essa fração das detecções
+ROI_MIN_SEPARATION = 0.15
+ROI_MIN_GROUP_SHARE = 0.2
+# Cada ROI vira um painel de 1080x960 na tela dividida (ver edit_video): mesma proporção da página de ajuste
+ROI_RATIO = 9 / 8
+
+metrics.METRICS.counter("vc_roi_suggestions_total", "Sugestões automáticas de enquadramento por clipe, por resultado (suggested, no_faces, failed).")
+
+
+class RoiSuggestUnavailable(RuntimeError):
+    """O MediaPipe instalado não tem a API usada aqui (mp.solutions.face_detection)."""
+
+
+def mediapipe_available() -> bool:
+    """Indica se o MediaPipe está instalado (sem importá-lo, o que é lento)."""
+    return importlib.util.find_spec("mediapipe") is not None
+
+
+def sample_frames(clip_path: str, fps: float = ROI_SAMPLE_FPS, width: int = ROI_SAMPLE_WIDTH, threads: int = 0,
+                  timings: dict | None = None) -> np.ndarray:
+    """
+    Decodifica `clip_path` a `fps` quadros por segundo, já reduzido para `width` px de largura,
+    em uma única chamada ao FFmpeg: os quadros saem em RGB cru pelo stdout e são lidos direto
+    em um array (quadros, altura, largura, 3) de uint8, sem arquivos intermediários nem seeks.
+    """
+    media = probe(clip_path)
+    if not media.width or not media.height:
+        raise ValueError(f"Sem stream de vídeo: {clip_path}")
+    width = min(width, media.width) // 2 * 2
+    height = max(2, round(width * media.height / media.width / 2) * 2)
+    command = [
+        'ffmpeg', '-v', 'error', '-nostdin', '-threads', str(threads), '-i', clip_path, '-map', '0:v:0', '-an', '-sn',
+        '-vf', f'fps={fps:g},scale={width}:{height}:flags=fast_bilinear', '-pix_fmt', 'rgb24', '-f', 'rawvideo', '-',
+    ]
+    result = metrics.run(command, "roi_sample", check=True, timings=timings, capture_output=True)
+    frame_size = width * height * 3
+    frames = len(result.stdout) // frame_size
+    return np.frombuffer(result.stdout, dtype=np.uint8, count=frames * frame_size).reshape(frames, height, width, 3)
+
+
+def _face_detection_module():
+    """
+    O módulo legado mp.solutions.face_detection (versão fixada em requirements.txt): as versões
+    recentes do MediaPipe removeram `solutions`, e isso precisa aparecer como falha, não como
+    "nenhum rosto".
+    """
+    try:
+        import mediapipe as mp
+        return mp.solutions.face_detection
+    except (ImportError, AttributeError) as e:
+        version = getattr(sys.modules.get("mediapipe"), "__version__", "?")
+        raise RoiSuggestUnavailable(f"MediaPipe {version} sem mp.solutions.face_detection; instale a versão de requirements.txt ({e})") from e
+
+
+class _FaceDetectors:
+    """
+    Detectores de uma passada de sugestões: um por thread (o grafo do MediaPipe não é
+    compartilhável entre threads), criado na primeira vez; ao sair do `with`, todos são fechados.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened = []
+
+    def get(self):
+        detector = getattr(self._local, "face", None)
+        if detector is None:
+            # model_selection=1: modelo de alcance completo, para pessoas a até ~5 m da câmera (não só close-ups)
+            detector = _face_detection_module().FaceDetection(model_selection=1, min_detection_confidence=ROI_MIN_CONFIDENCE)
+            self._local.face = detector
+            with self._lock:
+                self._opened.append(detector)
+        return detector
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            opened, self._opened = self._opened, []
+        for detector in opened:
+            detector.close()
+
+
+def detect_faces(frames: np.ndarray, detector) -> np.ndarray:
+    """
+    Roda o detector de rostos (um FaceDetection do MediaPipe) sobre o lote de quadros e retorna
+    uma linha por rosto: (quadro, centro x, centro y, largura, altura), em frações do quadro.
+    O grafo do MediaPipe recebe uma imagem por chamada (não há inferência em lote na API);
+    o lote vem da decodificação única do clipe, e o custo por quadro fica no grafo em C++.
+    """
+    rows = []
+    for index, frame in enumerate(frames):
+        result = detector.process(frame)
+        for detection in result.detections or []:
+            box = detection.location_data.relative_bounding_box
+            rows.append((index, box.xmin + box.width / 2, box.ymin + box.height / 2, box.width, box.height))
+    return np.array(rows, dtype=float).reshape(-1, 5)
+
+
+def split_subjects(faces: np.ndarray) -> list:
+    """
+    Agrupa as detecções por pessoa, pela posição horizontal: o melhor corte em dois grupos
+    (menor variância interna, calculada com somas acumuladas sobre os centros ordenados) só é
+    aceito se os grupos estiverem separados e forem ambos relevantes; senão, é uma pessoa só.
+    Retorna os grupos (arrays de detecções) da esquerda para a direita.
+    """
+    faces = faces[np.argsort(faces[:, 1], kind='stable')]
+    count = len(faces)
+    if count < 2:
+        return [faces] if count else []
+    xs = faces[:, 1]
+    sums, sums_sq = np.cumsum(xs), np.cumsum(xs ** 2)
+    left = np.arange(1, count)  # tamanho do grupo da esquerda em cada corte possível
+    right = count - left
+    left_sum, right_sum = sums[:-1], sums[-1] - sums[:-1]
+    within = (sums_sq[:-1] - left_sum ** 2 / left) + (sums_sq[-1] - sums_sq[:-1] - right_sum ** 2 / right)
+    cut = int(np.argmin(within)) + 1
+    separation = right_sum[cut - 1] / right[cut - 1] - left_sum[cut - 1] / left[cut - 1]
+    if separation < ROI_MIN_SEPARATION or min(cut, count - cut) < ROI_MIN_GROUP_SHARE * count:
+        return [faces]
+    return [faces[:cut], faces[cut:]]
+
+
+def _box_around(center_x: float, center_y: float, face_height: float, aspect: float) -> dict:
+    """
+    Caixa na proporção de um painel da tela dividida (ROI_RATIO em pixels) com cabeça e ombros
+    da pessoa, limitada ao quadro. `aspect` é largura/altura do quadro. Valores em % do quadro.
+    """
+    h = min(1.0, face_height * ROI_FACE_SCALE)
+    w = h * ROI_RATIO / aspect
+    if w > 1.0:
+        w, h = 1.0, aspect / ROI_RATIO
+    x = min(max(center_x - w / 2, 0.0), 1.0 - w)
+    y = min(max(center_y - ROI_FACE_TOP * h, 0.0), 1.0 - h)
+    return {key: round(100 * float(value), 2) for key, value in (("x", x), ("y", y), ("w", w), ("h", h))}
+
+
+def rois_from_faces(faces: np.ndarray, aspect: float) -> dict | None:
+    """
+    Sugestão de roi1 (painel de cima) e roi2 (painel de baixo) a partir das detecções de um clipe:
+    com duas pessoas, a da esquerda vai em cima e a da direita embaixo; com uma só, ela fica em
+    roi1 e roi2 pega a mesma área do lado oposto do quadro (ex.: a tela ou o conteúdo ao lado).
+    Sem rostos, retorna None (a página usa as posições padrão).
+    """
+    subjects = split_subjects(faces)
+    if not subjects:
+        return None
+    boxes = [_box_around(*np.median(group[:, 1:], axis=0)[[0, 1, 3]], aspect=aspect) for group in subjects]
+    if len(boxes) == 1:
+        only = boxes[0]
+        opposite_x = 0.0 if only["x"] + only["w"] / 2 > 50 else round(100 - only["w"], 2)
+        boxes.append({**only, "x": opposite_x})
+    return {"roi1": boxes[0], "roi2": boxes[1], "subjects": len(subjects), "detections": len(faces)}
+
+
+def suggest_clip(clip_path: str, detectors: _FaceDetectors, threads: int = 0, timings: dict | None = None) -> dict | None:
+    """Amostra um clipe e sugere o enquadramento (ver `rois_from_faces`); None se não houver sugestão."""
+    frames = sample_frames(clip_path, threads=threads, timings=timings)
+    if not len(frames):
+        return None
+    with metrics.timed("roi_detect", timings):
+        faces = detect_faces(frames, detectors.get())
+    return rois_from_faces(faces, aspect=frames.shape[2] / frames.shape[1])
+
+
+def suggest_rois(clip_paths: list, max_workers: int | None = None, timings: dict | None = None) -> list:
+    """
+    Sugere (em paralelo) roi1/roi2 para cada clipe, na mesma ordem de `clip_paths`.
+    É só uma sugestão: sem MediaPipe, desligada (VC_ROI_SUGGEST=0), com um MediaPipe sem a
+    API esperada ou se a leitura de um clipe falhar, o item fica None e o job segue
+    normalmente; as falhas são registradas como tal (log e vc_roi_suggestions_total).
+    Os detectores criados na passada são fechados ao fim dela.
+    """
+    if not clip_paths or not ROI_SUGGEST:
+        return [None] * len(clip_paths)
+    if not mediapipe_available():
+        print("⚠️ MediaPipe não instalado: sem sugestão automática de enquadramento.")
+        return [None] * len(clip_paths)
+    try:
+        _face_detection_module()
+    except RoiSuggestUnavailable as e:
+        print(f"❌ Sugestão automática de enquadramento falhou: {e}")
+        metrics.METRICS.inc("vc_roi_suggestions_total", len(clip_paths), result="failed")
+        return [None] * len(clip_paths)
+
+    max_workers = max(1, min(max_workers or ROI_MAX_WORKERS, len(clip_paths)))
+    threads = max(1, (os.cpu_count() or 2) // max_workers)
+
+    def safe_suggest(path: str) -> dict | None:
+        try:
+            suggestion = suggest_clip(path, detectors, threads=threads, timings=timings)
+        except (subprocess.CalledProcessError, MediaProbeError, ValueError, OSError) as e:
+            detail = e.stderr.decode(errors='replace').strip() if isinstance(e, subprocess.CalledProcessError) and e.stderr else e
+            print(f"❌ Não foi possível ler {path} para sugerir o enquadramento: {detail}")
+            metrics.METRICS.inc("vc_roi_suggestions_total", result="failed")
+            return None
+        metrics.METRICS.inc("vc_roi_suggestions_total", result="suggested" if suggestion else "no_faces")
+        return suggestion
+
+    with _FaceDetectors() as detectors, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(safe_suggest, clip_paths))
@@ -0,0 +1,287 @@
+import gc
+import importlib.util
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from scripts import audio_extract
+
+# Mesmos parâmetros usados antes na chamada à CLI do WhisperX
+ALIGN_MODEL = "WAV2VEC2_ASR_LARGE_LV60K_960H"
+VAD_OPTIONS = {"vad_onset": 0.4, "vad_offset": 0.3}
+CHUNK_SIZE = 10
+
+# Estimativas de memória (MB) usadas quando não dá para medir o consumo real (ex.: CPU)
+MODEL_SIZE_ESTIMATES_MB = {
+    "tiny": 400, "base": 600, "small": 1200, "medium": 2800,
+    "large": 5000, "large-v2": 5000, "large-v3": 5000, "turbo": 3000,
+}
+ALIGN_MODEL_ESTIMATE_MB = 1300
+# Transcrição em janelas (pipeline em fluxo): cada fronteira é movida para o trecho mais
+# silencioso (quadros de 100 ms) nos WINDOW_SPLIT_SEARCH_SEC seguintes à posição nominal,
+# para não partir uma palavra entre duas janelas
+WINDOW_SPLIT_SEARCH_SEC = 5.0
+WINDOW_SPLIT_FRAME_SEC = 0.1
+
+
+def whisperx_available() -> bool:
+    """Indica se o pacote whisperx pode ser importado neste ambiente."""
+    return importlib.util.find_spec("whisperx") is not None
+
+
+def write_tsv(segments: list, output_path: str):
+    """
+    Grava os segmentos no mesmo formato TSV da CLI do WhisperX
+    (start/end em milissegundos inteiros), consumido por create_viral_segments.create.
+    """
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("start\tend\ttext\n")
+        for segment in segments:
+            text = segment["text"].strip().replace("\t", " ")
+            f.write(f"{round(1000 * segment['start'])}\t{round(1000 * segment['end'])}\t{text}\n")
+
+
+def segments_frame(segments: list) -> pd.DataFrame:
+    """
+    Mesmo conteúdo do TSV de `write_tsv`, já em um DataFrame com tempos em segundos
+    (arredondados ao milissegundo), como create_viral_segments lê o arquivo.
+    """
+    return pd.DataFrame({
+        "start": [round(1000 * segment["start"]) / 1000 for segment in segments],
+        "end": [round(1000 * segment["end"]) / 1000 for segment in segments],
+        "text": [segment["text"].strip().replace("\t", " ") for segment in segments],
+    }, columns=["start", "end", "text"])
+
+
+def window_bounds(audio: np.ndarray, boundaries_sec: list, search_sec: float = WINDOW_SPLIT_SEARCH_SEC) -> list:
+    """
+    Divide o áudio (16 kHz) em janelas consecutivas que terminam logo depois de cada tempo
+    de `boundaries_sec`, retornando [(amostra inicial, amostra final)]. Cada fronteira fica
+    no quadro de menor energia do trecho de busca (RMS vetorizado só nesse trecho).
+    """
+    rate = audio_extract.SAMPLE_RATE
+    total = len(audio)
+    search, frame = int(search_sec * rate), int(WINDOW_SPLIT_FRAME_SEC * rate)
+    bounds, start = [], 0
+    for boundary in sorted(boundaries_sec):
+        nominal = int(boundary * rate)
+        if nominal <= start or nominal + search >= total:
+            continue
+        region = np.asarray(audio[nominal:nominal + search], dtype=np.float32)
+        frames = region[:len(region) // frame * frame].reshape(-1, frame)
+        quietest = int(np.argmin(np.einsum('ij,ij->i', frames, frames)))
+        end = nominal + quietest * frame + frame // 2
+        bounds.append((start, end))
+        start = end
+    bounds.append((start, total))
+    return bounds
+
+
+def _shift_segment(segment: dict, offset: float) -> dict:
+    """Converte os tempos de um segmento (e das palavras) de relativos à janela para absolutos."""
+    shifted = dict(segment, start=segment["start"] + offset, end=segment["end"] + offset)
+    if "words" in segment:
+        shifted["words"] = [
+            {**word, **{key: word[key] + offset for key in ("start", "end") if key in word}}
+            for word in segment["words"]
+        ]
+    return shifted
+
+
+class ModelCache:
+    """
+    Cache LRU de modelos carregados, com despejo baseado em memória: quando a soma
+    estimada dos modelos ultrapassa `max_mb`, os menos usados recentemente são liberados.
+    """
+
+    def __init__(self, max_mb: int):
+        self.max_mb = max_mb
+        self._entries = OrderedDict()  # key -> (model, size_mb)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _used_mb(self) -> float:
+        return sum(size for _, size in self._entries.values())
+
+    def get_or_load(self, key, loader, estimate_mb: float):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Carrega fora do lock global para não bloquear quem usa outros modelos,
+        # mas com um lock por chave para não carregar o mesmo modelo duas vezes.
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
+                self._evict(estimate_mb)
+            model, size_mb = _measure_load(loader, estimate_mb)
+            with self._lock:
+                self._entries[key] = (model, size_mb)
+                self._evict(0)
+            print(f"🧠 Modelo carregado no cache: {key} (~{size_mb:.0f} MB)")
+            return model
+
+    def _evict(self, incoming_mb: float):
+        # Despeja os menos usados até caber o novo modelo. Depois do carregamento
+        # (incoming_mb == 0) o mais recente é sempre mantido, mesmo que sozinho exceda o limite.
+        keep = 0 if incoming_mb else 1
+        while len(self._entries) > keep and self._used_mb() + incoming_mb > self.max_mb:
+            key, entry = self._entries.popitem(last=False)
+            del entry
+            print(f"♻️ Removendo modelo do cache: {key}")
+            _release_memory()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        _release_memory()
+
+
+def _cuda_allocated_mb():
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return torch.cuda.memory_allocated() / (1024 * 1024)
+    except ImportError:
+        pass
+    return None
+
+
+def _measure_load(loader, estimate_mb: float):
+    before = _cuda_allocated_mb()
+    model = loader()
+    after = _cuda_allocated_mb()
+    if before is not None and after is not None and after > before:
+        return model, after - before
+    return model, estimate_mb
+
+
+def _release_memory():
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+class TranscriptionEngine:
+    """
+    Motor de transcrição de longa duração: carrega os modelos de ASR e de alinhamento
+    do WhisperX uma única vez por (modelo, compute_type) e os reutiliza entre jobs.
+    """
+
+    def __init__(self, max_cache_mb: int | None = None, device: str | None = None):
+        self.max_cache_mb = max_cache_mb or int(os.environ.get('VC_MODEL_CACHE_MB', 8000))
+        self._device = device
+        self.cache = ModelCache(self.max_cache_mb)
+        # Um lock por modelo: a inferência de um mesmo modelo não é thread-safe
+        self._inference_locks = {}
+        self._locks_guard = threading.Lock()
+
+    @property
+    def device(self) -> str:
+        if self._device is None:
+            import torch
+            self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        return self._device
+
+    def _inference_lock(self, key) -> threading.Lock:
+        with self._locks_guard:
+            return self._inference_locks.setdefault(key, threading.Lock())
+
+    def _asr_model(self, model: str, compute_type: str):
+        import whisperx
+        key = ("asr", model, compute_type, self.device)
+        return key, self.cache.get_or_load(
+            key,
+            lambda: whisperx.load_model(model, self.device, compute_type=compute_type, vad_options=VAD_OPTIONS),
+            MODEL_SIZE_ESTIMATES_MB.get(model, 3000),
+        )
+
+    def _align_model(self, language: str):
+        import whisperx
+        key = ("align", ALIGN_MODEL, language, self.device)
+        return self.cache.get_or_load(
+            key,
+            lambda: whisperx.load_align_model(language_code=language, device=self.device, model_name=ALIGN_MODEL),
+            ALIGN_MODEL_ESTIMATE_MB,
+        )
+
+    def transcribe(self, audio, model: str, compute_type: str, batch_size: int, on_progress=None) -> list:
+        """
+        Transcreve e alinha o áudio. `audio` pode ser o caminho de um arquivo de mídia
+        (o WAV extraído por scripts.audio_extract é mapeado em memória, sem nova decodificação)
+        ou um array float32 mono a 16 kHz. Retorna a lista de segmentos alinhados.
+        `on_progress(fase, percentual)` é chamado ao fim de cada fase (áudio, ASR, alinhamento).
+        """
+        import whisperx
+        report = on_progress or (lambda phase, percent: None)
+        if isinstance(audio, str):
+            audio = audio_extract.open_audio(audio) if audio_extract.is_extracted_audio(audio) else whisperx.load_audio(audio)
+        report("audio", 5)
+
+        key, asr_model = self._asr_model(model, compute_type)
+        started = time.time()
+        with self._inference_lock(key):
+            result = asr_model.transcribe(audio, batch_size=batch_size, chunk_size=CHUNK_SIZE)
+        language = result.get("language", "en")
+        report("asr", 70)
+
+        align_model, metadata = self._align_model(language)
+        with self._inference_lock(("align", language)):
+            aligned = whisperx.align(result["segments"], align_model, metadata, audio, self.device, return_char_alignments=False)
+        report("alignment", 100)
+        print(f"Transcrição concluída em {time.time() - started:.1f}s ({len(aligned['segments'])} segmentos, idioma: {language})")
+        return aligned["segments"]
+
+    def transcribe_windows(self, audio, model: str, compute_type: str, batch_size: int, boundaries_sec: list, on_progress=None):
+        """
+        Gerador do pipeline em fluxo: transcreve e alinha o áudio em janelas que terminam logo
+        depois de cada tempo de `boundaries_sec` (ver `window_bounds`; ex.: os fins dos chunks
+        analisados pelo LLM) e entrega cada uma assim que fica pronta, como
+        (início em s, fim em s, segmentos com tempos absolutos). O idioma detectado na
+        primeira janela é fixado nas seguintes. `on_progress('window', percentual)` é chamado por janela.
+        """
+        import whisperx
+        report = on_progress or (lambda phase, percent: None)
+        if isinstance(audio, str):
+            audio = audio_extract.open_audio(audio) if audio_extract.is_extracted_audio(audio) else whisperx.load_audio(audio)
+        report("audio", 5)
+
+        rate = audio_extract.SAMPLE_RATE
+        windows = window_bounds(audio, boundaries_sec)
+        key, asr_model = self._asr_model(model, compute_type)
+        language = None
+        started = time.time()
+        for number, (lo, hi) in enumerate(windows, start=1):
+            piece = audio[lo:hi]
+            with self._inference_lock(key):
+                result = asr_model.transcribe(piece, batch_size=batch_size, chunk_size=CHUNK_SIZE, language=language)
+            language = language or result.get("language", "en")
+            segments = result["segments"]
+            if segments:
+                align_model, metadata = self._align_model(language)
+                with self._inference_lock(("align", language)):
+                    segments = whisperx.align(segments, align_model, metadata, piece, self.device, return_char_alignments=False)["segments"]
+            report("window", 5 + round(95 * number / len(windows)))
+            print(f"Janela {number}/{len(windows)} transcrita em {time.time() - started:.1f}s ({len(segments)} segmentos)")
+            yield lo / rate, hi / rate, [_shift_segment(segment, lo / rate) for segment in segments]
+
+    def transcribe_to_tsv(self, input_file: str, output_path: str, model: str, compute_type: str, batch_size: int, on_progress=None) -> str:
+        segments = self.transcribe(input_file, model, compute_type, batch_size, on_progress=on_progress)
+        write_tsv(segments, output_path)
+        return output_path
+
+
+# Instância compartilhada pelo processo, para que os modelos fiquem "quentes" entre jobs
+ENGINE = TranscriptionEngine()